@@ -1,23 +1,421 @@
-from sqlalchemy import create_engine
+import hashlib
+import logging
+import os
+import re
+import threading
+import sys
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache, wraps
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 import streamlit as st
 
+logger = logging.getLogger(__name__)
+
+# Sección opcional de secrets.toml; {} si no está o si no hay secrets.toml (por ejemplo, al
+# ejecutar scripts o benchmarks solo con DATABASE_URL)
+def configuracion(seccion):
+    try:
+        return st.secrets.get(seccion, {})
+    except FileNotFoundError:
+        return {}
+
+
 # Construir la URL de conexión usando los valores de `secrets`
-postgresql_info = st.secrets["connections"]["postgresql"]
-DATABASE_URL = f"{postgresql_info['dialect']}://{postgresql_info['username']}:{postgresql_info['password']}@{postgresql_info['host']}:{postgresql_info['port']}/{postgresql_info['database']}"
+def _url_desde_secrets():
+    postgresql_info = st.secrets["connections"]["postgresql"]
+    return f"{postgresql_info['dialect']}://{postgresql_info['username']}:{postgresql_info['password']}@{postgresql_info['host']}:{postgresql_info['port']}/{postgresql_info['database']}"
+
+
+# DATABASE_URL permite apuntar scripts y workers a otra base sin tocar secrets
+DATABASE_URL = os.environ.get("DATABASE_URL") or _url_desde_secrets()
+
+# Configuración del pool (sección [pool] de secrets, todos los valores son opcionales)
+pool_info = configuracion("pool")
+
+
+# Métricas del pool: conexiones entregadas, devueltas, tiempos de espera y timeouts
+class MetricasPool:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkins = 0
+        self.conexiones_nuevas = 0
+        self.timeouts = 0
+        self.espera_total = 0.0
+        self.espera_maxima = 0.0
+
+    def registrar_espera(self, segundos, timeout=False):
+        with self._lock:
+            self.espera_total += segundos
+            self.espera_maxima = max(self.espera_maxima, segundos)
+            if timeout:
+                self.timeouts += 1
+
+    def incrementar(self, contador):
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    def resumen(self, pool):
+        with self._lock:
+            datos = {
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "conexiones_nuevas": self.conexiones_nuevas,
+                "timeouts": self.timeouts,
+                "espera_total_s": round(self.espera_total, 4),
+                "espera_promedio_ms": round(self.espera_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "espera_maxima_ms": round(self.espera_maxima * 1000, 3),
+            }
+        if isinstance(pool, QueuePool):
+            datos.update({
+                "tamano": pool.size(),
+                "en_uso": pool.checkedout(),
+                "disponibles": pool.checkedin(),
+                "overflow": pool.overflow(),
+            })
+        return datos
+
+
+metricas_pool = MetricasPool()
+
+
+# Pool que mide cuánto espera cada checkout por una conexión libre
+class PoolMedido(QueuePool):
+    def _do_get(self):
+        inicio = time.perf_counter()
+        timeout = False
+        try:
+            return super()._do_get()
+        except Exception:
+            timeout = True
+            raise
+        finally:
+            metricas_pool.registrar_espera(time.perf_counter() - inicio, timeout)
+
+
+def _opciones_motor(url):
+    if url.startswith("sqlite"):
+        return {}
+    opciones = {
+        "poolclass": PoolMedido,
+        "pool_size": pool_info.get("pool_size", 5),
+        "max_overflow": pool_info.get("max_overflow", 10),
+        "pool_timeout": pool_info.get("pool_timeout", 30),
+        "pool_recycle": pool_info.get("pool_recycle", 1800),
+        "pool_pre_ping": pool_info.get("pool_pre_ping", True),
+    }
+    statement_timeout_ms = pool_info.get("statement_timeout_ms")
+    if statement_timeout_ms and url.startswith("postgresql"):
+        opciones["connect_args"] = {"options": f"-c statement_timeout={int(statement_timeout_ms)}"}
+    return opciones
+
+
+
+# Instrumentación de consultas ([instrumentacion] en secrets.toml, valores opcionales)
+instrumentacion_info = configuracion("instrumentacion")
+UMBRAL_REPETIDAS = instrumentacion_info.get("umbral_repetidas", 5)
+CONSULTA_LENTA_MS = instrumentacion_info.get("consulta_lenta_ms", 1000)
+MAX_HUELLAS = instrumentacion_info.get("max_huellas", 500)
+
+_LITERALES = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"%\(\w+\)s|\$\d+|\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)"), "(?, ...)"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+# Texto normalizado de una sentencia (sin literales ni parámetros) y su huella
+@lru_cache(maxsize=4096)
+def huella_sentencia(sentencia):
+    texto = sentencia.strip()
+    for patron, reemplazo in _LITERALES:
+        texto = patron.sub(reemplazo, texto)
+    return hashlib.sha1(texto.encode()).hexdigest()[:12], texto
+
+
+# Sentencias de una ejecución de la página (un rerun de main()) en el hilo actual
+class EjecucionPagina:
+    def __init__(self, pagina):
+        self.pagina = pagina
+        self.inicio = time.time()
+        self.consultas = 0
+        self.tiempo_sql = 0.0
+        self.veces = {}
+        self.parametros = {}
+
+    def registrar(self, huella, parametros, segundos):
+        self.consultas += 1
+        self.tiempo_sql += segundos
+        self.veces[huella] = self.veces.get(huella, 0) + 1
+        self.parametros.setdefault(huella, set()).add(parametros)
+
+    # Huellas repetidas al menos `umbral` veces: "N+1" si cambian los parámetros, "duplicada" si no
+    def repetidas(self, umbral):
+        return {
+            huella: {"veces": veces, "tipo": "duplicada" if len(self.parametros[huella]) == 1 else "N+1"}
+            for huella, veces in self.veces.items()
+            if veces >= umbral
+        }
+
+
+# Métricas acumuladas por (página, huella) y resumen de las últimas ejecuciones de página
+class MetricasConsultas:
+    def __init__(self, ejecuciones_recientes=20):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.consultas = {}
+        self.descartadas = 0
+        self.ejecuciones = deque(maxlen=ejecuciones_recientes)
+
+    def pagina_actual(self):
+        ejecucion = getattr(self._local, "ejecucion", None)
+        return ejecucion.pagina if ejecucion else "sin página"
+
+    def ejecucion_activa(self):
+        return getattr(self._local, "ejecucion", None) is not None
+
+    def iniciar_ejecucion(self, pagina):
+        self._local.ejecucion = EjecucionPagina(pagina)
+
+    def terminar_ejecucion(self):
+        ejecucion = getattr(self._local, "ejecucion", None)
+        if ejecucion is None:
+            return None
+        self._local.ejecucion = None
+        repetidas = ejecucion.repetidas(UMBRAL_REPETIDAS)
+        resumen = {
+            "pagina": ejecucion.pagina,
+            "inicio": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ejecucion.inicio)),
+            "duracion_ms": round((time.time() - ejecucion.inicio) * 1000, 1),
+            "consultas": ejecucion.consultas,
+            "tiempo_sql_ms": round(ejecucion.tiempo_sql * 1000, 1),
+            "repetidas": repetidas,
+        }
+        with self._lock:
+            self.ejecuciones.append(resumen)
+            for huella in repetidas:
+                clave = (ejecucion.pagina, huella)
+                if clave in self.consultas:
+                    self.consultas[clave]["ejecuciones_repetidas"] += 1
+        for huella, info in repetidas.items():
+            logger.warning("Consulta %s repetida %d veces (%s) en la página %s", huella, info["veces"], info["tipo"], ejecucion.pagina)
+        return resumen
+
+    def registrar(self, sentencia, parametros, segundos, filas):
+        huella, texto = huella_sentencia(sentencia)
+        ejecucion = getattr(self._local, "ejecucion", None)
+        pagina = ejecucion.pagina if ejecucion else "sin página"
+        if ejecucion is not None:
+            ejecucion.registrar(huella, repr(parametros), segundos)
+        with self._lock:
+            datos = self.consultas.get((pagina, huella))
+            if datos is None:
+                if len(self.consultas) >= MAX_HUELLAS:
+                    self.descartadas += 1
+                    return
+                datos = self.consultas[(pagina, huella)] = {
+                    "pagina": pagina, "huella": huella, "sentencia": texto, "veces": 0,
+                    "tiempo_total_s": 0.0, "tiempo_maximo_s": 0.0, "filas": 0, "ejecuciones_repetidas": 0,
+                }
+            datos["veces"] += 1
+            datos["tiempo_total_s"] += segundos
+            datos["tiempo_maximo_s"] = max(datos["tiempo_maximo_s"], segundos)
+            if filas is not None and filas >= 0:
+                datos["filas"] += filas
+        if segundos * 1000 >= CONSULTA_LENTA_MS:
+            logger.warning("Consulta lenta %s (%.0f ms) en la página %s: %s", huella, segundos * 1000, pagina, texto[:200])
+
+    # Consultas ordenadas por tiempo total, con las últimas ejecuciones de página
+    def resumen(self, limite=None):
+        with self._lock:
+            consultas = sorted((dict(datos) for datos in self.consultas.values()), key=lambda datos: -datos["tiempo_total_s"])
+            ejecuciones = list(self.ejecuciones)
+            descartadas = self.descartadas
+        for datos in consultas:
+            datos["tiempo_promedio_ms"] = round(datos["tiempo_total_s"] / datos["veces"] * 1000, 3)
+            datos["tiempo_total_s"] = round(datos["tiempo_total_s"], 4)
+            datos["tiempo_maximo_s"] = round(datos["tiempo_maximo_s"], 4)
+        return {"consultas": consultas[:limite], "ejecuciones": ejecuciones, "huellas_descartadas": descartadas}
+
+    # Formato de texto de Prometheus (se puede servir a un scraper o descargar desde el panel)
+    def prometheus(self):
+        with self._lock:
+            consultas = [dict(datos) for datos in self.consultas.values()]
+        metricas = [
+            ("alltel_sql_consultas_total", "counter", "Sentencias ejecutadas", "veces"),
+            ("alltel_sql_segundos_total", "counter", "Tiempo total en la base de datos", "tiempo_total_s"),
+            ("alltel_sql_segundos_maximo", "gauge", "Sentencia más lenta", "tiempo_maximo_s"),
+            ("alltel_sql_filas_total", "counter", "Filas devueltas o afectadas", "filas"),
+            ("alltel_sql_ejecuciones_repetidas_total", "counter", "Ejecuciones de página con la sentencia repetida", "ejecuciones_repetidas"),
+        ]
+        lineas = []
+        for nombre, tipo, ayuda, campo in metricas:
+            lineas += [f"# HELP {nombre} {ayuda}", f"# TYPE {nombre} {tipo}"]
+            for datos in consultas:
+                pagina = datos["pagina"].replace("\\", "\\\\").replace('"', '\\"')
+                lineas.append(f'{nombre}{{pagina="{pagina}",huella="{datos["huella"]}"}} {datos[campo]}')
+        return "\n".join(lineas) + "\n"
+
+    def reiniciar(self):
+        with self._lock:
+            self.consultas.clear()
+            self.ejecuciones.clear()
+            self.descartadas = 0
 
-# Crear el motor de la base de datos
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+metricas_consultas = MetricasConsultas(instrumentacion_info.get("ejecuciones_recientes", 20))
+iniciar_ejecucion = metricas_consultas.iniciar_ejecucion
+terminar_ejecucion = metricas_consultas.terminar_ejecucion
+
+
+# Decorador para fragmentos de Streamlit (st.fragment): sus reruns no pasan por main(), así que
+# abren y cierran su propia ejecución de `pagina`. Dentro de una ejecución completa se suman a ella.
+def ejecucion_fragmento(pagina):
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if metricas_consultas.ejecucion_activa():
+                return funcion(*args, **kwargs)
+            iniciar_ejecucion(pagina)
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                terminar_ejecucion()
+        return envoltura
+    return decorador
+
+
+def _antes_de_sentencia(conn, cursor, statement, parameters, context, executemany):
+    conn.info["inicio_sentencia"] = time.perf_counter()
+
+
+def _despues_de_sentencia(conn, cursor, statement, parameters, context, executemany):
+    inicio = conn.info.pop("inicio_sentencia", None)
+    if inicio is not None:
+        # En executemany (importaciones) no se comparan los parámetros: serían miles de filas
+        metricas_consultas.registrar(statement, None if executemany else parameters, time.perf_counter() - inicio, cursor.rowcount)
+
+
+# El motor y su pool se crean con la primera consulta, no al importar el módulo: el formulario de
+# login se muestra sin abrir conexiones. `database.engine` sigue disponible para los scripts.
+_motor = None
+_motor_lock = threading.Lock()
+
+
+def obtener_motor():
+    global _motor
+    if _motor is None:
+        with _motor_lock:
+            if _motor is None:
+                motor = create_engine(DATABASE_URL, **_opciones_motor(DATABASE_URL))
+                event.listen(motor, "checkout", lambda *args: metricas_pool.incrementar("checkouts"))
+                event.listen(motor, "checkin", lambda *args: metricas_pool.incrementar("checkins"))
+                event.listen(motor, "connect", lambda *args: metricas_pool.incrementar("conexiones_nuevas"))
+                if instrumentacion_info.get("activa", True):
+                    event.listen(motor, "before_cursor_execute", _antes_de_sentencia)
+                    event.listen(motor, "after_cursor_execute", _despues_de_sentencia)
+                _motor = motor
+    return _motor
+
+
+def motor_creado():
+    return _motor is not None
+
+
+def __getattr__(nombre):
+    if nombre == "engine":
+        return obtener_motor()
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
+# Registro de sesiones abiertas para detectar las que nunca se cierran
+_sesiones_abiertas = {}
+_sesiones_lock = threading.Lock()
+
+
+def _olvidar_sesion(clave):
+    with _sesiones_lock:
+        _sesiones_abiertas.pop(clave, None)
+
+
+# Primer marco de la pila fuera de database.py, SQLAlchemy y contextlib. Recorre los marcos con
+# sys._getframe sin leer el código fuente, porque se llama en cada sesión que se abre.
+def _origen_llamada():
+    marco = sys._getframe(1)
+    while marco is not None:
+        archivo = marco.f_code.co_filename
+        if archivo != __file__ and "sqlalchemy" not in archivo and "contextlib" not in archivo:
+            return f"{archivo}:{marco.f_lineno} ({marco.f_code.co_name})"
+        marco = marco.f_back
+    return "desconocido"
+
+
+class SesionRastreada(Session):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        clave = id(self)
+        with _sesiones_lock:
+            _sesiones_abiertas[clave] = {
+                "hilo": threading.get_ident(),
+                "origen": _origen_llamada(),
+                "abierta_en": time.time(),
+                "sesion": weakref.ref(self),
+            }
+        weakref.finalize(self, _olvidar_sesion, clave)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            _olvidar_sesion(id(self))
+
+
+SessionLocal = sessionmaker(class_=SesionRastreada, autocommit=False, autoflush=False)
 
 # Base para la creación de modelos
 Base = declarative_base()
 
-# Dependencia para obtener la sesión de base de datos
-def get_db():
-    db = SessionLocal()
+
+# Sesión con ciclo de vida controlado: se revierte si hay error y siempre se cierra
+@contextmanager
+def session_scope():
+    db = SessionLocal(bind=obtener_motor())
     try:
         yield db
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
+
+
+# Dependencia para obtener la sesión de base de datos
+def get_db():
+    with session_scope() as db:
+        yield db
+
+
+# Sesiones abiertas por el hilo actual (el hilo de ejecución de Streamlit de la sesión)
+def sesiones_abiertas(hilo=None):
+    hilo = hilo or threading.get_ident()
+    with _sesiones_lock:
+        return [info for info in _sesiones_abiertas.values() if info["hilo"] == hilo]
+
+
+# Al final de cada ejecución de la página: registra y cierra las sesiones que quedaron abiertas
+def reportar_sesiones_abiertas(cerrar=True):
+    fugas = sesiones_abiertas()
+    for info in fugas:
+        segundos = time.time() - info["abierta_en"]
+        logger.warning("Sesión de base de datos sin cerrar (%.1f s) abierta en %s", segundos, info["origen"])
+        sesion = info["sesion"]()
+        if cerrar and sesion is not None:
+            sesion.close()
+    return fugas
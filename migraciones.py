@@ -0,0 +1,161 @@
+import argparse
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table, select, insert, inspect, text
+from database import engine
+from models import Client, TiemPro, Contador, ReporteMensual, CampanaEncuesta, EnvioEncuesta, AgregadoIncidencias
+
+
+# Tabla con las versiones de esquema ya aplicadas
+metadata_migraciones = MetaData()
+schema_migraciones = Table(
+    "schema_migraciones", metadata_migraciones,
+    Column("version", Integer, primary_key=True),
+    Column("descripcion", String(200)),
+    Column("aplicada_en", DateTime),
+)
+
+# Migraciones registradas en orden: {version: (descripcion, funcion(conexion))}
+MIGRACIONES = {}
+
+
+def migracion(version, descripcion):
+    def registrar(funcion):
+        if version in MIGRACIONES:
+            raise ValueError(f"Versión de migración duplicada: {version}")
+        MIGRACIONES[version] = (descripcion, funcion)
+        return funcion
+    return registrar
+
+
+# Crea los índices declarados en el modelo que aún no existen en la base de datos
+def crear_indices(conexion, modelo, nombres):
+    for indice in modelo.__table__.indexes:
+        if indice.name in nombres:
+            indice.create(conexion, checkfirst=True)
+
+
+@migracion(1, "Índices trigram y por cédula/RUC para la búsqueda de clientes")
+def _indices_busqueda(conexion):
+    from services.busqueda_clientes import crear_indices_busqueda
+    crear_indices_busqueda(conexion)
+    crear_indices(conexion, Client, {"ix_clients_permisionario_cedula_ruc"})
+
+
+@migracion(2, "Índices compuestos por permisionario en clients y tiem_pro")
+def _indices_permisionario(conexion):
+    crear_indices(conexion, Client, {
+        "ix_clients_permisionario_estado",
+        "ix_clients_permisionario_codigo",
+    })
+    crear_indices(conexion, TiemPro, {
+        "ix_tiem_pro_permisionario_item",
+        "ix_tiem_pro_permisionario_fecha_hora_registro",
+        "ix_tiem_pro_permisionario_estado_incidencia",
+    })
+
+
+@migracion(3, "Tabla de contadores y backfill de números de incidencia")
+def _contadores_incidencias(conexion):
+    from services.numeracion import SERIE_INCIDENCIAS, backfill_contador
+    Contador.__table__.create(conexion, checkfirst=True)
+    backfill_contador(conexion, SERIE_INCIDENCIAS, TiemPro.item, TiemPro.permisionario)
+
+
+@migracion(4, "Backfill del contador de códigos de cliente")
+def _contadores_clientes(conexion):
+    from services.numeracion import SERIE_CLIENTES, backfill_contador
+    backfill_contador(conexion, SERIE_CLIENTES, Client.codigo, Client.permisionario)
+
+
+@migracion(5, "Tabla de reportes mensuales materializados")
+def _reportes_mensuales(conexion):
+    ReporteMensual.__table__.create(conexion, checkfirst=True)
+
+
+@migracion(6, "Cola de envío de encuestas (campañas y envíos)")
+def _cola_encuestas(conexion):
+    CampanaEncuesta.__table__.create(conexion, checkfirst=True)
+    EnvioEncuesta.__table__.create(conexion, checkfirst=True)
+
+
+@migracion(7, "Columna telefono_e164 en clients, backfill e índice")
+def _telefono_e164(conexion):
+    from services.telefonos import backfill_telefonos
+    columnas = {columna["name"] for columna in inspect(conexion).get_columns(Client.__tablename__)}
+    if "telefono_e164" not in columnas:
+        conexion.execute(text(f"ALTER TABLE {Client.__tablename__} ADD COLUMN telefono_e164 VARCHAR(16)"))
+    backfill_telefonos(conexion)
+    crear_indices(conexion, Client, {"ix_clients_permisionario_telefono_e164"})
+
+
+@migracion(8, "Segmento de audiencia en campanas_encuesta")
+def _segmento_campanas(conexion):
+    columnas = {columna["name"] for columna in inspect(conexion).get_columns(CampanaEncuesta.__tablename__)}
+    if "segmento" not in columnas:
+        tipo = CampanaEncuesta.__table__.c.segmento.type.compile(dialect=conexion.dialect)
+        conexion.execute(text(f"ALTER TABLE {CampanaEncuesta.__tablename__} ADD COLUMN segmento {tipo}"))
+
+
+@migracion(9, "Agregado de incidencias por mes, tipo, estado y provincia")
+def _agregados_incidencias(conexion):
+    from services.agregados_incidencias import reconstruir_agregados
+    AgregadoIncidencias.__table__.create(conexion, checkfirst=True)
+    reconstruir_agregados(conexion)
+
+
+@migracion(10, "Índices (permisionario, columna, id) para la paginación de clientes")
+def _indices_orden_clientes(conexion):
+    crear_indices(conexion, Client, {
+        "ix_clients_orden_cliente",
+        "ix_clients_orden_cedula_ruc",
+        "ix_clients_orden_correo",
+        "ix_clients_orden_estado",
+    })
+
+
+def versiones_aplicadas(conexion):
+    metadata_migraciones.create_all(conexion, checkfirst=True)
+    return set(conexion.execute(select(schema_migraciones.c.version)).scalars())
+
+
+def migraciones_pendientes(conexion):
+    aplicadas = versiones_aplicadas(conexion)
+    return [version for version in sorted(MIGRACIONES) if version not in aplicadas]
+
+
+# Aplica cada migración pendiente en su propia transacción y registra su versión
+def aplicar_migraciones(motor=None, hasta=None):
+    motor = motor or engine
+    with motor.begin() as conexion:
+        pendientes = migraciones_pendientes(conexion)
+
+    aplicadas = []
+    for version in pendientes:
+        if hasta is not None and version > hasta:
+            break
+        descripcion, funcion = MIGRACIONES[version]
+        with motor.begin() as conexion:
+            funcion(conexion)
+            conexion.execute(insert(schema_migraciones).values(
+                version=version, descripcion=descripcion, aplicada_en=datetime.now()
+            ))
+        print(f"Migración {version} aplicada: {descripcion}")
+        aplicadas.append(version)
+    return aplicadas
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migraciones de esquema de la base de datos")
+    parser.add_argument("--estado", action="store_true", help="Solo muestra las migraciones pendientes")
+    parser.add_argument("--hasta", type=int, help="Aplica las migraciones hasta esta versión")
+    args = parser.parse_args()
+
+    if args.estado:
+        with engine.begin() as conexion:
+            pendientes = migraciones_pendientes(conexion)
+        for version in sorted(MIGRACIONES):
+            estado = "pendiente" if version in pendientes else "aplicada"
+            print(f"{version:>4}  {estado:<10} {MIGRACIONES[version][0]}")
+    else:
+        if not aplicar_migraciones(hasta=args.hasta):
+            print("La base de datos está al día.")
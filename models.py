@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Numeric
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, Numeric, Index, JSON, ForeignKey
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -17,11 +17,26 @@ class Client(Base):
     ciudad = Column(String)
     direccion = Column(String)
     telefono = Column(String)
+    # Teléfono normalizado +593XXXXXXXXX, mantenido al crear/editar (services/telefonos.py)
+    telefono_e164 = Column(String(16))
     correo = Column(String, unique=True, index=True)
     fecha_de_inscripcion = Column(String)
     estado = Column(String)
     ip = Column(String)
 
+    # Índices para las consultas filtradas por permisionario (ver migraciones.py)
+    __table_args__ = (
+        Index("ix_clients_permisionario_estado", "permisionario", "estado"),
+        Index("ix_clients_permisionario_codigo", "permisionario", "codigo"),
+        Index("ix_clients_permisionario_cedula_ruc", "permisionario", "cedula_ruc"),
+        Index("ix_clients_permisionario_telefono_e164", "permisionario", "telefono_e164"),
+        # Paginación por keyset de la tabla de clientes (columna de orden, id)
+        Index("ix_clients_orden_cliente", "permisionario", "cliente", "id"),
+        Index("ix_clients_orden_cedula_ruc", "permisionario", "cedula_ruc", "id"),
+        Index("ix_clients_orden_correo", "permisionario", "correo", "id"),
+        Index("ix_clients_orden_estado", "permisionario", "estado", "id"),
+    )
+
 class TiemPro(Base):
     __tablename__ = 'tiem_pro'
     id = Column(Integer, primary_key=True, index=True)
@@ -41,6 +56,12 @@ class TiemPro(Base):
     permisionario = Column(String(200))
     estado_incidencia = Column(String(40))
 
+    __table_args__ = (
+        Index("ix_tiem_pro_permisionario_item", "permisionario", "item"),
+        Index("ix_tiem_pro_permisionario_fecha_hora_registro", "permisionario", "fecha_hora_registro"),
+        Index("ix_tiem_pro_permisionario_estado_incidencia", "permisionario", "estado_incidencia"),
+    )
+
 class Localidad(Base):
     __tablename__ = "dpa"
     cod_provincia=Column(Integer, primary_key=True, index=True)          
@@ -49,3 +70,68 @@ class Localidad(Base):
     provincia = Column(String)
     canton = Column(String)
     parroquia = Column(String)
+
+class Contador(Base):
+    __tablename__ = "contadores"
+    # Último número asignado por permisionario y serie (incidencias, clientes)
+    permisionario = Column(String(200), primary_key=True)
+    serie = Column(String(50), primary_key=True)
+    ultimo_valor = Column(BigInteger, nullable=False, default=0)
+
+class ReporteMensual(Base):
+    __tablename__ = "reportes_mensuales"
+    # Filas ya formateadas de un reporte del regulador para un mes cerrado.
+    # `version` es la versión de datos del mes (serie de contadores) con la que se generaron.
+    permisionario = Column(String(200), primary_key=True)
+    anio = Column(Integer, primary_key=True)
+    mes = Column(Integer, primary_key=True)
+    reporte = Column(String(50), primary_key=True)
+    filas = Column(JSON, nullable=False)
+    version = Column(BigInteger, nullable=False, default=0)
+    generado_en = Column(DateTime)
+
+class AgregadoIncidencias(Base):
+    __tablename__ = "agregados_incidencias"
+    # Totales de incidencias por permisionario, mes de registro, tipo, estado y provincia.
+    # Se actualiza en la misma transacción que cada escritura de tiem_pro; los textos nulos se
+    # guardan como "" y una fecha de registro nula como anio = mes = 0.
+    permisionario = Column(String(200), primary_key=True)
+    anio = Column(Integer, primary_key=True)
+    mes = Column(Integer, primary_key=True)
+    tipo_reclamo = Column(String(200), primary_key=True)
+    estado_incidencia = Column(String(40), primary_key=True)
+    provincia = Column(String(100), primary_key=True)
+    cantidad = Column(Integer, nullable=False, default=0)
+    cantidad_horas = Column(Integer, nullable=False, default=0)
+    suma_horas = Column(Numeric, nullable=False, default=0)
+    min_horas = Column(Numeric)
+    max_horas = Column(Numeric)
+
+class CampanaEncuesta(Base):
+    __tablename__ = "campanas_encuesta"
+    id = Column(Integer, primary_key=True)
+    permisionario = Column(String(200), nullable=False, index=True)
+    mensaje = Column(Text, nullable=False)
+    # Segmento de la audiencia ({criterio: [valores]}) y rangos de ids excluidos a mano
+    segmento = Column(JSON)
+    estado = Column(String(20), nullable=False, default="activa")
+    creada_en = Column(DateTime)
+
+class EnvioEncuesta(Base):
+    __tablename__ = "envios_encuesta"
+    # Un mensaje de una campaña: la cola que procesa el trabajador de encuestas
+    id = Column(Integer, primary_key=True)
+    campana_id = Column(Integer, ForeignKey("campanas_encuesta.id"), nullable=False)
+    telefono = Column(String(20), nullable=False)
+    estado = Column(String(20), nullable=False, default="pendiente")
+    intentos = Column(Integer, nullable=False, default=0)
+    proximo_intento = Column(DateTime)
+    tomado_en = Column(DateTime)
+    tomado_por = Column(String(100))
+    enviado_en = Column(DateTime)
+    ultimo_error = Column(Text)
+
+    __table_args__ = (
+        Index("ix_envios_encuesta_estado_proximo_intento", "estado", "proximo_intento"),
+        Index("ix_envios_encuesta_campana_estado", "campana_id", "estado"),
+    )
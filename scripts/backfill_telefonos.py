@@ -0,0 +1,9 @@
+from database import engine
+from services.telefonos import backfill_telefonos
+
+
+# Completa telefono_e164 de los clientes sin número normalizado (por ejemplo, filas cargadas fuera de la aplicación)
+if __name__ == "__main__":
+    with engine.begin() as conexion:
+        actualizados = backfill_telefonos(conexion)
+    print(f"Teléfonos normalizados: {actualizados}")
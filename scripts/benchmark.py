@@ -0,0 +1,188 @@
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from sqlalchemy import event, func, select
+from database import engine, session_scope
+from models import Client, TiemPro
+from services import consultas_incidencias as consultas
+from services.busqueda_clientes import buscar_clientes
+from services.cache_incidencias import _cargar_snapshot
+from services.clientes import contar_clientes, pagina_clientes, contar_audiencia, pagina_audiencia
+from services.dpa import recargar_dpa
+from services.exportacion import exportar_reportes
+from services.reportes import REPORTES
+from services.reportes_mensuales import obtener_filas, refrescar_reporte
+
+# Mide la ruta de datos de cada página (sin Streamlit ni cachés en memoria): tiempo, número de
+# consultas SQL y memoria máxima. Los resultados se guardan en JSON y se comparan con una base.
+
+
+# Cuenta las sentencias que ejecuta el motor mientras está activo
+class ContadorConsultas:
+    def __init__(self, motor):
+        self.motor = motor
+        self.total = 0
+
+    def _contar(self, *args):
+        self.total += 1
+
+    def __enter__(self):
+        self.total = 0
+        event.listen(self.motor, "before_cursor_execute", self._contar)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.motor, "before_cursor_execute", self._contar)
+
+
+# Permisionario más grande y más pequeño, y el último mes cerrado con incidencias del más grande
+def escenario():
+    with session_scope() as db:
+        por_permisionario = db.execute(
+            select(Client.permisionario, func.count()).group_by(Client.permisionario).order_by(func.count().desc())
+        ).all()
+        grande, pequeno = por_permisionario[0][0], por_permisionario[-1][0]
+        anios = consultas.obtener_anios_disponibles(db, grande)
+        termino = db.execute(select(Client.apellidos).where(Client.permisionario == grande).limit(1)).scalar()
+        cedula = db.execute(select(Client.cedula_ruc).where(Client.permisionario == grande).limit(1)).scalar()
+        clientes = db.execute(select(func.count()).select_from(Client)).scalar()
+        incidencias = db.execute(select(func.count()).select_from(TiemPro)).scalar()
+    hoy = datetime.now()
+    anio, mes = (hoy.year, hoy.month - 1) if hoy.month > 1 else (hoy.year - 1, 12)
+    return {
+        "grande": grande, "pequeno": pequeno, "anio": anio, "mes": mes,
+        "anio_completo": anios[1] if len(anios) > 1 else anios[0],
+        "termino": termino.split()[0], "cedula": cedula,
+        "clientes": clientes, "incidencias": incidencias,
+    }
+
+
+# Casos: nombre → función(db, escenario). Cada página aparece con las funciones de su ruta de datos.
+def casos(esc):
+    segmento = {"estados": ["ACTIVO"]}
+    reporte = "Reclamos Generales"
+
+    def pagina_profunda(db, esc):
+        cursor = None
+        for _ in range(20):
+            _, cursor = pagina_clientes(db, esc["grande"], tamano=50, despues=cursor)
+        return cursor
+
+    def reporte_mes_frio(db, esc):
+        return refrescar_reporte(db, esc["grande"], esc["anio"], esc["mes"], reporte)
+
+    def exportar_anio(db, esc):
+        periodos = [(esc["anio_completo"], mes) for mes in range(1, 13)]
+        return len(exportar_reportes(db, esc["grande"], periodos, list(REPORTES)).read())
+
+    return {
+        "dashboard.contar_clientes": lambda db, esc: contar_clientes(db, esc["grande"]),
+        "dashboard.primera_pagina": lambda db, esc: pagina_clientes(db, esc["grande"], tamano=50),
+        "dashboard.pagina_20": pagina_profunda,
+        "dashboard.buscar_nombre": lambda db, esc: buscar_clientes(db, esc["grande"], esc["termino"], campos=["cliente", "cedula_ruc"]),
+        "dashboard.buscar_cedula": lambda db, esc: buscar_clientes(db, esc["grande"], esc["cedula"], campos=["cliente", "cedula_ruc"]),
+        "client_management.recargar_dpa": lambda db, esc: recargar_dpa(),
+        "incidencias.snapshot": lambda db, esc: _cargar_snapshot(db, esc["grande"]),
+        "incidencias.snapshot_pequeno": lambda db, esc: _cargar_snapshot(db, esc["pequeno"]),
+        "incidencias.kpis": lambda db, esc: consultas.obtener_kpis(db, esc["grande"]),
+        "estadisticas.valores_filtro": lambda db, esc: consultas.obtener_valores_filtro(db, esc["grande"]),
+        "estadisticas.conteo_tipo": lambda db, esc: consultas.obtener_conteo_por(db, "tipo_reclamo", esc["grande"]),
+        "estadisticas.conteo_mes": lambda db, esc: consultas.obtener_conteo_por(db, "mes", esc["grande"]),
+        "estadisticas.resumen_tipo": lambda db, esc: consultas.obtener_resumen_por_tipo(db, esc["grande"]),
+        "reporteria.anios": lambda db, esc: consultas.obtener_anios_disponibles(db, esc["grande"]),
+        "reporteria.reporte_mes_frio": reporte_mes_frio,
+        "reporteria.reporte_mes_materializado": lambda db, esc: obtener_filas(db, esc["grande"], esc["anio"], esc["mes"], reporte),
+        "reporteria.exportar_anio": exportar_anio,
+        "encuestas.contar_audiencia": lambda db, esc: contar_audiencia(db, esc["grande"], segmento),
+        "encuestas.pagina_audiencia": lambda db, esc: pagina_audiencia(db, esc["grande"], segmento),
+    }
+
+
+# Ejecuta un caso `repeticiones` veces (más una de calentamiento) y una vez más con tracemalloc
+def medir(funcion, esc, repeticiones):
+    tiempos = []
+    with session_scope() as db:
+        funcion(db, esc)
+        for _ in range(repeticiones):
+            with ContadorConsultas(engine) as contador:
+                inicio = time.perf_counter()
+                funcion(db, esc)
+                tiempos.append(time.perf_counter() - inicio)
+        tracemalloc.start()
+        funcion(db, esc)
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return {
+        "tiempo_mediana_s": round(statistics.median(tiempos), 6),
+        "tiempo_min_s": round(min(tiempos), 6),
+        "consultas": contador.total,
+        "memoria_pico_mb": round(pico / 1024 / 1024, 3),
+    }
+
+
+def ejecutar(repeticiones=5, filtro=None):
+    esc = escenario()
+    resultados = {}
+    for nombre, funcion in casos(esc).items():
+        if filtro and filtro not in nombre:
+            continue
+        resultados[nombre] = medir(funcion, esc, repeticiones)
+        print(f"{nombre:<42} {resultados[nombre]['tiempo_mediana_s'] * 1000:>10.2f} ms "
+              f"{resultados[nombre]['consultas']:>4} consultas {resultados[nombre]['memoria_pico_mb']:>9.2f} MB")
+    return {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "motor": engine.dialect.name,
+            "python": platform.python_version(),
+            "repeticiones": repeticiones,
+            "escenario": esc,
+        },
+        "resultados": resultados,
+    }
+
+
+# Regresiones respecto a la base: más consultas, o tiempo/memoria por encima de la tolerancia
+def comparar(actual, base, tolerancia=0.25, minimo_s=0.005):
+    regresiones = []
+    for nombre, medida in actual["resultados"].items():
+        anterior = base["resultados"].get(nombre)
+        if anterior is None:
+            continue
+        if medida["consultas"] > anterior["consultas"]:
+            regresiones.append(f"{nombre}: consultas {anterior['consultas']} → {medida['consultas']}")
+        tiempo, tiempo_base = medida["tiempo_mediana_s"], anterior["tiempo_mediana_s"]
+        if tiempo > max(tiempo_base * (1 + tolerancia), tiempo_base + minimo_s):
+            regresiones.append(f"{nombre}: tiempo {tiempo_base * 1000:.1f} ms → {tiempo * 1000:.1f} ms")
+        memoria, memoria_base = medida["memoria_pico_mb"], anterior["memoria_pico_mb"]
+        if memoria > max(memoria_base * (1 + tolerancia), memoria_base + 1):
+            regresiones.append(f"{nombre}: memoria {memoria_base:.1f} MB → {memoria:.1f} MB")
+    return regresiones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de la ruta de datos de cada página (DATABASE_URL elige la base)")
+    parser.add_argument("--salida", default="benchmark.json", help="Archivo JSON con los resultados")
+    parser.add_argument("--base", help="Resultados de referencia con los que comparar")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Aumento relativo permitido de tiempo y memoria")
+    parser.add_argument("--solo", help="Solo los casos cuyo nombre contiene este texto")
+    args = parser.parse_args()
+
+    actual = ejecutar(args.repeticiones, args.solo)
+    with open(args.salida, "w", encoding="utf-8") as archivo:
+        json.dump(actual, archivo, indent=2, ensure_ascii=False)
+    print(f"Resultados en {args.salida}")
+
+    if args.base:
+        with open(args.base, encoding="utf-8") as archivo:
+            regresiones = comparar(actual, json.load(archivo), args.tolerancia)
+        for regresion in regresiones:
+            print(f"REGRESIÓN {regresion}")
+        if regresiones:
+            sys.exit(1)
+        print("Sin regresiones respecto a la base")
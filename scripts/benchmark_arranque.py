@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+# Mide el tiempo de importación del arranque (lo que se carga antes de mostrar el login) y el de
+# cada página en su primera visita, con `python -X importtime` en un proceso nuevo por medida.
+
+# Módulos de las páginas, en el orden del menú (ver MODULOS_PAGINAS en app.py)
+PAGINAS = [
+    "services.gestion_clientes",
+    "services.incidencias",
+    "services.importacion_incidencias",
+    "services.relacion_cliente",
+    "services.reporteria",
+    "services.estadisticas",
+]
+
+
+# Líneas "import time: propio | acumulado | módulo" de -X importtime → [(módulo, acumulado en µs, nivel)].
+# Cada módulo aparece después de los que importó, con un nivel más de sangría que ellos.
+def leer_importtime(salida):
+    modulos = []
+    for linea in salida.splitlines():
+        if not linea.startswith("import time:") or "self [us]" in linea:
+            continue
+        _, acumulado, nombre = linea[len("import time:"):].split("|")
+        nivel = (len(nombre) - len(nombre.lstrip()) - 1) // 2
+        modulos.append((nombre.strip(), int(acumulado), nivel))
+    return modulos
+
+
+# Importa `previos` y luego `modulo` en un intérprete nuevo; solo se cuenta lo que carga `modulo`
+def medir_importacion(modulo, previos=()):
+    codigo = "".join(f"import {previo}\n" for previo in previos) + f"import {modulo}\n"
+    resultado = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", codigo],
+        capture_output=True, text=True, cwd=os.getcwd(), env={**os.environ, "PYTHONWARNINGS": "ignore"},
+    )
+    if resultado.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {modulo}:\n{resultado.stderr[-2000:]}")
+    modulos = leer_importtime(resultado.stderr)
+    posicion = next((i for i, (nombre, _, nivel) in enumerate(modulos) if nombre == modulo and nivel == 0), None)
+    if posicion is None:
+        # Ya lo había cargado alguno de los módulos previos
+        return 0.0, {}
+    # Dependencias directas: las líneas de nivel 1 que preceden al módulo hasta el anterior de nivel 0
+    dependencias = {}
+    for nombre, acumulado, nivel in reversed(modulos[:posicion]):
+        if nivel == 0:
+            break
+        if nivel == 1:
+            dependencias[nombre] = acumulado / 1000
+    return modulos[posicion][1] / 1000, dependencias
+
+
+def medir(modulo, previos, repeticiones, detalle):
+    tiempos, dependencias = [], {}
+    for _ in range(repeticiones):
+        tiempo, deps = medir_importacion(modulo, previos)
+        tiempos.append(tiempo)
+        for nombre, ms in deps.items():
+            dependencias.setdefault(nombre, []).append(ms)
+    medianas = {nombre: statistics.median(valores) for nombre, valores in dependencias.items()}
+    mas_lentas = sorted(medianas.items(), key=lambda par: par[1], reverse=True)[:detalle]
+    return {
+        "tiempo_mediana_ms": round(statistics.median(tiempos), 1),
+        "dependencias_ms": {nombre: round(ms, 1) for nombre, ms in mas_lentas},
+    }
+
+
+# Arranque: streamlit y app (lo necesario para el login). Páginas: lo que cada una añade sobre el arranque.
+def ejecutar(repeticiones=5, detalle=8):
+    resultados = {
+        "streamlit": medir("streamlit", (), repeticiones, detalle),
+        "app": medir("app", ("streamlit",), repeticiones, detalle),
+    }
+    for pagina in PAGINAS:
+        resultados[pagina] = medir(pagina, ("app",), repeticiones, detalle)
+    for nombre, medida in resultados.items():
+        print(f"{nombre:<36} {medida['tiempo_mediana_ms']:>9.1f} ms")
+        for dependencia, ms in medida["dependencias_ms"].items():
+            print(f"    {dependencia:<32} {ms:>9.1f} ms")
+    return {
+        "meta": {
+            "fecha": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "repeticiones": repeticiones,
+        },
+        "resultados": resultados,
+    }
+
+
+# Regresiones respecto a la base: tiempo de importación por encima de la tolerancia
+def comparar(actual, base, tolerancia=0.25, minimo_ms=20):
+    regresiones = []
+    for nombre, medida in actual["resultados"].items():
+        anterior = base["resultados"].get(nombre)
+        if anterior is None:
+            continue
+        tiempo, tiempo_base = medida["tiempo_mediana_ms"], anterior["tiempo_mediana_ms"]
+        if tiempo > max(tiempo_base * (1 + tolerancia), tiempo_base + minimo_ms):
+            regresiones.append(f"{nombre}: importación {tiempo_base:.1f} ms → {tiempo:.1f} ms")
+    return regresiones
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiempo de importación del arranque y de cada página (-X importtime)")
+    parser.add_argument("--salida", default="benchmark_arranque.json", help="Archivo JSON con los resultados")
+    parser.add_argument("--base", help="Resultados de referencia con los que comparar")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--detalle", type=int, default=8, help="Dependencias más lentas que se muestran por módulo")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Aumento relativo permitido del tiempo")
+    args = parser.parse_args()
+
+    actual = ejecutar(args.repeticiones, args.detalle)
+    with open(args.salida, "w", encoding="utf-8") as archivo:
+        json.dump(actual, archivo, indent=2, ensure_ascii=False)
+    print(f"Resultados en {args.salida}")
+
+    if args.base:
+        with open(args.base, encoding="utf-8") as archivo:
+            regresiones = comparar(actual, json.load(archivo), args.tolerancia)
+        for regresion in regresiones:
+            print(f"REGRESIÓN {regresion}")
+        if regresiones:
+            sys.exit(1)
+        print("Sin regresiones respecto a la base")
@@ -0,0 +1,109 @@
+import argparse
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from database import engine
+from migraciones import aplicar_migraciones
+from services.busqueda_clientes import buscar_clientes
+from services.cache_incidencias import _cargar_snapshot
+from services.clientes import contar_clientes, pagina_clientes, contar_audiencia, pagina_audiencia
+from services.consultas_incidencias import (
+    obtener_kpis, obtener_conteo_por, obtener_resumen_por_tipo, obtener_valores_filtro,
+    obtener_anios_disponibles, NOMBRE_MES,
+)
+from services.reportes import REPORTES
+from services.reportes_mensuales import filas_exportacion
+
+
+# Consultas frecuentes de las páginas, filtradas por permisionario. Cada una llama a la función de
+# servicios que usa la página, así los planes corresponden siempre al SQL que se ejecuta de verdad.
+def consultas_frecuentes(permisionario, fecha):
+    mes = NOMBRE_MES[fecha.month]
+    reporte = next(iter(REPORTES))
+    segmento = {"estados": ["ACTIVO"]}
+    return {
+        "dashboard: contadores de clientes": lambda db: contar_clientes(db, permisionario),
+        "dashboard: primera página de clientes": lambda db: pagina_clientes(db, permisionario),
+        "dashboard: página siguiente por nombre (keyset)": lambda db: pagina_clientes(
+            db, permisionario, orden="cliente", despues=("M", 0)
+        ),
+        "dashboard: búsqueda por cédula/RUC": lambda db: buscar_clientes(db, permisionario, "1700000000", campos=["cedula_ruc"]),
+        "dashboard: búsqueda por nombre (trigram, sin tildes)": lambda db: buscar_clientes(db, permisionario, "pérez"),
+        "soporte: instantánea de incidencias": lambda db: _cargar_snapshot(db, permisionario),
+        "estadisticas: kpis (agregado)": lambda db: obtener_kpis(db, permisionario),
+        "estadisticas: kpis del mes y tipo (agregado)": lambda db: obtener_kpis(db, permisionario, mes, "Conectividad"),
+        "estadisticas: incidencias por tipo (agregado)": lambda db: obtener_conteo_por(db, "tipo_reclamo", permisionario, mes),
+        "estadisticas: resumen por tipo (agregado)": lambda db: obtener_resumen_por_tipo(db, permisionario),
+        "estadisticas: valores de los filtros (agregado)": lambda db: obtener_valores_filtro(db, permisionario),
+        "encuestas: tamaño de la audiencia": lambda db: contar_audiencia(db, permisionario, segmento),
+        "encuestas: página de la audiencia (keyset)": lambda db: pagina_audiencia(db, permisionario, segmento, despues=0),
+        "reporteria: años disponibles": lambda db: obtener_anios_disponibles(db, permisionario),
+        "reporteria: filas del reporte del mes": lambda db: list(
+            filas_exportacion(db, permisionario, fecha.year, fecha.month, reporte)
+        ),
+    }
+
+
+# Consultas SELECT que ejecuta `funcion(db)`, con sus parámetros ya en el formato del driver
+def capturar(conexion, funcion):
+    sentencias = []
+
+    def registrar(conn, cursor, sentencia, parametros, contexto, executemany):
+        if sentencia.lstrip().upper().startswith(("SELECT", "WITH")):
+            sentencias.append((sentencia, parametros))
+
+    event.listen(conexion, "before_cursor_execute", registrar)
+    try:
+        with Session(bind=conexion) as db:
+            funcion(db)
+    finally:
+        event.remove(conexion, "before_cursor_execute", registrar)
+    return sentencias
+
+
+# Plan de ejecución de una sentencia según el motor de base de datos
+def explicar(conexion, sentencia, parametros):
+    prefijo = "EXPLAIN QUERY PLAN " if conexion.dialect.name == "sqlite" else "EXPLAIN "
+    filas = conexion.exec_driver_sql(prefijo + sentencia, parametros).all()
+    return "\n".join(" | ".join(str(valor) for valor in fila) for fila in filas)
+
+
+# Planes de todas las sentencias de una consulta frecuente; las que fallan (por ejemplo, una tabla
+# que aún no existe antes de migrar) muestran el error
+def explicar_consulta(conexion, funcion):
+    punto = conexion.begin_nested()
+    try:
+        sentencias = capturar(conexion, funcion)
+    except Exception as e:
+        return f"(no disponible: {e.__class__.__name__}: {str(e).splitlines()[0]})"
+    finally:
+        punto.rollback()
+    return "\n".join(explicar(conexion, sentencia, parametros) for sentencia, parametros in sentencias)
+
+
+def planes(permisionario, fecha):
+    with engine.connect() as conexion:
+        return {nombre: explicar_consulta(conexion, funcion) for nombre, funcion in consultas_frecuentes(permisionario, fecha).items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Planes EXPLAIN de las consultas frecuentes, antes y después de migrar")
+    parser.add_argument("permisionario")
+    parser.add_argument("--fecha", type=datetime.fromisoformat, default=datetime.now(), help="Mes de reportería (AAAA-MM-DD)")
+    parser.add_argument("--aplicar", action="store_true", help="Aplica las migraciones pendientes entre ambos planes")
+    args = parser.parse_args()
+
+    antes = planes(args.permisionario, args.fecha)
+    despues = None
+    if args.aplicar:
+        aplicar_migraciones()
+        despues = planes(args.permisionario, args.fecha)
+
+    for nombre, plan in antes.items():
+        print(f"=== {nombre}")
+        print("--- antes" if despues else "---")
+        print(plan)
+        if despues:
+            print("--- después")
+            print(despues[nombre])
+        print()
@@ -0,0 +1,169 @@
+import argparse
+import time
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from database import engine, Base
+from models import Client, TiemPro, Localidad
+from migraciones import aplicar_migraciones
+from services.agregados_incidencias import reconstruir_agregados
+from services.carga_datos import insertar_dataframe
+from services.incidencias import OPCIONES_INCIDENCIAS, meses_espanol
+from services.telefonos import normalizar_telefonos
+
+# Datos sintéticos reproducibles para medir las páginas a escala (ver scripts/benchmark.py).
+# Los clientes y las incidencias se reparten entre los permisionarios con una distribución de
+# Zipf: el primero concentra la mayor parte, como ocurre con los operadores grandes.
+
+NOMBRES = ["MARIA", "JOSE", "LUIS", "ANA", "CARLOS", "ROSA", "JORGE", "LUCIA", "DIEGO", "SOFIA", "MIGUEL", "ELENA"]
+APELLIDOS = ["PEREZ", "GARCIA", "LOPEZ", "TORRES", "MORA", "VEGA", "CASTRO", "NUÑEZ", "ORTIZ", "RUIZ", "SALAZAR", "ANDRADE"]
+SERVICIOS = ["INTERNET", "TV", "INTERNET+TV"]
+PLANES = ["BASICO 20MB", "HOGAR 50MB", "PLUS 100MB", "PRO 300MB"]
+CANALES = ["PERSONALIZADO", "TELEFÓNICO", "OFICIO", "CORREO ELECTRÓNICO", "PÁGINA WEB"]
+TIPOS_RECLAMO = [tipo for tipos in OPCIONES_INCIDENCIAS.values() for tipo in tipos]
+MESES = np.array(list(meses_espanol.values()), dtype=object)
+
+
+def nombre_permisionario(numero):
+    return f"permisionario_{numero:02d}"
+
+
+# Filas por permisionario con pesos 1/k^sesgo (suman exactamente `total`)
+def repartir(total, permisionarios, sesgo):
+    pesos = 1.0 / np.arange(1, permisionarios + 1) ** sesgo
+    cantidades = np.floor(total * pesos / pesos.sum()).astype(np.int64)
+    cantidades[0] += total - cantidades.sum()
+    return cantidades
+
+
+# DPA sintética: `provincias` × `cantones` × `parroquias`. Localidad declara cod_provincia como
+# clave primaria, así que cada fila lleva su propio código.
+def generar_dpa(db, provincias=24, cantones=8, parroquias=4):
+    filas = [
+        {
+            "cod_provincia": (p * 100 + c) * 100 + q,
+            "cod_canton": p * 100 + c,
+            "cod_parroquia": (p * 100 + c) * 100 + q,
+            "provincia": f"PROVINCIA {p:02d}",
+            "canton": f"CANTON {p:02d}-{c:02d}",
+            "parroquia": f"PARROQUIA {p:02d}-{c:02d}-{q:02d}",
+        }
+        for p in range(1, provincias + 1)
+        for c in range(1, cantones + 1)
+        for q in range(1, parroquias + 1)
+    ]
+    db.execute(insert(Localidad), filas)
+    db.commit()
+    return pd.DataFrame(filas)[["provincia", "canton"]].drop_duplicates().reset_index(drop=True)
+
+
+# Un lote de clientes; `desde` es la posición del primer cliente del lote en el permisionario
+def generar_clientes(rng, permisionario, inicio_id, desde, cantidad, dpa):
+    indices = np.arange(desde, desde + cantidad)
+    nombres = rng.choice(NOMBRES, cantidad)
+    apellidos = rng.choice(APELLIDOS, cantidad) + " " + rng.choice(APELLIDOS, cantidad)
+    lugares = dpa.iloc[rng.integers(0, len(dpa), cantidad)].reset_index(drop=True)
+    telefonos = pd.Series(rng.integers(90000000, 100000000, cantidad).astype(str)).radd("09")
+    inscripcion = pd.to_datetime("2015-01-01") + pd.to_timedelta(rng.integers(0, 3650, cantidad), unit="D")
+    return pd.DataFrame({
+        "permisionario": permisionario,
+        "codigo": pd.Series(indices + 1).map("{:04d}".format),
+        "nombres": nombres,
+        "apellidos": apellidos,
+        "cliente": pd.Series(nombres) + " " + apellidos,
+        "cedula_ruc": pd.Series(rng.integers(100000000, 2499999999, cantidad).astype(str)).str.zfill(10),
+        "servicio_contratado": rng.choice(SERVICIOS, cantidad),
+        "plan_contratado": rng.choice(PLANES, cantidad),
+        "provincia": lugares["provincia"],
+        "ciudad": lugares["canton"],
+        "direccion": "CALLE " + pd.Series(rng.integers(1, 500, cantidad).astype(str)),
+        "telefono": telefonos,
+        "telefono_e164": normalizar_telefonos(telefonos),
+        "correo": pd.Series(inicio_id + indices).map("cliente{}@ejemplo.com".format),
+        "fecha_de_inscripcion": inscripcion.strftime("%Y-%m-%d"),
+        "estado": np.where(rng.random(cantidad) < 0.8, "ACTIVO", "INACTIVO"),
+        "ip": None,
+    })
+
+
+def generar_incidencias(rng, permisionario, desde, cantidad, dpa, anios):
+    fin = datetime.now().replace(minute=0, second=0, microsecond=0)
+    registro = pd.Series(pd.Timestamp(fin) - pd.to_timedelta(rng.integers(0, anios * 365 * 24, cantidad), unit="h"))
+    horas = np.round(rng.exponential(30, cantidad), 2)
+    finalizada = rng.random(cantidad) < 0.85
+    solucion = (registro + pd.to_timedelta(horas, unit="h")).where(finalizada)
+    return pd.DataFrame({
+        "item": pd.Series(np.arange(desde + 1, desde + cantidad + 1)).astype(str),
+        "provincia": dpa["provincia"].to_numpy()[rng.integers(0, len(dpa), cantidad)],
+        "mes": MESES[registro.dt.month.to_numpy() - 1],
+        "fecha_hora_registro": registro,
+        "nombre_reclamante": rng.choice(NOMBRES, cantidad) + " " + rng.choice(APELLIDOS, cantidad),
+        "telefono_contacto": pd.Series(rng.integers(90000000, 100000000, cantidad).astype(str)).radd("09"),
+        "tipo_conexion": "NO CONMUTADA",
+        "canal_reclamo": rng.choice(CANALES, cantidad),
+        "tipo_reclamo": rng.choice(TIPOS_RECLAMO, cantidad),
+        "fecha_hora_solucion": solucion,
+        "tiempo_resolucion_horas": np.where(finalizada, horas, np.nan),
+        "descripcion_solucion": np.where(finalizada, "SOLUCIONADO", None),
+        "descripcion_incidencia": "INCIDENCIA SINTETICA",
+        "permisionario": permisionario,
+        "estado_incidencia": np.where(finalizada, "Finalizado", "Pendiente"),
+    })
+
+
+# Genera e inserta `total` filas por lotes; `generar(desde, cantidad)` devuelve un DataFrame
+def _insertar_por_lotes(db, modelo, total, tamano_lote, generar):
+    for desde in range(0, total, tamano_lote):
+        lote = generar(desde, min(tamano_lote, total - desde))
+        insertar_dataframe(db, modelo, lote.astype(object).where(lote.notna(), None))
+        db.commit()
+
+
+# Llena dpa, clients y tiem_pro. Las filas se generan e insertan por lotes, así que la memoria
+# depende de `tamano_lote` y no del total.
+def generar_datos(clientes, incidencias, permisionarios=10, sesgo=1.2, anios=3, semilla=42, tamano_lote=50000, motor=None):
+    motor = motor or engine
+    rng = np.random.default_rng(semilla)
+    Base.metadata.create_all(motor)
+    with Session(motor) as db:
+        dpa = generar_dpa(db)
+        inicio_id = 0
+        por_cliente = repartir(clientes, permisionarios, sesgo)
+        por_incidencia = repartir(incidencias, permisionarios, sesgo)
+        for numero, (cantidad_clientes, cantidad_incidencias) in enumerate(zip(por_cliente, por_incidencia), start=1):
+            permisionario = nombre_permisionario(numero)
+            inicio = time.perf_counter()
+            _insertar_por_lotes(
+                db, Client, int(cantidad_clientes), tamano_lote,
+                lambda desde, cantidad: generar_clientes(rng, permisionario, inicio_id, desde, cantidad, dpa)
+            )
+            _insertar_por_lotes(
+                db, TiemPro, int(cantidad_incidencias), tamano_lote,
+                lambda desde, cantidad: generar_incidencias(rng, permisionario, desde, cantidad, dpa, anios)
+            )
+            inicio_id += int(cantidad_clientes)
+            print(f"{permisionario}: {cantidad_clientes} clientes, {cantidad_incidencias} incidencias ({time.perf_counter() - inicio:.1f} s)")
+    # Índices, contadores y tablas auxiliares
+    aplicar_migraciones(motor)
+    # Las incidencias se insertan sin pasar por el registro: el agregado se recalcula al final
+    with motor.begin() as conexion:
+        reconstruir_agregados(conexion)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera datos sintéticos (DATABASE_URL apunta a PostgreSQL local o a SQLite)")
+    parser.add_argument("--clientes", type=int, default=10000)
+    parser.add_argument("--incidencias", type=int, default=10000)
+    parser.add_argument("--permisionarios", type=int, default=10)
+    parser.add_argument("--sesgo", type=float, default=1.2, help="Exponente de Zipf del reparto entre permisionarios")
+    parser.add_argument("--anios", type=int, default=3, help="Años de historia de incidencias")
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--tamano-lote", type=int, default=50000)
+    args = parser.parse_args()
+
+    generar_datos(
+        args.clientes, args.incidencias, args.permisionarios, args.sesgo,
+        args.anios, args.semilla, args.tamano_lote
+    )
@@ -0,0 +1,24 @@
+import argparse
+from database import session_scope
+from services.importacion_incidencias import TAMANO_LOTE, importar_incidencias
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa el histórico de incidencias (formato del regulador) desde un CSV o Excel (.xlsx)")
+    parser.add_argument("permisionario")
+    parser.add_argument("archivo")
+    parser.add_argument("--tamano-lote", type=int, default=TAMANO_LOTE, help="Filas por bloque")
+    parser.add_argument("--errores", default="errores_importacion_incidencias.csv", help="Archivo CSV con las filas rechazadas")
+    args = parser.parse_args()
+
+    def progreso(leidas, insertados):
+        print(f"Filas leídas: {leidas}  insertadas: {insertados}")
+
+    with open(args.archivo, "rb") as archivo, session_scope() as db:
+        resultado = importar_incidencias(db, args.permisionario, archivo, args.archivo, args.tamano_lote, progreso)
+
+    errores = resultado["errores"]
+    if not errores.empty:
+        errores.to_csv(args.errores, encoding="utf-8-sig")
+        print(f"{len(errores)} filas rechazadas; detalle en {args.errores}")
+    print(f"Incidencias importadas: {resultado['insertados']} de {resultado['leidas']}")
@@ -0,0 +1,15 @@
+import argparse
+from database import session_scope
+from services.reportes_mensuales import materializar_meses_cerrados
+
+
+# Materializa los reportes de los meses cerrados; pensado para ejecutarse periódicamente (cron)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materializa los reportes mensuales del regulador de los meses cerrados")
+    parser.add_argument("--permisionario", help="Solo este permisionario")
+    args = parser.parse_args()
+
+    with session_scope() as db:
+        revisados = materializar_meses_cerrados(db, args.permisionario)
+        db.commit()
+    print(f"Reportes mensuales revisados: {revisados}")
@@ -0,0 +1,30 @@
+import argparse
+from sqlalchemy import select, union
+from database import engine, session_scope
+from models import AgregadoIncidencias, Contador
+from services.agregados_incidencias import reconstruir_agregados
+from services.numeracion import marcar_datos_modificados
+
+
+# Recalcula el agregado de incidencias desde tiem_pro (reparación o después de cargas directas).
+# Después incrementa la versión de datos de los permisionarios para que las cachés de consultas
+# de todos los procesos dejen de servir los resultados anteriores.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstruye el agregado de incidencias desde tiem_pro")
+    parser.add_argument("--permisionario", help="Solo este permisionario")
+    args = parser.parse_args()
+
+    with engine.begin() as conexion:
+        grupos = reconstruir_agregados(conexion, args.permisionario)
+    print(f"Grupos del agregado reconstruidos: {grupos}")
+
+    with session_scope() as db:
+        if args.permisionario:
+            permisionarios = [args.permisionario]
+        else:
+            permisionarios = db.scalars(union(
+                select(AgregadoIncidencias.permisionario), select(Contador.permisionario)
+            )).all()
+        for permisionario in permisionarios:
+            marcar_datos_modificados(db, permisionario)
+        db.commit()
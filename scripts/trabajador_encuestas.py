@@ -0,0 +1,47 @@
+import argparse
+import threading
+from services.cola_encuestas import (
+    CONFIG_ENCUESTAS, EMISORES, LimitadorTasa, crear_emisor, ejecutar_trabajador, hilos_emisor, lote_maximo,
+)
+
+
+# Trabajador de la cola de encuestas: un proceso con varios hilos que comparten el límite de tasa.
+# Se pueden ejecutar varios procesos; en PostgreSQL se reparten la cola sin tomar el mismo envío.
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Procesa la cola de envío de encuestas por WhatsApp")
+    parser.add_argument("--emisor", choices=sorted(EMISORES), default=CONFIG_ENCUESTAS["emisor"])
+    parser.add_argument("--trabajadores", type=int, default=CONFIG_ENCUESTAS["trabajadores"], help="Hilos de envío")
+    parser.add_argument("--por-minuto", type=float, default=CONFIG_ENCUESTAS["mensajes_por_minuto"], help="Mensajes por minuto (todos los hilos)")
+    parser.add_argument("--lote", type=int, default=CONFIG_ENCUESTAS["lote"], help="Envíos que toma cada hilo por vez")
+    parser.add_argument("--una-vez", action="store_true", help="Termina cuando la cola queda vacía")
+    args = parser.parse_args()
+
+    emisor = crear_emisor(args.emisor)
+    trabajadores = hilos_emisor(emisor, args.trabajadores)
+    if trabajadores < args.trabajadores:
+        print(f"El emisor {args.emisor} admite {trabajadores} hilo(s); se usarán {trabajadores} en lugar de {args.trabajadores}")
+    limitador = LimitadorTasa(args.por_minuto)
+    maximo = lote_maximo(limitador, trabajadores, emisor.duracion)
+    if args.lote > maximo:
+        print(f"Lote reducido a {maximo}: con {trabajadores} hilos a {args.por_minuto:g} mensajes por minuto y "
+              f"{emisor.duracion:g} s por envío, un lote mayor no se envía dentro de los "
+              f"{CONFIG_ENCUESTAS['bloqueo_segundos']} s de bloqueo")
+    detener = threading.Event()
+    hilos = [
+        threading.Thread(
+            target=ejecutar_trabajador, name=f"encuestas-{numero}",
+            args=(emisor, limitador, detener, args.lote), kwargs={"una_vez": args.una_vez, "hilos": trabajadores}
+        )
+        for numero in range(trabajadores)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    try:
+        for hilo in hilos:
+            while hilo.is_alive():
+                hilo.join(timeout=1)
+    except KeyboardInterrupt:
+        detener.set()
+        for hilo in hilos:
+            hilo.join()
+    print(f"Trabajador de encuestas detenido ({args.emisor})")
@@ -0,0 +1,184 @@
+import pandas as pd
+from sqlalchemy import select, update, delete, insert, func, case, extract, literal_column
+from sqlalchemy.dialects import postgresql, sqlite
+from models import AgregadoIncidencias, TiemPro
+from services.consultas_incidencias import rango_mes
+
+Agregado = AgregadoIncidencias
+
+CLAVE = ["permisionario", "anio", "mes", "tipo_reclamo", "estado_incidencia", "provincia"]
+TEXTOS_CLAVE = ["tipo_reclamo", "estado_incidencia", "provincia"]
+
+
+# Posición de una incidencia en el agregado: su clave y sus horas de resolución.
+# Se toma antes de editar la incidencia para poder descontarla del grupo anterior.
+def estado_agregado(incidencia):
+    fecha = incidencia.fecha_hora_registro
+    clave = {
+        "permisionario": incidencia.permisionario,
+        "anio": fecha.year if fecha else 0,
+        "mes": fecha.month if fecha else 0,
+        **{campo: getattr(incidencia, campo) or "" for campo in TEXTOS_CLAVE},
+    }
+    horas = incidencia.tiempo_resolucion_horas
+    return clave, float(horas) if horas is not None else None
+
+
+def _grupo(clave, horas):
+    return {
+        **clave,
+        "cantidad": 1,
+        "cantidad_horas": 0 if horas is None else 1,
+        "suma_horas": horas or 0,
+        "min_horas": horas,
+        "max_horas": horas,
+    }
+
+
+# Suma grupos {clave, cantidad, cantidad_horas, suma_horas, min_horas, max_horas} al agregado
+# con un UPSERT por grupo, en la transacción del llamador
+def acumular(db, grupos):
+    if not grupos:
+        return
+    dialecto = db.bind.dialect.name
+    if dialecto in ("postgresql", "sqlite"):
+        insert_dialecto = postgresql.insert if dialecto == "postgresql" else sqlite.insert
+        sentencia = insert_dialecto(Agregado)
+        nuevo = sentencia.excluded
+        db.execute(sentencia.on_conflict_do_update(
+            index_elements=[getattr(Agregado, campo) for campo in CLAVE],
+            set_={
+                "cantidad": Agregado.cantidad + nuevo.cantidad,
+                "cantidad_horas": Agregado.cantidad_horas + nuevo.cantidad_horas,
+                "suma_horas": Agregado.suma_horas + nuevo.suma_horas,
+                "min_horas": case(
+                    (Agregado.min_horas.is_(None), nuevo.min_horas),
+                    (nuevo.min_horas < Agregado.min_horas, nuevo.min_horas),
+                    else_=Agregado.min_horas,
+                ),
+                "max_horas": case(
+                    (Agregado.max_horas.is_(None), nuevo.max_horas),
+                    (nuevo.max_horas > Agregado.max_horas, nuevo.max_horas),
+                    else_=Agregado.max_horas,
+                ),
+            },
+        ), grupos)
+    else:
+        # Otros motores: bloqueo explícito de la fila del grupo
+        for grupo in grupos:
+            fila = db.execute(
+                select(Agregado).where(*[getattr(Agregado, campo) == grupo[campo] for campo in CLAVE]).with_for_update()
+            ).scalar_one_or_none()
+            if fila is None:
+                db.add(Agregado(**grupo))
+                continue
+            fila.cantidad += grupo["cantidad"]
+            fila.cantidad_horas += grupo["cantidad_horas"]
+            fila.suma_horas += grupo["suma_horas"]
+            extremos = [valor for valor in (fila.min_horas, grupo["min_horas"]) if valor is not None]
+            fila.min_horas = min(extremos) if extremos else None
+            extremos = [valor for valor in (fila.max_horas, grupo["max_horas"]) if valor is not None]
+            fila.max_horas = max(extremos) if extremos else None
+        db.flush()
+
+
+def sumar_incidencia(db, incidencia):
+    acumular(db, [_grupo(*estado_agregado(incidencia))])
+
+
+# Filtros de tiem_pro equivalentes a la clave de un grupo
+def _filtros_grupo(clave):
+    filtros = [TiemPro.permisionario == clave["permisionario"]]
+    if clave["anio"]:
+        inicio, fin = rango_mes(clave["anio"], clave["mes"])
+        filtros += [TiemPro.fecha_hora_registro >= inicio, TiemPro.fecha_hora_registro < fin]
+    else:
+        filtros.append(TiemPro.fecha_hora_registro.is_(None))
+    filtros += [func.coalesce(getattr(TiemPro, campo), "") == clave[campo] for campo in TEXTOS_CLAVE]
+    return filtros
+
+
+# Resta una incidencia de su grupo. Si sus horas eran el mínimo o el máximo del grupo, ambos se
+# recalculan desde tiem_pro (solo las filas de ese grupo y mes); un grupo vacío se elimina.
+def descontar(db, clave, horas):
+    filtro = [getattr(Agregado, campo) == valor for campo, valor in clave.items()]
+    db.execute(update(Agregado).where(*filtro).values(
+        cantidad=Agregado.cantidad - 1,
+        cantidad_horas=Agregado.cantidad_horas - (0 if horas is None else 1),
+        suma_horas=Agregado.suma_horas - (horas or 0),
+    ))
+    fila = db.execute(select(Agregado.cantidad, Agregado.min_horas, Agregado.max_horas).where(*filtro)).first()
+    if fila is None:
+        # Grupo ausente (agregado sin reconstruir): lo corrige reconstruir_agregados
+        return
+    if fila.cantidad <= 0:
+        db.execute(delete(Agregado).where(*filtro))
+    elif horas is not None and (
+        fila.min_horas is None or horas <= float(fila.min_horas) or horas >= float(fila.max_horas)
+    ):
+        # La incidencia editada aún no está en la base: se escribe antes de recalcular
+        db.flush()
+        minimo, maximo = db.execute(
+            select(func.min(TiemPro.tiempo_resolucion_horas), func.max(TiemPro.tiempo_resolucion_horas))
+            .where(*_filtros_grupo(clave))
+        ).one()
+        db.execute(update(Agregado).where(*filtro).values(min_horas=minimo, max_horas=maximo))
+
+
+# Mueve una incidencia editada de su grupo anterior (`anterior` = estado_agregado antes de editar)
+# al que le corresponde ahora; no hace nada si la clave y las horas no cambiaron
+def actualizar_incidencia(db, anterior, incidencia):
+    actual = estado_agregado(incidencia)
+    if actual == anterior:
+        return
+    descontar(db, *anterior)
+    acumular(db, [_grupo(*actual)])
+
+
+# Suma al agregado un bloque de incidencias importadas (DataFrame con las columnas de TiemPro)
+def acumular_dataframe(db, registros):
+    fechas = pd.to_datetime(registros["fecha_hora_registro"])
+    datos = pd.DataFrame({
+        "permisionario": registros["permisionario"],
+        "anio": fechas.dt.year.fillna(0).astype(int),
+        "mes": fechas.dt.month.fillna(0).astype(int),
+        **{campo: registros[campo].fillna("") for campo in TEXTOS_CLAVE},
+        "horas": pd.to_numeric(registros["tiempo_resolucion_horas"]),
+    })
+    grupos = datos.groupby(CLAVE)["horas"].agg(
+        cantidad="size", cantidad_horas="count", suma_horas="sum", min_horas="min", max_horas="max"
+    ).reset_index()
+    grupos = grupos.astype(object).where(grupos.notna(), None)
+    acumular(db, [
+        {**grupo, "cantidad": int(grupo["cantidad"]), "cantidad_horas": int(grupo["cantidad_horas"]), "anio": int(grupo["anio"]), "mes": int(grupo["mes"])}
+        for grupo in grupos.to_dict("records")
+    ])
+
+
+# Recalcula el agregado desde tiem_pro (todo o un permisionario) con un INSERT ... SELECT.
+# Sirve para repararlo y después de cargas que no pasan por el registro de incidencias.
+def reconstruir_agregados(conexion, permisionario=None):
+    borrar = delete(Agregado)
+    # Literales en línea: con parámetros, PostgreSQL no reconoce las expresiones del GROUP BY
+    clave = [
+        TiemPro.permisionario,
+        func.coalesce(extract("year", TiemPro.fecha_hora_registro), literal_column("0")),
+        func.coalesce(extract("month", TiemPro.fecha_hora_registro), literal_column("0")),
+        *[func.coalesce(getattr(TiemPro, campo), literal_column("''")) for campo in TEXTOS_CLAVE],
+    ]
+    origen = select(
+        *clave,
+        func.count(),
+        func.count(TiemPro.tiempo_resolucion_horas),
+        func.coalesce(func.sum(TiemPro.tiempo_resolucion_horas), literal_column("0")),
+        func.min(TiemPro.tiempo_resolucion_horas),
+        func.max(TiemPro.tiempo_resolucion_horas),
+    ).where(TiemPro.permisionario.is_not(None))
+    if permisionario is not None:
+        borrar = borrar.where(Agregado.permisionario == permisionario)
+        origen = origen.where(TiemPro.permisionario == permisionario)
+    origen = origen.group_by(*clave)
+    conexion.execute(borrar)
+    return conexion.execute(insert(Agregado).from_select(
+        CLAVE + ["cantidad", "cantidad_horas", "suma_horas", "min_horas", "max_horas"], origen
+    )).rowcount
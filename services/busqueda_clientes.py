@@ -0,0 +1,88 @@
+import unicodedata
+from sqlalchemy import func, or_, case
+from models import Client
+
+
+# Campos de Client en los que se puede buscar
+CAMPOS_BUSQUEDA = ["cliente", "cedula_ruc", "nombres", "correo"]
+
+# Índices trigram sobre las columnas normalizadas (sin tildes y en minúsculas) en PostgreSQL.
+# `unaccent` no es IMMUTABLE, por eso se envuelve en f_unaccent para poder indexarla.
+SENTENCIAS_INDICES_BUSQUEDA = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS
+       $$ SELECT public.unaccent('public.unaccent', $1) $$
+       LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT""",
+] + [
+    f"CREATE INDEX IF NOT EXISTS ix_clients_{campo}_trgm ON clients "
+    f"USING gin (f_unaccent(lower({campo})) gin_trgm_ops)"
+    for campo in CAMPOS_BUSQUEDA
+] + [
+    "CREATE INDEX IF NOT EXISTS ix_clients_permisionario_cedula_ruc ON clients (permisionario, cedula_ruc)",
+]
+
+
+# Función para crear los índices de búsqueda (solo PostgreSQL; se aplica desde migraciones.py)
+def crear_indices_busqueda(conexion):
+    if conexion.dialect.name != "postgresql":
+        return
+    for sentencia in SENTENCIAS_INDICES_BUSQUEDA:
+        conexion.exec_driver_sql(sentencia)
+
+
+# Quita tildes y pasa a minúsculas, igual que f_unaccent(lower(...)) en la base de datos
+def normalizar(texto):
+    descompuesto = unicodedata.normalize("NFKD", texto.lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+# normalizar() sobre una Series, calculado una vez por valor distinto
+def normalizar_serie(serie):
+    return serie.map({valor: normalizar(valor) for valor in serie.unique()})
+
+
+def _es_cedula_ruc(termino):
+    return termino.isdigit() and len(termino) in (10, 13)
+
+
+def _expresion_normalizada(db, campo):
+    columna = getattr(Client, campo)
+    if db.bind.dialect.name == "postgresql":
+        return func.f_unaccent(func.lower(columna))
+    return func.lower(columna)
+
+
+# Búsqueda de clientes del permisionario en la base de datos.
+# Una cédula/RUC completa se resuelve primero por igualdad exacta; si no, se busca por
+# subcadena sin tildes ni mayúsculas (con índice trigram en PostgreSQL) y se ordena por relevancia.
+def buscar_clientes(db, permisionario, termino, campos=CAMPOS_BUSQUEDA, limite=50):
+    termino = (termino or "").strip()
+    if not termino:
+        return []
+
+    consulta = db.query(Client).filter(Client.permisionario == permisionario)
+
+    if "cedula_ruc" in campos and _es_cedula_ruc(termino):
+        exactos = consulta.filter(Client.cedula_ruc == termino).limit(limite).all()
+        if exactos:
+            return exactos
+
+    # Sin f_unaccent (otros motores) solo se ignoran las mayúsculas
+    es_postgresql = db.bind.dialect.name == "postgresql"
+    normalizado = normalizar(termino) if es_postgresql else termino.lower()
+    escapado = normalizado.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    expresiones = [_expresion_normalizada(db, campo) for campo in campos]
+
+    # Relevancia: coincidencia exacta, luego prefijo, luego similitud trigram (PostgreSQL)
+    orden = [
+        case(*[(expresion == normalizado, 0) for expresion in expresiones], else_=1),
+        case(*[(expresion.like(escapado + "%", escape="\\"), 0) for expresion in expresiones], else_=1),
+    ]
+    if es_postgresql:
+        orden.append(func.greatest(*[func.similarity(expresion, normalizado) for expresion in expresiones]).desc())
+    orden.append(Client.id)
+
+    return consulta.filter(
+        or_(*[expresion.like("%" + escapado + "%", escape="\\") for expresion in expresiones])
+    ).order_by(*orden).limit(limite).all()
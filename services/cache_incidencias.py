@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+from database import session_scope, configuracion
+from models import TiemPro
+from services.carga_datos import cargar_dataframe
+from services.numeracion import version_datos
+
+
+# Caché en memoria compartida por todas las sesiones del proceso.
+# Cada permisionario tiene un número de versión local que se incrementa con cada escritura del proceso
+# y, además, cada entrada guarda la versión de datos de la base (`version_datos`) con la que se cargó,
+# que cambian también los importadores, la reconstrucción del agregado y las demás réplicas.
+# Una carga iniciada antes de una invalidación no se guarda, así nunca se sirven datos viejos.
+class CacheIncidencias:
+    def __init__(self, ttl_segundos=300, max_entradas=128):
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._versiones = {}
+        self._versiones_mes = {}
+        self._epocas = {}
+        self._suscriptores = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def version(self, permisionario):
+        with self._lock:
+            return self._versiones.get(permisionario, 0)
+
+    # Versión de un mes concreto: solo cambia cuando se escribe una incidencia registrada en ese mes
+    def version_mes(self, permisionario, anio, mes):
+        with self._lock:
+            return (self._epocas.get(permisionario, 0), self._versiones_mes.get((permisionario, anio, mes), 0))
+
+    # `version_bd` es la versión de datos leída de la base justo antes de la consulta
+    def obtener(self, permisionario, clave, cargar, version_bd=0):
+        llave = (permisionario, clave)
+        ahora = time.monotonic()
+        with self._lock:
+            version = (self._versiones.get(permisionario, 0), version_bd)
+            entrada = self._entradas.get(llave)
+            if entrada and entrada[0] == version and entrada[1] > ahora:
+                self._entradas.move_to_end(llave)
+                self.hits += 1
+                return entrada[2]
+            self.misses += 1
+
+        # La carga se hace fuera del lock para no bloquear a otras sesiones
+        valor = cargar()
+
+        with self._lock:
+            if self._versiones.get(permisionario, 0) == version[0]:
+                self._entradas[llave] = (version, time.monotonic() + self.ttl_segundos, valor)
+                self._entradas.move_to_end(llave)
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+        return valor
+
+    # Funciones `callback(permisionario, fecha)` que se llaman en cada invalidación
+    def suscribir(self, callback):
+        self._suscriptores.append(callback)
+
+    # `fecha` es la fecha de registro de la incidencia escrita; sin ella se invalidan todos los meses
+    def invalidar(self, permisionario, fecha=None):
+        with self._lock:
+            self._versiones[permisionario] = self._versiones.get(permisionario, 0) + 1
+            if fecha is not None:
+                llave_mes = (permisionario, fecha.year, fecha.month)
+                self._versiones_mes[llave_mes] = self._versiones_mes.get(llave_mes, 0) + 1
+            else:
+                self._epocas[permisionario] = self._epocas.get(permisionario, 0) + 1
+            for llave in [llave for llave in self._entradas if llave[0] == permisionario]:
+                del self._entradas[llave]
+        for callback in self._suscriptores:
+            callback(permisionario, fecha)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / consultas if consultas else 0.0,
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl_segundos,
+            }
+
+
+_config = configuracion("cache_incidencias")
+cache_incidencias = CacheIncidencias(
+    ttl_segundos=_config.get("ttl_segundos", 300),
+    max_entradas=_config.get("max_entradas", 128),
+)
+
+
+# Ejecuta una consulta `funcion(db, *args)` y guarda su resultado en la caché del permisionario.
+# Cada lectura consulta antes la versión de datos en la base (una fila de `contadores`).
+def consultar(permisionario, clave, funcion, *args):
+    with session_scope() as db:
+        version_bd = version_datos(db, permisionario)
+        return cache_incidencias.obtener(permisionario, clave, lambda: funcion(db, *args), version_bd)
+
+
+# Columnas de TiemPro que forman la instantánea de incidencias
+COLUMNAS_SNAPSHOT = [
+    "id", "item", "provincia", "mes", "fecha_hora_registro", "nombre_reclamante",
+    "telefono_contacto", "tipo_conexion", "canal_reclamo", "tipo_reclamo",
+    "fecha_hora_solucion", "tiempo_resolucion_horas", "descripcion_solucion",
+    "descripcion_incidencia", "permisionario", "estado_incidencia"
+]
+
+
+# Campos de baja cardinalidad que se cargan como `category`
+CATEGORIAS_SNAPSHOT = [
+    "provincia", "mes", "tipo_conexion", "canal_reclamo", "tipo_reclamo",
+    "permisionario", "estado_incidencia"
+]
+
+
+def _cargar_snapshot(db, permisionario):
+    return cargar_dataframe(
+        db, TiemPro, COLUMNAS_SNAPSHOT,
+        filtros=[TiemPro.permisionario == permisionario],
+        orden=TiemPro.id,
+        categorias=CATEGORIAS_SNAPSHOT
+    )
+
+
+# Instantánea de todas las incidencias del permisionario (compartida; no modificar en el lugar)
+def obtener_snapshot(permisionario):
+    return consultar(permisionario, "snapshot", _cargar_snapshot, permisionario)
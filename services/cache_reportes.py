@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+from database import configuracion, session_scope
+from services.cache_incidencias import cache_incidencias
+from services.numeracion import versiones_meses
+
+
+# Caché de libros de Excel ya generados, limitada por bytes con expulsión LRU.
+# La clave incluye la versión de cada mes del libro, y al registrar o finalizar una
+# incidencia en este proceso se expulsan los libros que contienen ese mes.
+class CacheLibros:
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            datos = self._entradas.get(clave)
+            if datos is None:
+                self.misses += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.hits += 1
+            return datos
+
+    def guardar(self, clave, datos):
+        if len(datos) > self.max_bytes:
+            return
+        with self._lock:
+            anterior = self._entradas.pop(clave, None)
+            if anterior is not None:
+                self._bytes -= len(anterior)
+            self._entradas[clave] = datos
+            self._bytes += len(datos)
+            while self._bytes > self.max_bytes:
+                _, expulsado = self._entradas.popitem(last=False)
+                self._bytes -= len(expulsado)
+
+    # Expulsa los libros del permisionario que incluyen el mes de `fecha` (todos si no hay fecha)
+    def invalidar(self, permisionario, fecha=None):
+        with self._lock:
+            for clave in list(self._entradas):
+                permisionario_clave, periodos = clave[0], clave[1]
+                if permisionario_clave != permisionario:
+                    continue
+                if fecha is None or (fecha.year, fecha.month) in periodos:
+                    self._bytes -= len(self._entradas.pop(clave))
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entradas": len(self._entradas),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+_config = configuracion("cache_reportes")
+cache_libros = CacheLibros(max_bytes=_config.get("max_bytes", 64 * 1024 * 1024))
+cache_incidencias.suscribir(cache_libros.invalidar)
+
+
+# Clave de un libro: permisionario, periodos, reportes y la versión de datos de cada mes. La versión
+# de la base (contadores reporte_AAAA_MM) cubre las escrituras de otros procesos; la del proceso,
+# las invalidaciones locales que no pasan por el contador.
+def clave_libro(permisionario, periodos, reportes):
+    with session_scope() as db:
+        versiones_bd = versiones_meses(db, permisionario, periodos)
+    versiones = tuple(
+        (versiones_bd[(anio, mes)], cache_incidencias.version_mes(permisionario, anio, mes)) for anio, mes in periodos
+    )
+    return (permisionario, tuple(periodos), tuple(reportes), versiones)
+
+
+# Bytes del libro si ya fue generado; `generar()` solo se llama cuando no está en caché
+def obtener_libro(permisionario, periodos, reportes, generar=None):
+    clave = clave_libro(permisionario, periodos, reportes)
+    datos = cache_libros.obtener(clave)
+    if datos is None and generar is not None:
+        datos = generar()
+        cache_libros.guardar(clave, datos)
+    return datos
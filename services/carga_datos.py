@@ -0,0 +1,109 @@
+import csv
+import io
+from datetime import datetime
+import pandas as pd
+from openpyxl import load_workbook
+from sqlalchemy import select, insert, DateTime, Integer, Numeric
+
+
+# Tipo de pandas para cada tipo de columna SQL
+def _dtype_columna(columna, categorica):
+    if categorica:
+        return "category"
+    if isinstance(columna.type, DateTime):
+        return "datetime64[ns]"
+    if isinstance(columna.type, Integer):
+        return "Int64"
+    if isinstance(columna.type, Numeric):
+        return "float64"
+    return object
+
+
+# Carga un DataFrame columna por columna desde una consulta Core, sin crear objetos ORM.
+# `columnas` es una lista de campos del modelo o un diccionario {campo: etiqueta} con los
+# nombres que verá la página; `categorias` son los campos de baja cardinalidad que se
+# guardan como `category` para ahorrar memoria.
+def cargar_dataframe(db, modelo, columnas, filtros=(), orden=None, limite=None, categorias=(), tamano_lote=10000):
+    etiquetas = columnas if isinstance(columnas, dict) else {campo: campo for campo in columnas}
+    campos = list(etiquetas)
+    atributos = [getattr(modelo, campo) for campo in campos]
+
+    consulta = select(*atributos).where(*filtros)
+    if orden is not None:
+        consulta = consulta.order_by(*(orden if isinstance(orden, (list, tuple)) else [orden]))
+    if limite is not None:
+        consulta = consulta.limit(limite)
+
+    # Cursor del lado del servidor: las filas llegan por lotes y se reparten en listas por columna
+    valores = [[] for _ in campos]
+    resultado = db.execute(consulta.execution_options(stream_results=True, yield_per=tamano_lote))
+    for lote in resultado.partitions():
+        for lista, columna in zip(valores, zip(*lote)):
+            lista.extend(columna)
+
+    datos = {}
+    for campo, atributo in zip(campos, atributos):
+        lista = valores.pop(0)
+        datos[etiquetas[campo]] = pd.Series(lista, dtype=_dtype_columna(atributo, campo in categorias))
+    return pd.DataFrame(datos, columns=[etiquetas[campo] for campo in campos])
+
+
+def _texto(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=" ")
+    return str(valor).strip()
+
+
+# Lee un CSV o un Excel (.xlsx) por bloques de `tamano_lote` filas, todo como texto.
+# `nombre_columna(encabezado)` traduce los encabezados del archivo a nombres de campo.
+# El índice de cada bloque es el número de fila del archivo (el encabezado es la fila 1).
+def leer_por_bloques(archivo, nombre_archivo, nombre_columna, tamano_lote=5000):
+    if nombre_archivo.lower().endswith(".xlsx"):
+        libro = load_workbook(archivo, read_only=True, data_only=True)
+        filas = libro.active.iter_rows(values_only=True)
+        encabezados = [nombre_columna(valor) for valor in next(filas, ())]
+        bloque, inicio = [], 2
+        for fila in filas:
+            # Las filas con celdas finales vacías llegan más cortas que el encabezado
+            valores = [_texto(valor) for valor in fila[:len(encabezados)]]
+            bloque.append(valores + [""] * (len(encabezados) - len(valores)))
+            if len(bloque) == tamano_lote:
+                yield pd.DataFrame(bloque, columns=encabezados, index=range(inicio, inicio + len(bloque)))
+                inicio += len(bloque)
+                bloque = []
+        if bloque:
+            yield pd.DataFrame(bloque, columns=encabezados, index=range(inicio, inicio + len(bloque)))
+        libro.close()
+    else:
+        inicio = 2
+        for bloque in pd.read_csv(archivo, dtype=str, keep_default_na=False, chunksize=tamano_lote, encoding="utf-8-sig"):
+            bloque.columns = [nombre_columna(columna) for columna in bloque.columns]
+            bloque.index = range(inicio, inicio + len(bloque))
+            inicio += len(bloque)
+            yield bloque
+
+
+# Inserta un DataFrame en la tabla del modelo: COPY en PostgreSQL (psycopg2) y executemany
+# en los demás motores. Los valores nulos deben venir como None.
+def insertar_dataframe(db, modelo, registros):
+    if db.bind.dialect.driver == "psycopg2":
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        for fila in registros.itertuples(index=False):
+            escritor.writerow([r"\N" if valor is None else valor for valor in fila])
+        buffer.seek(0)
+        cursor = db.connection().connection.cursor()
+        cursor.copy_expert(
+            f"COPY {modelo.__tablename__} ({', '.join(registros.columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+            buffer,
+        )
+    else:
+        columnas = list(registros.columns)
+        db.execute(
+            insert(modelo.__table__),
+            [dict(zip(columnas, fila)) for fila in registros.itertuples(index=False, name=None)],
+        )
@@ -0,0 +1,162 @@
+import pandas as pd
+from sqlalchemy import select, func, tuple_
+from models import Client
+from services.carga_datos import cargar_dataframe
+
+
+# Columnas de la tabla de clientes del dashboard
+COLUMNAS_DASHBOARD = {
+    "id": "ID",
+    "cliente": "Cliente",
+    "cedula_ruc": "Cédula/RUC",
+    "correo": "Email",
+    "telefono": "Teléfono",
+    "estado": "Estado",
+}
+
+# Columnas por las que se puede ordenar la tabla paginada
+COLUMNAS_ORDEN = ["id", "cliente", "cedula_ruc", "correo", "estado"]
+
+
+# Contadores del dashboard (total, activos, inactivos) en una sola consulta con COUNT(*) FILTER
+def contar_clientes(db, permisionario):
+    fila = db.query(
+        func.count().label("total"),
+        func.count().filter(Client.estado == "ACTIVO").label("activos"),
+        func.count().filter(Client.estado == "INACTIVO").label("inactivos"),
+    ).filter(Client.permisionario == permisionario).one()
+    return {"total": fila.total, "activos": fila.activos, "inactivos": fila.inactivos}
+
+
+# Criterios de un segmento de audiencia → columna de Client
+CRITERIOS_SEGMENTO = {
+    "estados": Client.estado,
+    "provincias": Client.provincia,
+    "ciudades": Client.ciudad,
+    "planes": Client.plan_contratado,
+    "servicios": Client.servicio_contratado,
+}
+
+
+# Filtros de la audiencia de una campaña. `segmento` es {criterio: [valores]}; los criterios
+# vacíos no filtran. `excluidos` son ids de clientes quitados a mano.
+def filtros_audiencia(permisionario, segmento, excluidos=()):
+    filtros = [Client.permisionario == permisionario, Client.telefono_e164.is_not(None)]
+    for criterio, columna in CRITERIOS_SEGMENTO.items():
+        if segmento.get(criterio):
+            filtros.append(columna.in_(list(segmento[criterio])))
+    if excluidos:
+        filtros.append(Client.id.not_in(list(excluidos)))
+    return filtros
+
+
+# Vista previa del tamaño de la audiencia: clientes y teléfonos distintos, contados en SQL
+def contar_audiencia(db, permisionario, segmento, excluidos=()):
+    fila = db.execute(
+        select(func.count().label("clientes"), func.count(Client.telefono_e164.distinct()).label("telefonos"))
+        .where(*filtros_audiencia(permisionario, segmento, excluidos))
+    ).one()
+    return {"clientes": fila.clientes, "telefonos": fila.telefonos}
+
+
+# Página de la audiencia por keyset sobre id (sin aplicar las exclusiones, para poder revertirlas).
+# Devuelve las filas y el id desde el que empieza la página siguiente (None si es la última).
+def pagina_audiencia(db, permisionario, segmento, tamano=50, despues=None):
+    filtros = filtros_audiencia(permisionario, segmento)
+    if despues is not None:
+        filtros.append(Client.id > despues)
+    filas = db.execute(
+        select(Client.id, Client.cliente, Client.ciudad, Client.plan_contratado, Client.telefono_e164)
+        .where(*filtros)
+        .order_by(Client.id)
+        .limit(tamano + 1)
+    ).all()
+    siguiente = filas[tamano - 1].id if len(filas) > tamano else None
+    return filas[:tamano], siguiente
+
+
+# Valores distintos de plan y servicio del permisionario para los selectores de segmento
+def valores_segmento(db, permisionario):
+    valores = {}
+    for criterio in ("planes", "servicios"):
+        columna = CRITERIOS_SEGMENTO[criterio]
+        valores[criterio] = db.execute(
+            select(columna).where(Client.permisionario == permisionario, columna.is_not(None)).distinct().order_by(columna)
+        ).scalars().all()
+    return valores
+
+
+# Conjunto de ids compacto: lista ordenada de rangos [inicio, fin] (inclusivos)
+def comprimir_ids(ids):
+    rangos = []
+    for id_cliente in sorted(set(ids)):
+        if rangos and id_cliente == rangos[-1][1] + 1:
+            rangos[-1][1] = id_cliente
+        else:
+            rangos.append([id_cliente, id_cliente])
+    return rangos
+
+
+def expandir_ids(rangos):
+    return {id_cliente for inicio, fin in rangos for id_cliente in range(inicio, fin + 1)}
+
+
+# Tramos de la tabla ordenada por `orden`: los valores no nulos y, al final (o al principio en orden
+# descendente), los NULL, igual que los ordena un índice B-tree. Cada tramo se consulta sobre la columna
+# tal cual, así la condición del cursor y el ORDER BY usan el índice (permisionario, columna, id).
+def _tramos_orden(orden, descendente):
+    if orden == "id":
+        return [("valores", [])]
+    columna = getattr(Client, orden)
+    tramos = [("valores", [columna.is_not(None)]), ("nulos", [columna.is_(None)])]
+    return tramos[::-1] if descendente else tramos
+
+
+# Página de clientes por keyset sobre (columna de orden, id).
+# `despues` es el cursor (valor, id) devuelto por la página anterior, con valor None si la última fila
+# tenía la columna vacía; solo se materializan `tamano` filas.
+# Devuelve el DataFrame y el cursor de la página siguiente (None si es la última).
+def pagina_clientes(db, permisionario, tamano=50, orden="id", descendente=False, despues=None):
+    if orden not in COLUMNAS_ORDEN:
+        raise ValueError(f"Columna de orden no válida: {orden}")
+
+    tramos = _tramos_orden(orden, descendente)
+    if despues is not None:
+        # Se salta los tramos anteriores al del cursor
+        tramo_cursor = "nulos" if orden != "id" and despues[0] is None else "valores"
+        tramos = tramos[[nombre for nombre, _ in tramos].index(tramo_cursor):]
+
+    partes, restantes = [], tamano + 1
+    for posicion, (nombre, filtros_tramo) in enumerate(tramos):
+        filtros = [Client.permisionario == permisionario, *filtros_tramo]
+        columnas_orden = [Client.id] if nombre == "nulos" or orden == "id" else [getattr(Client, orden), Client.id]
+        if despues is not None and posicion == 0:
+            if len(columnas_orden) == 1:
+                filtros.append(Client.id < despues[1] if descendente else Client.id > despues[1])
+            else:
+                clave, cursor = tuple_(*columnas_orden), tuple_(*despues)
+                filtros.append(clave < cursor if descendente else clave > cursor)
+        if descendente:
+            columnas_orden = [columna.desc() for columna in columnas_orden]
+
+        parte = cargar_dataframe(
+            db, Client, COLUMNAS_DASHBOARD,
+            filtros=filtros,
+            orden=columnas_orden,
+            limite=restantes,
+            categorias=["estado"]
+        )
+        partes.append(parte)
+        restantes -= len(parte)
+        if restantes == 0:
+            break
+
+    partes = [parte for parte in partes if not parte.empty] or partes[:1]
+    df = pd.concat(partes, ignore_index=True) if len(partes) > 1 else partes[0]
+    siguiente = None
+    if len(df) > tamano:
+        df = df.iloc[:tamano]
+        ultima = df.iloc[-1]
+        valor = ultima[COLUMNAS_DASHBOARD[orden]]
+        siguiente = (None if pd.isna(valor) else valor, int(ultima["ID"]))
+    return df, siguiente
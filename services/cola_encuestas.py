@@ -0,0 +1,262 @@
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, insert, func, or_, literal
+from database import session_scope, configuracion
+from models import CampanaEncuesta, EnvioEncuesta, Client
+from services.clientes import filtros_audiencia, comprimir_ids
+
+# Estados de un envío
+PENDIENTE = "pendiente"
+ENVIANDO = "enviando"
+ENVIADO = "enviado"
+ERROR = "error"
+ESTADOS_ENVIO = [PENDIENTE, ENVIANDO, ENVIADO, ERROR]
+
+# Configuración del envío ([encuestas] en secrets.toml)
+_config = configuracion("encuestas")
+CONFIG_ENCUESTAS = {
+    "emisor": _config.get("emisor", "pywhatkit"),
+    "mensajes_por_minuto": _config.get("mensajes_por_minuto", 4),
+    "max_intentos": _config.get("max_intentos", 3),
+    "espera_reintento_segundos": _config.get("espera_reintento_segundos", 60),
+    "bloqueo_segundos": _config.get("bloqueo_segundos", 300),
+    "trabajadores": _config.get("trabajadores", 1),
+    "lote": _config.get("lote", 10),
+    "liberar_cada_segundos": _config.get("liberar_cada_segundos", 60),
+}
+
+# Fracción de `bloqueo_segundos` que puede ocupar el envío de un lote; el resto es margen para
+# demoras imprevistas del emisor o de la base
+MARGEN_BLOQUEO = 0.5
+
+
+# Emisor por WhatsApp Web (pywhatkit abre una pestaña del navegador por mensaje).
+# pywhatkit se importa al enviar porque necesita un entorno gráfico. Maneja un único navegador
+# con teclado y ratón simulados, así que admite un solo hilo y los envíos nunca se solapan.
+class EmisorWhatsApp:
+    max_hilos = 1
+    _navegador = threading.Lock()
+
+    def __init__(self, espera=10, cierre=3):
+        self.espera = espera
+        self.cierre = cierre
+
+    # Segundos que tarda un envío: la espera a que cargue WhatsApp Web y el cierre de la pestaña
+    @property
+    def duracion(self):
+        return self.espera + self.cierre
+
+    def enviar(self, telefono, mensaje):
+        import pywhatkit as pwk
+        with self._navegador:
+            pwk.sendwhatmsg_instantly(telefono, mensaje, wait_time=self.espera, tab_close=True, close_time=self.cierre)
+
+
+# Emisor local para pruebas: no envía nada, guarda los mensajes y puede simular demoras y fallos
+class EmisorFalso:
+    max_hilos = None
+
+    def __init__(self, demora=0.0, tasa_error=0.0):
+        self.demora = demora
+        self.tasa_error = tasa_error
+        self.enviados = []
+        self._lock = threading.Lock()
+
+    def enviar(self, telefono, mensaje):
+        time.sleep(self.demora)
+        if random.random() < self.tasa_error:
+            raise RuntimeError("Fallo simulado del emisor")
+        with self._lock:
+            self.enviados.append((telefono, mensaje))
+
+    @property
+    def duracion(self):
+        return self.demora
+
+
+# Emisores disponibles. Un emisor expone enviar(telefono, mensaje), que lanza una excepción si falla,
+# `duracion` (segundos que tarda un envío) y `max_hilos` (None si admite cualquier cantidad)
+EMISORES = {
+    "pywhatkit": EmisorWhatsApp,
+    "falso": EmisorFalso,
+}
+
+
+def crear_emisor(nombre=None, **opciones):
+    nombre = nombre or CONFIG_ENCUESTAS["emisor"]
+    if nombre not in EMISORES:
+        raise ValueError(f"Emisor de encuestas desconocido: {nombre}")
+    return EMISORES[nombre](**opciones)
+
+
+# Hilos de envío que admite el emisor
+def hilos_emisor(emisor, hilos):
+    return min(hilos, emisor.max_hilos) if emisor.max_hilos else hilos
+
+
+# Limita la tasa de envío compartida por todos los hilos del trabajador
+class LimitadorTasa:
+    def __init__(self, mensajes_por_minuto):
+        self.intervalo = 60.0 / mensajes_por_minuto
+        self._siguiente = time.monotonic()
+        self._lock = threading.Lock()
+
+    def esperar(self):
+        with self._lock:
+            ahora = time.monotonic()
+            turno = max(self._siguiente, ahora)
+            self._siguiente = turno + self.intervalo
+        time.sleep(max(0.0, turno - ahora))
+
+
+# Crea una campaña para un segmento de clientes menos los ids excluidos. Los envíos (uno por
+# teléfono distinto) se generan con un INSERT ... SELECT, sin traer la audiencia a Python.
+def crear_campana(db, permisionario, mensaje, segmento, excluidos=()):
+    campana = CampanaEncuesta(
+        permisionario=permisionario, mensaje=mensaje, estado="activa", creada_en=datetime.now(),
+        segmento={**segmento, "excluidos": comprimir_ids(excluidos)},
+    )
+    db.add(campana)
+    db.flush()
+    telefonos = select(
+        literal(campana.id), Client.telefono_e164, literal(PENDIENTE), literal(0)
+    ).where(*filtros_audiencia(permisionario, segmento, excluidos)).distinct()
+    encolados = db.execute(
+        insert(EnvioEncuesta).from_select(["campana_id", "telefono", "estado", "intentos"], telefonos)
+    ).rowcount
+    db.commit()
+    return campana.id, encolados
+
+
+def cancelar_campana(db, campana_id):
+    db.execute(update(CampanaEncuesta).where(CampanaEncuesta.id == campana_id).values(estado="cancelada"))
+    db.commit()
+
+
+# Toma hasta `limite` envíos pendientes para `trabajador`. En PostgreSQL los hilos y procesos
+# se reparten la cola con FOR UPDATE SKIP LOCKED; la condición sobre el estado en el UPDATE
+# evita que dos trabajadores tomen el mismo envío en motores sin SKIP LOCKED.
+def tomar_envios(db, trabajador, limite):
+    ahora = datetime.now()
+    ids = db.execute(
+        select(EnvioEncuesta.id)
+        .join(CampanaEncuesta, CampanaEncuesta.id == EnvioEncuesta.campana_id)
+        .where(
+            EnvioEncuesta.estado == PENDIENTE,
+            or_(EnvioEncuesta.proximo_intento.is_(None), EnvioEncuesta.proximo_intento <= ahora),
+            CampanaEncuesta.estado == "activa",
+        )
+        .order_by(EnvioEncuesta.id)
+        .limit(limite)
+        .with_for_update(skip_locked=True, of=EnvioEncuesta)
+    ).scalars().all()
+
+    if ids:
+        db.execute(
+            update(EnvioEncuesta)
+            .where(EnvioEncuesta.id.in_(ids), EnvioEncuesta.estado == PENDIENTE)
+            .values(estado=ENVIANDO, tomado_por=trabajador, tomado_en=ahora, intentos=EnvioEncuesta.intentos + 1)
+        )
+    envios = db.execute(
+        select(EnvioEncuesta.id, EnvioEncuesta.telefono, EnvioEncuesta.intentos, CampanaEncuesta.mensaje)
+        .join(CampanaEncuesta, CampanaEncuesta.id == EnvioEncuesta.campana_id)
+        .where(EnvioEncuesta.id.in_(ids), EnvioEncuesta.estado == ENVIANDO, EnvioEncuesta.tomado_por == trabajador)
+        .order_by(EnvioEncuesta.id)
+    ).all() if ids else []
+    db.commit()
+    return envios
+
+
+# Guarda el resultado de un envío; los fallos se reintentan con espera exponencial.
+# Solo se actualiza si el envío sigue tomado por `trabajador`: si ya se liberó por vencido y otro
+# trabajador lo tomó, ese resultado es el que vale. Devuelve si se guardó.
+def registrar_resultado(db, envio_id, trabajador, intentos, error=None):
+    ahora = datetime.now()
+    if error is None:
+        valores = {"estado": ENVIADO, "enviado_en": ahora, "ultimo_error": None}
+    elif intentos < CONFIG_ENCUESTAS["max_intentos"]:
+        espera = CONFIG_ENCUESTAS["espera_reintento_segundos"] * 2 ** (intentos - 1)
+        valores = {"estado": PENDIENTE, "proximo_intento": ahora + timedelta(seconds=espera), "ultimo_error": error}
+    else:
+        valores = {"estado": ERROR, "ultimo_error": error}
+    guardado = db.execute(
+        update(EnvioEncuesta)
+        .where(EnvioEncuesta.id == envio_id, EnvioEncuesta.tomado_por == trabajador, EnvioEncuesta.estado == ENVIANDO)
+        .values(**valores)
+    ).rowcount
+    db.commit()
+    return guardado == 1
+
+
+# Devuelve a la cola los envíos de trabajadores que se detuvieron a mitad de un envío
+def liberar_envios_vencidos(db):
+    limite = datetime.now() - timedelta(seconds=CONFIG_ENCUESTAS["bloqueo_segundos"])
+    vencidos = (EnvioEncuesta.estado == ENVIANDO, EnvioEncuesta.tomado_en < limite)
+    db.execute(
+        update(EnvioEncuesta)
+        .where(*vencidos, EnvioEncuesta.intentos >= CONFIG_ENCUESTAS["max_intentos"])
+        .values(estado=ERROR, ultimo_error="Trabajador detenido durante el envío")
+    )
+    liberados = db.execute(update(EnvioEncuesta).where(*vencidos).values(estado=PENDIENTE)).rowcount
+    db.commit()
+    return liberados
+
+
+# Envíos que un hilo puede tomar por vez sin que el último termine más allá del bloqueo: con `hilos`
+# compartiendo el limitador, cada envío de un hilo espera su turno (el intervalo por los hilos) y luego
+# ocupa `duracion_envio` segundos en el emisor. Así otro trabajador no devuelve a la cola (y vuelve a
+# enviar) un envío que aún está por salir.
+def lote_maximo(limitador, hilos=1, duracion_envio=0.0):
+    ventana = CONFIG_ENCUESTAS["bloqueo_segundos"] * MARGEN_BLOQUEO
+    return max(1, int(ventana / (limitador.intervalo * hilos + duracion_envio)))
+
+
+# Procesa un lote: cada envío espera su turno en el limitador y guarda su resultado al terminar
+def procesar_lote(emisor, limitador, trabajador, lote=None):
+    with session_scope() as db:
+        envios = tomar_envios(db, trabajador, lote or CONFIG_ENCUESTAS["lote"])
+
+    for envio in envios:
+        limitador.esperar()
+        try:
+            emisor.enviar(envio.telefono, envio.mensaje)
+            error = None
+        except Exception as e:
+            error = str(e)
+        with session_scope() as db:
+            registrar_resultado(db, envio.id, trabajador, envio.intentos, error)
+    return len(envios)
+
+
+# Bucle de un hilo del trabajador; termina al activar `detener` o, con `una_vez`, al vaciar la cola.
+# Cada `liberar_cada_segundos` devuelve a la cola los envíos de trabajadores que se detuvieron,
+# aunque este proceso siga en marcha.
+def ejecutar_trabajador(emisor, limitador, detener, lote=None, pausa=5, una_vez=False, hilos=1):
+    trabajador = f"{threading.current_thread().name}-{uuid.uuid4().hex[:8]}"
+    lote = min(lote or CONFIG_ENCUESTAS["lote"], lote_maximo(limitador, hilos, emisor.duracion))
+    ultima_liberacion = None
+    while not detener.is_set():
+        if ultima_liberacion is None or time.monotonic() - ultima_liberacion >= CONFIG_ENCUESTAS["liberar_cada_segundos"]:
+            with session_scope() as db:
+                liberar_envios_vencidos(db)
+            ultima_liberacion = time.monotonic()
+        if procesar_lote(emisor, limitador, trabajador, lote) == 0:
+            if una_vez:
+                return
+            detener.wait(pausa)
+
+
+# Conteo de envíos por estado de las campañas recientes del permisionario, en una sola consulta
+def resumen_campanas(db, permisionario, limite=10):
+    conteos = [func.count(EnvioEncuesta.id).filter(EnvioEncuesta.estado == estado).label(estado) for estado in ESTADOS_ENVIO]
+    return db.execute(
+        select(CampanaEncuesta.id, CampanaEncuesta.creada_en, CampanaEncuesta.estado, func.count(EnvioEncuesta.id).label("total"), *conteos)
+        .outerjoin(EnvioEncuesta, EnvioEncuesta.campana_id == CampanaEncuesta.id)
+        .where(CampanaEncuesta.permisionario == permisionario)
+        .group_by(CampanaEncuesta.id, CampanaEncuesta.creada_en, CampanaEncuesta.estado)
+        .order_by(CampanaEncuesta.id.desc())
+        .limit(limite)
+    ).all()
@@ -0,0 +1,151 @@
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import func, extract
+from models import TiemPro, AgregadoIncidencias
+from services.carga_datos import cargar_dataframe
+
+
+# Nombre del mes que muestran los filtros → número del mes de registro en el agregado. Todas las
+# consultas de la página de estadísticas filtran por el mes de fecha_hora_registro (de todos los
+# años), no por el texto de la columna `mes`, para que las métricas y los gráficos coincidan.
+NUMERO_MES = {
+    nombre: numero for numero, nombre in enumerate([
+        "Enero", "Febrero", "Marzo", "Abril", "Mayo", "Junio",
+        "Julio", "Agosto", "Septiembre", "Octubre", "Noviembre", "Diciembre"
+    ], start=1)
+}
+NOMBRE_MES = {numero: nombre for nombre, numero in NUMERO_MES.items()}
+
+
+# Aplica los filtros de la página de estadísticas sobre el agregado de incidencias
+def aplicar_filtros_agregado(query, permisionario, mes=None, tipo_reclamo=None):
+    query = query.filter(AgregadoIncidencias.permisionario == permisionario)
+    if mes and mes != "Todos":
+        query = query.filter(AgregadoIncidencias.mes == NUMERO_MES.get(mes, 0))
+    if tipo_reclamo and tipo_reclamo != "Todos":
+        query = query.filter(AgregadoIncidencias.tipo_reclamo == tipo_reclamo)
+    return query
+
+
+# Métricas generales (total, finalizadas, pendientes, tiempos) desde el agregado de incidencias:
+# unas pocas filas por mes, sin recorrer el histórico
+def obtener_kpis(db, permisionario, mes=None, tipo_reclamo=None):
+    agregado = AgregadoIncidencias
+    fila = aplicar_filtros_agregado(
+        db.query(
+            func.sum(agregado.cantidad).label("total"),
+            func.sum(agregado.cantidad).filter(agregado.estado_incidencia == "Finalizado").label("finalizadas"),
+            func.sum(agregado.cantidad).filter(agregado.estado_incidencia == "Pendiente").label("pendientes"),
+            func.sum(agregado.cantidad).filter(agregado.estado_incidencia == "Resuelto").label("resueltas"),
+            func.sum(agregado.cantidad_horas).label("cantidad_horas"),
+            func.sum(agregado.suma_horas).label("suma_horas"),
+            func.min(agregado.min_horas).label("tiempo_minimo"),
+            func.max(agregado.max_horas).label("tiempo_maximo"),
+        ),
+        permisionario, mes, tipo_reclamo
+    ).one()
+
+    return {
+        "total": int(fila.total or 0),
+        "finalizadas": int(fila.finalizadas or 0),
+        "pendientes": int(fila.pendientes or 0),
+        "resueltas": int(fila.resueltas or 0),
+        "tiempo_promedio": float(fila.suma_horas) / fila.cantidad_horas if fila.cantidad_horas else 0.0,
+        "tiempo_minimo": float(fila.tiempo_minimo or 0),
+        "tiempo_maximo": float(fila.tiempo_maximo or 0),
+    }
+
+
+# Conteo de incidencias agrupado por un campo del agregado ("tipo_reclamo", "mes" de registro o
+# "estado_incidencia"); los meses se devuelven por nombre y los valores vacíos como None
+def obtener_conteo_por(db, campo, permisionario, mes=None, tipo_reclamo=None):
+    columna = getattr(AgregadoIncidencias, campo)
+    filas = aplicar_filtros_agregado(
+        db.query(columna, func.sum(AgregadoIncidencias.cantidad)),
+        permisionario, mes, tipo_reclamo
+    ).group_by(columna).order_by(columna).all()
+    valores = [NOMBRE_MES.get(valor) if campo == "mes" else valor or None for valor, _ in filas]
+    return pd.DataFrame({"valor": valores, "cantidad": [int(cantidad) for _, cantidad in filas]})
+
+
+# Resumen por tipo de reclamo (cantidad, promedio, mínimo y máximo de horas) desde el agregado
+def obtener_resumen_por_tipo(db, permisionario, mes=None, tipo_reclamo=None):
+    agregado = AgregadoIncidencias
+    filas = aplicar_filtros_agregado(
+        db.query(
+            agregado.tipo_reclamo,
+            func.sum(agregado.cantidad_horas),
+            func.sum(agregado.suma_horas),
+            func.min(agregado.min_horas),
+            func.max(agregado.max_horas),
+        ),
+        permisionario, mes, tipo_reclamo
+    ).group_by(agregado.tipo_reclamo).order_by(agregado.tipo_reclamo).all()
+
+    resumen = pd.DataFrame(
+        filas,
+        columns=["Tipo Reclamo", "Cantidad", "Suma", "Tiempo Mínimo", "Tiempo Máximo"]
+    ).set_index("Tipo Reclamo").rename(index={"": None})
+    # El promedio se divide en pandas: SQLite guarda las sumas enteras como INTEGER
+    resumen["Cantidad"] = resumen["Cantidad"].astype(int)
+    resumen.insert(1, "Tiempo Promedio", resumen.pop("Suma").astype(float) / resumen["Cantidad"].where(resumen["Cantidad"] > 0))
+    columnas_tiempo = ["Tiempo Promedio", "Tiempo Mínimo", "Tiempo Máximo"]
+    resumen[columnas_tiempo] = resumen[columnas_tiempo].astype(float).round(2)
+    return resumen
+
+
+# Valores disponibles para los filtros: meses de registro (en orden) y tipos de reclamo
+def obtener_valores_filtro(db, permisionario):
+    agregado = AgregadoIncidencias
+    meses = aplicar_filtros_agregado(db.query(agregado.mes), permisionario).filter(agregado.mes > 0).distinct().order_by(agregado.mes).all()
+    tipos = aplicar_filtros_agregado(db.query(agregado.tipo_reclamo), permisionario).filter(agregado.tipo_reclamo != "").distinct().order_by(agregado.tipo_reclamo).all()
+    return [NOMBRE_MES[m[0]] for m in meses], [t[0] for t in tipos]
+
+
+# Inicio y fin (exclusivo) de un mes, para filtrar por rango sobre (permisionario, fecha_hora_registro)
+def rango_mes(anio, mes):
+    inicio = datetime(anio, mes, 1)
+    fin = datetime(anio + 1, 1, 1) if mes == 12 else datetime(anio, mes + 1, 1)
+    return inicio, fin
+
+
+# Años con incidencias registradas, sin cargar las incidencias
+def obtener_anios_disponibles(db, permisionario):
+    anio = extract("year", TiemPro.fecha_hora_registro)
+    filas = db.query(anio).filter(
+        TiemPro.permisionario == permisionario,
+        TiemPro.fecha_hora_registro.is_not(None)
+    ).distinct().order_by(anio.desc()).all()
+    return [int(fila[0]) for fila in filas]
+
+
+# Campos de TiemPro que usan los reportes mensuales
+COLUMNAS_REPORTE = [
+    "item", "provincia", "mes", "fecha_hora_registro", "nombre_reclamante",
+    "telefono_contacto", "tipo_conexion", "canal_reclamo", "tipo_reclamo",
+    "fecha_hora_solucion", "descripcion_solucion"
+]
+
+
+# Filtros de un mes: rango semiabierto sobre fecha_hora_registro y tipos de reclamo en SQL
+def filtros_mes(permisionario, anio, mes, tipos_reclamo):
+    inicio, fin = rango_mes(anio, mes)
+    return [
+        TiemPro.permisionario == permisionario,
+        TiemPro.fecha_hora_registro >= inicio,
+        TiemPro.fecha_hora_registro < fin,
+        TiemPro.tipo_reclamo.in_(list(tipos_reclamo)),
+    ]
+
+
+ORDEN_REPORTE = [TiemPro.fecha_hora_registro, TiemPro.id]
+
+
+# Incidencias de un mes para los reportes
+def obtener_incidencias_mes(db, permisionario, anio, mes, tipos_reclamo):
+    return cargar_dataframe(
+        db, TiemPro, COLUMNAS_REPORTE,
+        filtros=filtros_mes(permisionario, anio, mes, tipos_reclamo),
+        orden=ORDEN_REPORTE,
+        categorias=["provincia", "mes", "tipo_conexion", "canal_reclamo", "tipo_reclamo"]
+    )
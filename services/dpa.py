@@ -0,0 +1,64 @@
+import threading
+from database import session_scope
+from models import Localidad
+
+
+# Índice provincia → cantón → parroquia de la división político-administrativa (DPA).
+# Es un dato de referencia estático: se carga una sola vez por proceso y lo comparten
+# todas las sesiones; recargar_dpa() lo vuelve a leer cuando la tabla cambia.
+_indice = None
+_lock = threading.Lock()
+
+
+def _cargar_indice():
+    with session_scope() as db:
+        filas = db.query(Localidad.provincia, Localidad.canton, Localidad.parroquia).all()
+
+    arbol = {}
+    for provincia, canton, parroquia in filas:
+        if provincia is None:
+            continue
+        cantones = arbol.setdefault(provincia, {})
+        if canton is None:
+            continue
+        parroquias = cantones.setdefault(canton, set())
+        if parroquia is not None:
+            parroquias.add(parroquia)
+
+    return {
+        "provincias": sorted(arbol),
+        "cantones": {provincia: sorted(cantones) for provincia, cantones in arbol.items()},
+        "parroquias": {
+            (provincia, canton): sorted(parroquias)
+            for provincia, cantones in arbol.items()
+            for canton, parroquias in cantones.items()
+        },
+    }
+
+
+def obtener_indice():
+    global _indice
+    if _indice is None:
+        with _lock:
+            if _indice is None:
+                _indice = _cargar_indice()
+    return _indice
+
+
+def recargar_dpa():
+    global _indice
+    with _lock:
+        _indice = _cargar_indice()
+    return _indice
+
+
+def get_provincias():
+    return obtener_indice()["provincias"]
+
+
+def get_cantones(provincia):
+    return obtener_indice()["cantones"].get(provincia, [])
+
+
+def get_parroquias(provincia, canton):
+    return obtener_indice()["parroquias"].get((provincia, canton), [])
@@ -0,0 +1,55 @@
+from tempfile import SpooledTemporaryFile
+from openpyxl import Workbook
+from sqlalchemy import select
+from models import TiemPro
+from services.consultas_incidencias import ORDEN_REPORTE, filtros_mes
+from services.reportes import REPORTES, titulos, plan_reporte, formatear_lote
+
+# Los libros pequeños quedan en memoria; los grandes pasan a un archivo temporal en disco
+MAX_BYTES_EN_MEMORIA = 8 * 1024 * 1024
+TAMANO_LOTE = 5000
+
+
+# Filas formateadas de un reporte mensual, leídas por lotes con un cursor del lado del servidor.
+# La plantilla decide qué se formatea en la consulta (fechas) y qué se calcula por lote (horas).
+def filas_reporte(db, permisionario, anio, mes, reporte, tamano_lote=TAMANO_LOTE):
+    expresiones, columnas = plan_reporte(reporte, db.bind.dialect.name)
+    consulta = select(*expresiones).where(
+        *filtros_mes(permisionario, anio, mes, REPORTES[reporte]["tipos_reclamo"])
+    ).order_by(*ORDEN_REPORTE)
+    resultado = db.execute(consulta.execution_options(stream_results=True, yield_per=tamano_lote))
+    for lote in resultado.partitions():
+        yield from formatear_lote(columnas, lote)
+
+
+# Escribe un libro de Excel en modo write-only: cada hoja es (nombre, títulos, filas iterables)
+# y las filas se escriben a medida que llegan, sin construir DataFrames.
+def escribir_excel(hojas, destino=None):
+    destino = destino or SpooledTemporaryFile(max_size=MAX_BYTES_EN_MEMORIA)
+    libro = Workbook(write_only=True)
+    for nombre_hoja, encabezados, filas in hojas:
+        hoja = libro.create_sheet(title=nombre_hoja[:31])
+        hoja.append(encabezados)
+        for fila in filas:
+            hoja.append(fila)
+    libro.save(destino)
+    destino.seek(0)
+    return destino
+
+
+# Hojas de un libro de reportes: `periodos` es una lista de (año, mes) y `reportes` los tipos de reporte.
+# Con varios meses, cada hoja lleva el mes en el nombre (por ejemplo, ProcenRecGen_03).
+# `origen(db, permisionario, anio, mes, reporte)` entrega las filas de cada hoja.
+def hojas_reporte(db, permisionario, periodos, reportes, origen=filas_reporte):
+    varios_meses = len(periodos) > 1
+    for anio, mes in periodos:
+        for reporte in reportes:
+            nombre = REPORTES[reporte]["hoja"]
+            if varios_meses:
+                nombre = f"{nombre}_{mes:02d}"
+            yield nombre, titulos(reporte), origen(db, permisionario, anio, mes, reporte)
+
+
+# Exporta uno o varios reportes mensuales a un libro de Excel con memoria constante en el número de filas
+def exportar_reportes(db, permisionario, periodos, reportes, destino=None, origen=filas_reporte):
+    return escribir_excel(hojas_reporte(db, permisionario, periodos, reportes, origen), destino)
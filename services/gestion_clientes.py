@@ -0,0 +1,389 @@
+import streamlit as st
+from datetime import datetime
+from database import session_scope
+from models import Client
+from services.incidencias import mostrar_opciones_incidencia
+from services.busqueda_clientes import buscar_clientes
+from services.dpa import get_provincias, get_cantones
+from services.numeracion import reservar_codigos_cliente
+from services.telefonos import normalizar_telefono
+from services.clientes import COLUMNAS_DASHBOARD, COLUMNAS_ORDEN, contar_clientes, pagina_clientes
+from services.importacion_clientes import COLUMNAS_IMPORTACION, importar_clientes
+from services.perfilado import seccion, perfilar
+
+# Función para crear un cliente
+def create_client(client_data):
+    with session_scope() as db:
+        try:
+            # El código se reserva al guardar, en la misma transacción del registro
+            if not client_data.get("codigo"):
+                client_data["codigo"] = reservar_codigos_cliente(db, client_data["permisionario"])[0]
+            client_data["telefono_e164"] = normalizar_telefono(client_data.get("telefono"))
+            db_client = Client(**client_data)
+            db.add(db_client)
+            db.commit()
+            db.refresh(db_client)
+            return True
+        except Exception as e:
+            db.rollback()
+            st.error(f"Error al crear cliente: {str(e)}")
+            return False
+
+# Función para eliminar un cliente
+def delete_client(client_id):
+    with session_scope() as db:
+        try:
+            client = db.query(Client).filter(Client.id == client_id).first()
+            if client:
+                db.delete(client)
+                db.commit()
+                return True
+            return False
+        except Exception as e:
+            db.rollback()
+            st.error(f"Error al eliminar cliente: {str(e)}")
+            return False
+
+def update_client_status(client_id, nuevo_estado):
+    with session_scope() as db:
+        try:
+            client = db.query(Client).filter(Client.id == client_id).first()
+            if client:
+                client.estado = nuevo_estado
+                db.commit()
+                return True
+            return False
+        except Exception as e:
+            db.rollback()
+            st.error(f"Error al cambiar el estado: {str(e)}")
+            return False
+
+def update_client(client_id, client_data):
+    with session_scope() as db:
+        try:
+            client = db.query(Client).filter(Client.id == client_id).first()
+            if client:
+                if "telefono" in client_data:
+                    client_data["telefono_e164"] = normalizar_telefono(client_data["telefono"])
+                for key, value in client_data.items():
+                    setattr(client, key, value)
+                db.commit()
+                return True
+            return False
+        except Exception as e:
+            db.rollback()
+            st.error(f"Error al actualizar cliente: {str(e)}")
+            return False
+        
+
+# Función para mostrar la tabla de clientes paginada en el servidor
+@perfilar("dashboard.tabla_clientes")
+def tabla_clientes_paginada(permisionario):
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        tamano = st.selectbox("Filas por página", [25, 50, 100, 200], index=1)
+    with col2:
+        orden = st.selectbox("Ordenar por", COLUMNAS_ORDEN, format_func=lambda campo: COLUMNAS_DASHBOARD[campo])
+    with col3:
+        descendente = st.radio("Orden", ["Ascendente", "Descendente"], horizontal=True) == "Descendente"
+
+    # Pila de cursores de las páginas visitadas; se reinicia al cambiar la configuración
+    configuracion = (permisionario, tamano, orden, descendente)
+    paginacion = st.session_state.get("paginacion_clientes")
+    if not paginacion or paginacion["configuracion"] != configuracion:
+        paginacion = {"configuracion": configuracion, "cursores": [None]}
+        st.session_state["paginacion_clientes"] = paginacion
+
+    with seccion("dashboard.carga_datos"), session_scope() as db:
+        df, siguiente = pagina_clientes(
+            db, permisionario, tamano=tamano, orden=orden,
+            descendente=descendente, despues=paginacion["cursores"][-1]
+        )
+
+    with seccion("dashboard.render"):
+        st.dataframe(df, hide_index=True)
+
+    numero_pagina = len(paginacion["cursores"])
+    col1, col2, col3 = st.columns([1, 1, 4])
+    with col1:
+        if st.button("⬅️ Anterior", disabled=numero_pagina == 1):
+            paginacion["cursores"].pop()
+            st.rerun()
+    with col2:
+        if st.button("Siguiente ➡️", disabled=siguiente is None):
+            paginacion["cursores"].append(siguiente)
+            st.rerun()
+    with col3:
+        st.caption(f"Página {numero_pagina}")
+
+# Función del dashboard
+def dashboard(permisionario):
+    st.header("Servicio al Cliente")
+    
+    # Campo de búsqueda para cliente o cédula
+    search_term = st.text_input("Buscar por cliente o cédula")
+    
+    # Buscar clientes en la base de datos según el término de búsqueda
+    filtered_clients = []
+    if search_term:
+        with seccion("dashboard.carga_datos"), session_scope() as db:
+            filtered_clients = buscar_clientes(db, permisionario, search_term, campos=["cliente", "cedula_ruc"])
+
+    # Mostrar métricas generales si no hay búsqueda activa
+    if not search_term:
+        # Contadores calculados en la base de datos
+        with seccion("dashboard.carga_datos"), session_scope() as db:
+            conteos = contar_clientes(db, permisionario)
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Total Clientes", conteos["total"])
+        with col2:
+            st.metric("Clientes Activos", conteos["activos"])
+        with col3:
+            st.metric("Clientes Inactivos", conteos["inactivos"])
+        
+        # Mostrar solo la página visible de clientes
+        tabla_clientes_paginada(permisionario)
+        
+    else:
+        # Mostrar detalles del cliente con acciones solo si se realiza una búsqueda
+        if filtered_clients:
+            for client in filtered_clients:
+                # Crear una clave única para el estado del cliente actual
+                client_key = f'client_state_{client.id}'
+                
+                # Inicializar el estado del cliente si no existe
+                if client_key not in st.session_state:
+                    st.session_state[client_key] = {
+                        'show_edit': False,
+                        'show_incidencia': False
+                    }
+
+                # Mostrar información básica del cliente
+                st.write("---")
+                if not st.session_state[client_key]['show_edit'] and not st.session_state[client_key]['show_incidencia']:
+                    st.write(f"**Cliente:** {client.cliente}")
+                    st.write(f"**Email:** {client.correo}")
+                    st.write(f"**Teléfono:** {client.telefono}")
+                    st.write(f"**Estado actual:** {client.estado}")
+
+                    # Columnas para botones de acción
+                    col1, col2, col3 = st.columns([1, 1, 1])
+
+                    with col1:
+                        # Botón para editar el cliente
+                        if st.button("Editar", key=f"edit_{client.id}"):
+                            st.session_state[client_key]['show_edit'] = True
+                            st.session_state[client_key]['show_incidencia'] = False
+                            st.rerun()
+
+                    with col2:
+                        # Botón para cambiar el estado
+                        nuevo_estado = "INACTIVO" if client.estado == "ACTIVO" else "ACTIVO"
+                        if st.button(f"Cambiar a {nuevo_estado}", key=f"change_state_{client.id}"):
+                            if update_client_status(client.id, nuevo_estado):
+                                st.success(f"Estado cambiado a {nuevo_estado} exitosamente!")
+                                st.rerun()
+
+                    with col3:
+                        if st.button("Incidencia", key=f"incidencia_{client.id}"):
+                            st.session_state[client_key]['show_incidencia'] = True
+                            st.session_state[client_key]['show_edit'] = False
+                            st.rerun()
+                
+                # Mostrar formulario de edición si está activado
+                if st.session_state[client_key]['show_edit']:
+                    st.write("### Editar Cliente")
+                    with st.form(key=f'edit_form_{client.id}'):
+                        # Obtener la lista de provincias (índice DPA en memoria)
+                        provincias = get_provincias()
+                        
+                        # Selector de provincia
+                        provincia_seleccionada = st.selectbox(
+                            "Provincia", 
+                            options=provincias,
+                            index=provincias.index(client.provincia) if client.provincia in provincias else 0,
+                            key=f"provincia_select_{client.id}"
+                        )
+                        
+                        # Obtener cantones para la provincia seleccionada
+                        cantones = get_cantones(provincia_seleccionada)
+                        canton_seleccionado = st.selectbox(
+                            "Ciudad",
+                            options=cantones,
+                            index=cantones.index(client.ciudad) if client.ciudad in cantones else 0,
+                            key=f"canton_select_{client.id}"
+                        )
+
+                        # Datos editables del cliente
+                        edited_data = {
+                            "permisionario": st.text_input("Permisionario", value=client.permisionario, disabled=True),
+                            "codigo": st.text_input("Código", value=client.codigo),
+                            "nombres": st.text_input("Nombres", value=client.nombres),
+                            "apellidos": st.text_input("Apellidos", value=client.apellidos),
+                            "cliente": st.text_input("Cliente", value=client.cliente),
+                            "cedula_ruc": st.text_input("Cédula/RUC", value=client.cedula_ruc),
+                            "servicio_contratado": st.selectbox(
+                                "Servicio Contratado",
+                                ["INTERNET", "TV", "INTERNET+TV"],
+                                index=["INTERNET", "TV", "INTERNET+TV"].index(client.servicio_contratado)
+                            ),
+                            "plan_contratado": st.text_input("Plan Contratado", value=client.plan_contratado),
+                            "provincia": provincia_seleccionada,
+                            "ciudad": canton_seleccionado,
+                            "direccion": st.text_input("Dirección", value=client.direccion),
+                            "telefono": st.text_input("Teléfono", value=client.telefono),
+                            "correo": st.text_input("Correo", value=client.correo),
+                            "fecha_de_inscripcion": st.date_input(
+                                "Fecha de Inscripción",
+                                value=datetime.strptime(client.fecha_de_inscripcion, '%Y-%m-%d')
+                            ).strftime("%Y-%m-%d"),
+                            "estado": st.selectbox(
+                                "Estado",
+                                ["ACTIVO", "INACTIVO"],
+                                index=["ACTIVO", "INACTIVO"].index(client.estado)
+                            ),
+                            "ip": st.text_input("Ip", value=client.ip)
+                        }
+
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            if st.form_submit_button("Guardar Cambios"):
+                                if update_client(client.id, edited_data):
+                                    st.success("Cliente actualizado exitosamente!")
+                                    st.session_state[client_key]['show_edit'] = False
+                                    st.rerun()
+                        with col2:
+                            if st.form_submit_button("Cancelar"):
+                                st.session_state[client_key]['show_edit'] = False
+                                st.rerun()
+
+                # Mostrar formulario de incidencias si está activado
+                if st.session_state[client_key]['show_incidencia']:
+                    st.write("### Registro de Incidencia")
+                    mostrar_opciones_incidencia(client.id)
+                    if st.button("Cancelar Incidencia", key=f"cancel_incidencia_{client.id}"):
+                        st.session_state[client_key]['show_incidencia'] = False
+                        st.rerun()
+        else:
+            st.info("No se encontraron clientes con el criterio de búsqueda")
+
+
+
+# Función para la gestión de clientes
+def client_management(permisionario):
+    st.header("Gestión de Clientes")
+    
+    # Obtener la lista de provincias (índice DPA en memoria, sin consultar la base de datos)
+    provincias = get_provincias()
+    
+    # Selector de provincia; los cantones se resuelven desde el mismo índice
+    provincia_seleccionada = st.selectbox("Provincia", options=provincias, key="provincia_select")
+    cantones = get_cantones(provincia_seleccionada)
+    
+    with st.form("nuevo_cliente"):
+        # Mostrar permisionario
+        st.text_input("Permisionario", value=permisionario, disabled=True)
+        
+        # Mostrar la provincia seleccionada (solo lectura en el formulario)
+        st.text_input("Provincia", value=provincia_seleccionada, disabled=True)
+
+        # Selección de cantón de la provincia elegida
+        canton_seleccionado = st.selectbox("Ciudad", options=cantones, key="canton")
+
+        # El código del cliente se asigna automáticamente al guardar
+        st.text_input("Código", value="Se asigna al guardar", disabled=True)
+
+        # Campo para el nombre del cliente
+        cliente = st.text_input("Cliente", key="cliente_input")
+
+        # Verificar si el campo "Cliente" está lleno
+        if cliente:
+            # Si el cliente está ingresado, deshabilitar los campos de nombres y apellidos
+            nombres = st.text_input("Nombres", disabled=True, key="nombres_input")
+            apellidos = st.text_input("Apellidos", disabled=True, key="apellidos_input")
+        else:
+            # Si el cliente no está ingresado, permitir la edición de nombres y apellidos
+            nombres = st.text_input("Nombres", key="nombres_input_edit")
+            apellidos = st.text_input("Apellidos", key="apellidos_input_edit")
+
+        # Combinar nombres y apellidos para el campo "Cliente" si están vacíos
+        if not cliente:
+            cliente = f"{nombres} {apellidos}".strip()  # Combina nombres y apellidos
+
+        # Otros datos del cliente
+        client_data = {
+            "permisionario": permisionario,
+            "nombres": nombres,
+            "apellidos": apellidos,
+            "cliente": cliente,  # Asignar el cliente combinado
+            "cedula_ruc": st.text_input("Cédula/RUC"),
+            "servicio_contratado": st.selectbox("Servicio Contratado", ["INTERNET", "TV", "INTERNET+TV"]),
+            "plan_contratado": st.text_input("Plan Contratado"),
+            "provincia": provincia_seleccionada,
+            "ciudad": canton_seleccionado,
+            "direccion": st.text_input("Dirección"),
+            "telefono": st.text_input("Teléfono"),
+            "correo": st.text_input("Correo"),
+            "fecha_de_inscripcion": st.date_input("Fecha de Inscripción").strftime("%Y-%m-%d"),
+            "estado": st.selectbox("Estado", ["ACTIVO", "INACTIVO"]),
+            "ip": st.text_input("Ip")
+        }
+        
+        # Campo "Cliente" que se llena automáticamente y se deshabilita
+        st.text_input("Cliente", value=cliente, disabled=True)  # Muestra el cliente combinado como solo lectura
+        
+        # Botón para guardar el cliente y feedback
+        submitted = st.form_submit_button("Guardar Cliente")
+        if submitted and create_client(client_data):
+            st.success("Cliente creado exitosamente!")
+            st.rerun()
+
+# Importación masiva de clientes desde CSV o Excel
+def client_import(permisionario):
+    st.header("Importar Clientes")
+    st.write("Columnas reconocidas: " + ", ".join(COLUMNAS_IMPORTACION))
+    st.caption("El código de cada cliente se asigna al importar. Provincia y ciudad deben existir en la DPA.")
+
+    archivo = st.file_uploader("Archivo de clientes", type=["csv", "xlsx"])
+    if archivo is not None and st.button("Importar"):
+        barra = st.progress(0.0)
+        total = max(archivo.size, 1)
+
+        def progreso(leidas, insertados):
+            barra.progress(min(archivo.tell() / total, 1.0), text=f"{leidas} filas leídas, {insertados} importadas")
+
+        with session_scope() as db:
+            resultado = importar_clientes(db, permisionario, archivo, archivo.name, progreso=progreso)
+        barra.progress(1.0)
+
+        st.success(f"Clientes importados: {resultado['insertados']} de {resultado['leidas']}")
+        errores = resultado["errores"]
+        if not errores.empty:
+            st.warning(f"{len(errores)} filas rechazadas")
+            st.dataframe(errores)
+            st.download_button(
+                label="📥 Descargar filas rechazadas",
+                data=errores.to_csv().encode("utf-8-sig"),
+                file_name="errores_importacion.csv",
+                mime="text/csv"
+            )
+
+def search_clients(permisionario):
+    st.header("Buscar Clientes")
+    search_term = st.text_input("Buscar por nombre o correo")
+    if search_term:
+        with session_scope() as db:
+            results = buscar_clientes(db, permisionario, search_term, campos=["nombres", "correo"])
+        if results:
+            for client in results:
+                with st.expander(f"{client.nombres} {client.apellidos}"):
+                    st.write(f"**Email:** {client.correo}")
+                    st.write(f"**Teléfono:** {client.telefono}")
+                    st.write(f"**Estado:** {client.estado}")
+                    if st.button("Eliminar", key=f"del_{client.id}") and delete_client(client.id):
+                        st.success("Cliente eliminado exitosamente!")
+                        st.rerun()
+        else:
+            st.info("No se encontraron resultados")
@@ -0,0 +1,169 @@
+from datetime import date
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from models import Client
+from services.busqueda_clientes import normalizar, normalizar_serie
+from services.carga_datos import leer_por_bloques, insertar_dataframe
+from services.dpa import obtener_indice
+from services.numeracion import reservar_codigos_cliente
+from services.telefonos import normalizar_telefonos
+
+TAMANO_LOTE = 5000
+
+# Columnas de Client que se pueden importar (el código y el permisionario los asigna el sistema)
+COLUMNAS_IMPORTACION = [
+    "nombres", "apellidos", "cliente", "cedula_ruc", "servicio_contratado", "plan_contratado",
+    "provincia", "ciudad", "direccion", "telefono", "correo", "fecha_de_inscripcion", "estado", "ip"
+]
+
+# Encabezados alternativos del archivo (normalizados) → columna
+ALIAS_COLUMNAS = {
+    "cedula": "cedula_ruc",
+    "ruc": "cedula_ruc",
+    "cedula/ruc": "cedula_ruc",
+    "canton": "ciudad",
+    "email": "correo",
+    "correo electronico": "correo",
+    "fecha de inscripcion": "fecha_de_inscripcion",
+    "servicio": "servicio_contratado",
+    "plan": "plan_contratado",
+}
+
+SERVICIOS = ["INTERNET", "TV", "INTERNET+TV"]
+ESTADOS = ["ACTIVO", "INACTIVO"]
+
+PATRON_CORREO = r"[^@\s]+@[^@\s]+\.[^@\s]+"
+
+
+def _nombre_columna(encabezado):
+    nombre = normalizar(str(encabezado or "")).strip()
+    return ALIAS_COLUMNAS.get(nombre, nombre.replace(" ", "_"))
+
+
+# Pares (provincia, cantón) normalizados → nombres oficiales de la DPA
+def pares_dpa():
+    indice = obtener_indice()
+    return pd.DataFrame(
+        [
+            (normalizar(provincia), normalizar(canton), provincia, canton)
+            for provincia, cantones in indice["cantones"].items()
+            for canton in cantones
+        ],
+        columns=["_provincia", "_ciudad", "provincia", "ciudad"],
+    )
+
+
+# Cédula ecuatoriana: provincia 01-24 o 30, tercer dígito menor a 6 y dígito verificador módulo 10
+def cedulas_validas(cedulas):
+    validas = np.zeros(len(cedulas), dtype=bool)
+    diez = cedulas.str.fullmatch(r"\d{10}").to_numpy()
+    if diez.any():
+        digitos = np.array([list(c) for c in cedulas[diez]], dtype=np.int64)
+        provincia = digitos[:, 0] * 10 + digitos[:, 1]
+        productos = digitos[:, :9] * np.array([2, 1, 2, 1, 2, 1, 2, 1, 2])
+        productos = np.where(productos > 9, productos - 9, productos)
+        verificador = (10 - productos.sum(axis=1) % 10) % 10
+        validas[diez] = (
+            (((provincia >= 1) & (provincia <= 24)) | (provincia == 30))
+            & (digitos[:, 2] < 6)
+            & (verificador == digitos[:, 9])
+        )
+    # RUC: 13 dígitos que no terminan en 000
+    validas |= cedulas.str.fullmatch(r"\d{10}(?!000)\d{3}").to_numpy()
+    return validas
+
+
+# Valida un bloque con operaciones vectorizadas. Devuelve (registros válidos, errores por fila).
+# `correos_vistos` acumula los correos de bloques anteriores para detectar duplicados en el archivo.
+def validar_bloque(db, bloque, permisionario, correos_vistos, dpa):
+    datos = pd.DataFrame(index=bloque.index)
+    for columna in COLUMNAS_IMPORTACION:
+        datos[columna] = bloque[columna].astype(str).str.strip() if columna in bloque else ""
+
+    # Cliente a partir de nombres y apellidos cuando no viene en el archivo
+    sin_cliente = datos["cliente"] == ""
+    datos.loc[sin_cliente, "cliente"] = (datos["nombres"] + " " + datos["apellidos"]).str.strip()[sin_cliente]
+
+    # Ceros a la izquierda que Excel pierde al guardar la cédula como número
+    cedula = datos["cedula_ruc"].str.replace(r"[\s-]", "", regex=True)
+    datos["cedula_ruc"] = cedula.mask(cedula.str.fullmatch(r"\d{9}|\d{12}"), "0" + cedula)
+
+    datos["correo"] = datos["correo"].str.lower()
+    for columna in ("servicio_contratado", "estado"):
+        datos[columna] = datos[columna].str.upper()
+    datos.loc[datos["estado"] == "", "estado"] = "ACTIVO"
+    datos.loc[datos["fecha_de_inscripcion"] == "", "fecha_de_inscripcion"] = date.today().strftime("%Y-%m-%d")
+
+    # Provincia y ciudad contra la DPA, sin distinguir mayúsculas ni tildes
+    claves = pd.DataFrame({
+        "_provincia": normalizar_serie(datos["provincia"]),
+        "_ciudad": normalizar_serie(datos["ciudad"]),
+    }, index=datos.index)
+    oficiales = claves.merge(dpa, on=["_provincia", "_ciudad"], how="left").set_index(datos.index)
+    en_dpa = oficiales["provincia"].notna()
+    datos.loc[en_dpa, "provincia"] = oficiales.loc[en_dpa, "provincia"]
+    datos.loc[en_dpa, "ciudad"] = oficiales.loc[en_dpa, "ciudad"]
+
+    # Correos únicos: dentro del archivo y contra la base de datos (un solo IN por bloque)
+    correos = datos["correo"]
+    con_correo = correos != ""
+    existentes = set(db.execute(
+        select(Client.correo).where(Client.correo.in_(correos[con_correo].unique().tolist()))
+    ).scalars()) if con_correo.any() else set()
+
+    reglas = [
+        (datos["cliente"] == "", "Falta el nombre del cliente"),
+        (datos["cedula_ruc"] == "", "Falta la cédula/RUC"),
+        ((datos["cedula_ruc"] != "") & ~cedulas_validas(datos["cedula_ruc"]), "Cédula/RUC inválida"),
+        (~en_dpa, "Provincia/ciudad no existe en la DPA"),
+        (con_correo & ~correos.str.fullmatch(PATRON_CORREO), "Correo inválido"),
+        (con_correo & correos.isin(existentes), "El correo ya está registrado"),
+        (con_correo & (correos.duplicated() | correos.isin(correos_vistos)), "Correo duplicado en el archivo"),
+        ((datos["servicio_contratado"] != "") & ~datos["servicio_contratado"].isin(SERVICIOS), "Servicio contratado inválido"),
+        (~datos["estado"].isin(ESTADOS), "Estado inválido"),
+    ]
+    mensajes = pd.Series("", index=datos.index)
+    for mascara, mensaje in reglas:
+        mascara = pd.Series(mascara, index=datos.index).fillna(True)
+        mensajes[mascara] = mensajes[mascara] + mensaje + "; "
+
+    correos_vistos.update(correos[con_correo])
+    invalidas = mensajes != ""
+    errores = bloque.loc[invalidas].assign(errores=mensajes[invalidas].str.rstrip("; "))
+    validos = datos.loc[~invalidas].replace({"": None})
+    validos["permisionario"] = permisionario
+    validos["telefono_e164"] = normalizar_telefonos(validos["telefono"])
+    return validos, errores
+
+
+# Importa un archivo de clientes por bloques: valida, reserva los códigos del bloque en una
+# sola operación e inserta en la misma transacción. Un bloque que falla al insertar se
+# reporta completo como error y no afecta a los demás.
+# `progreso(filas_leidas, insertados)` se llama después de cada bloque.
+def importar_clientes(db, permisionario, archivo, nombre_archivo, tamano_lote=TAMANO_LOTE, progreso=None):
+    dpa = pares_dpa()
+    correos_vistos = set()
+    insertados, leidas, errores = 0, 0, []
+
+    for bloque in leer_por_bloques(archivo, nombre_archivo, _nombre_columna, tamano_lote):
+        leidas += len(bloque)
+        validos, errores_bloque = validar_bloque(db, bloque, permisionario, correos_vistos, dpa)
+        errores.append(errores_bloque)
+
+        if not validos.empty:
+            try:
+                validos["codigo"] = reservar_codigos_cliente(db, permisionario, len(validos))
+                insertar_dataframe(db, Client, validos)
+                db.commit()
+                insertados += len(validos)
+            except Exception as e:
+                db.rollback()
+                errores.append(bloque.loc[validos.index].assign(errores=f"Error al insertar el bloque: {e}"))
+
+        if progreso:
+            progreso(leidas, insertados)
+
+    errores = pd.concat(errores) if errores else pd.DataFrame()
+    errores.index.name = "fila"
+    return {"leidas": leidas, "insertados": insertados, "errores": errores}
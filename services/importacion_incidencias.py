@@ -0,0 +1,163 @@
+from datetime import datetime
+import pandas as pd
+import streamlit as st
+from database import session_scope
+from models import TiemPro
+from services.busqueda_clientes import normalizar, normalizar_serie
+from services.cache_incidencias import cache_incidencias
+from services.carga_datos import leer_por_bloques, insertar_dataframe
+from services.incidencias import OPCIONES_INCIDENCIAS, meses_espanol
+from services.numeracion import SERIE_INCIDENCIAS, reservar_numeros, marcar_mes_modificado
+from services.agregados_incidencias import acumular_dataframe
+from services.reportes import FORMATO_FECHA, REPORTES
+
+TAMANO_LOTE = 10000
+
+# Encabezados del regulador (ambos reportes, normalizados) → campo de TiemPro
+CAMPOS_POR_TITULO = {
+    normalizar(titulo).strip(): campo
+    for reporte in REPORTES.values()
+    for titulo, campo, _ in reporte["columnas"]
+}
+
+CAMPOS_TEXTO = [
+    "provincia", "mes", "nombre_reclamante", "telefono_contacto", "tipo_conexion",
+    "canal_reclamo", "tipo_reclamo", "descripcion_solucion"
+]
+
+# Número de mes → nombre en español
+MESES = dict(enumerate(meses_espanol.values(), start=1))
+
+# Tipos de reclamo normalizados → nombre oficial
+TIPOS_RECLAMO = {normalizar(tipo): tipo for tipos in OPCIONES_INCIDENCIAS.values() for tipo in tipos}
+
+
+def _nombre_columna(encabezado):
+    nombre = normalizar(str(encabezado or "")).strip()
+    return CAMPOS_POR_TITULO.get(nombre, nombre.replace(" ", "_"))
+
+
+# dd/mm/aaaa hh:mm en una sola pasada; las celdas con otro formato (fechas de Excel, solo fecha)
+# se interpretan aparte y con el día primero
+def parsear_fechas(textos):
+    fechas = pd.to_datetime(textos, format=FORMATO_FECHA, errors="coerce")
+    otras = fechas.isna() & (textos != "")
+    if otras.any():
+        fechas[otras] = pd.to_datetime(textos[otras], format="mixed", dayfirst=True, errors="coerce")
+    return fechas
+
+
+# Convierte un bloque del archivo en registros de TiemPro con operaciones vectorizadas.
+# Devuelve (registros válidos sin item, errores por fila).
+def preparar_bloque(bloque, permisionario):
+    datos = pd.DataFrame(index=bloque.index)
+    for campo in CAMPOS_TEXTO + ["item", "fecha_hora_registro", "fecha_hora_solucion", "tiempo_resolucion_horas"]:
+        datos[campo] = bloque[campo].astype(str).str.strip() if campo in bloque else ""
+
+    registro = parsear_fechas(datos["fecha_hora_registro"])
+    solucion = parsear_fechas(datos["fecha_hora_solucion"])
+    tipo = normalizar_serie(datos["tipo_reclamo"]).map(TIPOS_RECLAMO)
+
+    horas = pd.to_numeric(datos["tiempo_resolucion_horas"].str.replace(",", ".", regex=False), errors="coerce")
+    horas = horas.fillna(((solucion - registro).dt.total_seconds() / 3600).round(2))
+
+    reglas = [
+        (registro.isna(), "Fecha de registro vacía o inválida"),
+        (solucion.isna() & (datos["fecha_hora_solucion"] != ""), "Fecha de solución inválida"),
+        (solucion < registro, "La solución es anterior al registro"),
+        (tipo.isna(), "Tipo de reclamo desconocido"),
+    ]
+    mensajes = pd.Series("", index=datos.index)
+    for mascara, mensaje in reglas:
+        mensajes[mascara] = mensajes[mascara] + mensaje + "; "
+    invalidas = mensajes != ""
+    errores = bloque.loc[invalidas].assign(errores=mensajes[invalidas].str.rstrip("; "))
+
+    # El mes se toma del archivo o, si falta, de la fecha de registro
+    mes = datos["mes"].mask(datos["mes"] == "", registro.dt.month.map(MESES))
+    # El ITEM original se conserva en la descripción; el número se asigna de la serie del permisionario
+    origen = ("Importado (ITEM original " + datos["item"] + ")").where(datos["item"] != "", "Importado")
+
+    registros = datos[CAMPOS_TEXTO].assign(
+        mes=mes,
+        tipo_reclamo=tipo,
+        fecha_hora_registro=registro,
+        fecha_hora_solucion=solucion,
+        tiempo_resolucion_horas=horas,
+        descripcion_incidencia=origen,
+        permisionario=permisionario,
+        estado_incidencia=solucion.notna().map({True: "Finalizado", False: "Pendiente"}),
+    ).loc[~invalidas]
+    registros = registros.astype(object).where(registros.notna(), None).replace({"": None})
+    return registros, errores
+
+
+# Importa el histórico de incidencias por bloques. Cada bloque reserva sus números de item en
+# una sola operación, se inserta, se suma al agregado de incidencias y marca sus meses para los
+# reportes materializados en la misma transacción. La memoria depende del tamaño del bloque, no del archivo.
+# `progreso(filas_leidas, insertados)` se llama después de cada bloque.
+def importar_incidencias(db, permisionario, archivo, nombre_archivo, tamano_lote=TAMANO_LOTE, progreso=None):
+    insertados, leidas, errores = 0, 0, []
+
+    for bloque in leer_por_bloques(archivo, nombre_archivo, _nombre_columna, tamano_lote):
+        leidas += len(bloque)
+        registros, errores_bloque = preparar_bloque(bloque, permisionario)
+        errores.append(errores_bloque)
+
+        if not registros.empty:
+            try:
+                numeros = reservar_numeros(db, permisionario, SERIE_INCIDENCIAS, len(registros))
+                registros.insert(0, "item", [str(numero) for numero in numeros])
+                insertar_dataframe(db, TiemPro, registros)
+                acumular_dataframe(db, registros)
+                meses = {(fecha.year, fecha.month) for fecha in registros["fecha_hora_registro"]}
+                for anio, mes in meses:
+                    marcar_mes_modificado(db, permisionario, datetime(anio, mes, 1))
+                db.commit()
+                insertados += len(registros)
+            except Exception as e:
+                db.rollback()
+                errores.append(bloque.loc[registros.index].assign(errores=f"Error al insertar el bloque: {e}"))
+
+        if progreso:
+            progreso(leidas, insertados)
+
+    if insertados:
+        cache_incidencias.invalidar(permisionario)
+
+    errores = pd.concat(errores) if errores else pd.DataFrame()
+    errores.index.name = "fila"
+    return {"leidas": leidas, "insertados": insertados, "errores": errores}
+
+
+# Página de importación del histórico en el formato de los reportes del regulador
+def importacion_incidencias(permisionario):
+    st.header("Importar Histórico de Incidencias")
+    st.caption(
+        "Se aceptan las hojas de Reclamos Generales y Reparación de Averías con los encabezados del regulador. "
+        "Cada incidencia recibe un número de item nuevo; el ITEM original queda en la descripción."
+    )
+
+    archivo = st.file_uploader("Archivo de incidencias", type=["csv", "xlsx"])
+    if archivo is not None and st.button("Importar"):
+        barra = st.progress(0.0)
+        total = max(archivo.size, 1)
+
+        def progreso(leidas, insertados):
+            barra.progress(min(archivo.tell() / total, 1.0), text=f"{leidas} filas leídas, {insertados} importadas")
+
+        with session_scope() as db:
+            resultado = importar_incidencias(db, permisionario, archivo, archivo.name, progreso=progreso)
+        barra.progress(1.0)
+
+        st.success(f"Incidencias importadas: {resultado['insertados']} de {resultado['leidas']}")
+        errores = resultado["errores"]
+        if not errores.empty:
+            st.warning(f"{len(errores)} filas rechazadas")
+            st.dataframe(errores)
+            st.download_button(
+                label="📥 Descargar filas rechazadas",
+                data=errores.to_csv().encode("utf-8-sig"),
+                file_name="errores_importacion_incidencias.csv",
+                mime="text/csv"
+            )
@@ -2,26 +2,68 @@ import streamlit as st
 import pandas as pd
 import pytz
 from datetime import datetime
-from database import get_db
+from database import session_scope
 from models import TiemPro, Client
-from sqlalchemy import func
+from services.numeracion import SERIE_INCIDENCIAS, siguiente_numero, marcar_mes_modificado
+from services.cache_incidencias import cache_incidencias, consultar, obtener_snapshot
+from services.consultas_incidencias import obtener_kpis
+from services.agregados_incidencias import estado_agregado, sumar_incidencia, actualizar_incidencia
 
 
 def registrar_tiempro(data_tiempro):
-    db = next(get_db())
-    try:
-        new_entry = TiemPro(**data_tiempro)
-        db.add(new_entry)
-        db.commit()
-        db.refresh(new_entry)
-        return True
-    except Exception as e:
-        db.rollback()
-        st.error(f"Error al registrar incidencia en TiemPro: {str(e)}")
-        return False
-    finally:
-        db.close()
-        
+    with session_scope() as db:
+        try:
+            # Asignar el número de incidencia en la misma transacción del registro
+            if not data_tiempro.get("item"):
+                data_tiempro["item"] = str(siguiente_numero(db, data_tiempro["permisionario"], SERIE_INCIDENCIAS))
+            new_entry = TiemPro(**data_tiempro)
+            db.add(new_entry)
+            sumar_incidencia(db, new_entry)
+            marcar_mes_modificado(db, new_entry.permisionario, new_entry.fecha_hora_registro)
+            db.commit()
+            db.refresh(new_entry)
+            cache_incidencias.invalidar(new_entry.permisionario, new_entry.fecha_hora_registro)
+            return True
+        except Exception as e:
+            db.rollback()
+            st.error(f"Error al registrar incidencia en TiemPro: {str(e)}")
+            return False
+
+
+# Guarda la solución de una incidencia y, con `finalizar`, la marca como finalizada con su tiempo de
+# resolución. La fila se bloquea (SELECT ... FOR UPDATE) antes de tomar su estado anterior para el
+# agregado: dos guardados simultáneos de la misma incidencia se aplican uno después del otro y el
+# segundo descuenta del agregado lo que dejó el primero. Devuelve la incidencia, o None si no existe.
+def guardar_solucion(db, permisionario, item, descripcion_solucion, finalizar=False):
+    incidencia = db.query(TiemPro).filter(
+        TiemPro.permisionario == permisionario,
+        TiemPro.item == str(item)
+    ).with_for_update().first()
+    if incidencia is None:
+        return None
+
+    anterior = estado_agregado(incidencia)
+    incidencia.descripcion_solucion = descripcion_solucion
+    if finalizar:
+        incidencia.estado_incidencia = "Finalizado"
+
+        zona_horaria = pytz.timezone('America/Guayaquil')
+        # Obtener la fecha y hora actual para la solución
+        ahora = datetime.now(zona_horaria)
+        incidencia.fecha_hora_solucion = ahora.replace(tzinfo=None)
+
+        fecha_hora_registro = incidencia.fecha_hora_registro
+        if fecha_hora_registro.tzinfo is None:
+            fecha_hora_registro = zona_horaria.localize(fecha_hora_registro)
+        incidencia.tiempo_resolucion_horas = round((ahora - fecha_hora_registro).total_seconds() / 3600, 2)
+
+    actualizar_incidencia(db, anterior, incidencia)
+    marcar_mes_modificado(db, permisionario, incidencia.fecha_hora_registro)
+    db.commit()
+    cache_incidencias.invalidar(permisionario, incidencia.fecha_hora_registro)
+    return incidencia
+
+
 # Diccionario para traducir los nombres de los meses al español
 meses_espanol = {
         "January": "Enero", "February": "Febrero", "March": "Marzo", "April": "Abril",
@@ -29,27 +71,29 @@ meses_espanol = {
         "September": "Septiembre", "October": "Octubre", "November": "Noviembre", "December": "Diciembre"
     }         
 
-def obtener_ultimo_item(db, permisionario):
-        try:
-            # Expira todas las entidades para obtener los datos más recientes desde la base de datos
-            db.expire_all()
-            
-            # Obtener el valor máximo de `item` actual para el permisionario
-            ultimo_item = db.query(func.max(TiemPro.item)).filter(TiemPro.permisionario == permisionario).execution_options(populate_existing=True).scalar()
-            
-            # Si no hay ningún ítem, el siguiente debe ser 1
-            if ultimo_item is None:
-                return 1
-            
-            # Si hay un valor máximo, incrementarlo en 1 para el siguiente `item`
-            siguiente_item = int(ultimo_item) + 1
-            print(f"Siguiente ítem para permisionario '{permisionario}': {siguiente_item}")
-            
-            return siguiente_item
-
-        except Exception as e:
-            print(f"Error al obtener el último ítem: {e}")
-            return 1   
+# Tipos de incidencia por categoría (las categorías coinciden con los reportes de Reportería)
+OPCIONES_INCIDENCIAS = {
+    "Reparación de Averías": [
+        "INDISPONIBILIDAD DEL SERVICIO",
+        "INTERRUPCIÓN DEL SERVICIO",
+        "DESCONEXIÓN O SUSPENSIÓN ERRÓNEA DEL SERVICIO",
+        "DEGRADACIÓN DEL SERVICIO",
+        "LIMITACIONES Y RESTRICCIONES DE USO DE APLICACIONES O DEL SERVICIO EN GENERAL SIN CONSENTIMIENTO DEL CLIENTE"
+    ],
+    
+    "Reclamos Generales": [
+        "ACTIVACIÓN DEL SERVICIO EN TÉRMINOS DISTINTOS A LO FIJADO EN EL CONTRATO DE PRESTACIÓN DEL SERVICIO",
+        "REACTIVACIÓN DEL SERVICIO EN PLAZOS DISTINTOS A LOS FIJADOS EN EL CONTRATO DE PRESTACIÓN DEL SERVICIO",
+        "INCUMPLIMIENTO DE LAS CLÁUSULAS CONTRACTUALES PACTADAS",
+        "SUSPENSIÓN DEL SERVICIO SIN FUNDAMENTO LEGAL O CONTRACTUAL",
+        "NO TRAMITACIÓN DE SOLICITUD DE TERMINACIÓN DEL SERVICIO"
+    ],
+    
+    "Otros": [
+        "CAPACIDAD DE CANAL",
+        "NO PROCEDENTES"
+    ]
+}
 
 
 def mostrar_opciones_incidencia(client_id):
@@ -60,32 +104,10 @@ def mostrar_opciones_incidencia(client_id):
                 'incidencia_seleccionada': "Selecciona una incidencia"
             }
         
-        opciones_incidencias = {
-            "Reparación de Averías": [
-                "INDISPONIBILIDAD DEL SERVICIO",
-                "INTERRUPCIÓN DEL SERVICIO",
-                "DESCONEXIÓN O SUSPENSIÓN ERRÓNEA DEL SERVICIO",
-                "DEGRADACIÓN DEL SERVICIO",
-                "LIMITACIONES Y RESTRICCIONES DE USO DE APLICACIONES O DEL SERVICIO EN GENERAL SIN CONSENTIMIENTO DEL CLIENTE"
-            ],
-            
-            "Reclamos Generales": [
-                "ACTIVACIÓN DEL SERVICIO EN TÉRMINOS DISTINTOS A LO FIJADO EN EL CONTRATO DE PRESTACIÓN DEL SERVICIO",
-                "REACTIVACIÓN DEL SERVICIO EN PLAZOS DISTINTOS A LOS FIJADOS EN EL CONTRATO DE PRESTACIÓN DEL SERVICIO",
-                "INCUMPLIMIENTO DE LAS CLÁUSULAS CONTRACTUALES PACTADAS",
-                "SUSPENSIÓN DEL SERVICIO SIN FUNDAMENTO LEGAL O CONTRACTUAL",
-                "NO TRAMITACIÓN DE SOLICITUD DE TERMINACIÓN DEL SERVICIO"
-            ],
-            
-            "Otros": [
-                "CAPACIDAD DE CANAL",
-                "NO PROCEDENTES"
-            ]
-        }
     # Lista completa de opciones para el selectbox
         opciones_lista = ["Selecciona una incidencia"] + [
             f"{categoria}: {incidencia}"
-            for categoria, incidencias in opciones_incidencias.items()
+            for categoria, incidencias in OPCIONES_INCIDENCIAS.items()
             for incidencia in incidencias
         ]
 
@@ -107,9 +129,8 @@ def mostrar_opciones_incidencia(client_id):
         # Si se selecciona una incidencia válida
         if incidencia_seleccionada != "Selecciona una incidencia":
             # Obtener información del cliente
-            db = next(get_db())
-            client = db.query(Client).filter(Client.id == client_id).first()
-            db.close()
+            with session_scope() as db:
+                client = db.query(Client).filter(Client.id == client_id).first()
 
             if client:
                 st.write("---")
@@ -160,16 +181,8 @@ def mostrar_opciones_incidencia(client_id):
                     # Botón de envío del formulario
                     submitted = st.form_submit_button("Registrar Incidencia")
                     if submitted:
-                        # Obtener el siguiente número de `item`
-                        db = next(get_db())
-                        
-                        # Llamar a la función para obtener el último `item` sin usar caché
-                        nuevo_item = obtener_ultimo_item(db, client.permisionario)
-                        print(f"Siguiente número de ítem generado: {nuevo_item}")
-                        
-                        # Actualizar el diccionario `data_tiempro` con los datos del nuevo `item`
+                        # Completar `data_tiempro`; el número de `item` se asigna al registrar
                         data_tiempro.update({
-                            "item": nuevo_item,
                             "canal_reclamo": canal_reclamo,
                             "descripcion_incidencia": descripcion_incidencia,
                             "fecha_hora_solucion": fecha_hora_solucion,
@@ -178,10 +191,8 @@ def mostrar_opciones_incidencia(client_id):
                         
                         # Registrar el nuevo `item` en la base de datos
                         if registrar_tiempro(data_tiempro):
+                            nuevo_item = data_tiempro["item"]
                             try:
-                                # Confirmar los cambios en la base de datos
-                                db.commit()
-                                
                                 # Crear una ventana emergente con el número de ítem
                                 st.markdown(
                                     f"""
@@ -211,67 +222,60 @@ def mostrar_opciones_incidencia(client_id):
                                 st.session_state[f'incidencia_state_{client_id}']['incidencia_seleccionada'] = "Selecciona una incidencia"
                             
                             except Exception as e:
-                                # Si ocurre un error, hacer rollback de la transacción
-                                db.rollback()
                                 st.error(f"Error al registrar la incidencia: {e}")
                             
                         else:
                             st.error("Error al registrar la incidencia.")
-                        
-                        # Cerrar la sesión de la base de datos
-                        db.close()
 
                 return incidencia_seleccionada
 
 
+# Columnas de la instantánea mostradas en el registro de incidencias
+COLUMNAS_INCIDENCIAS = {
+    "item": "Item",
+    "provincia": "Provincia",
+    "mes": "Mes",
+    "fecha_hora_registro": "Fecha Registro",
+    "nombre_reclamante": "Nombre Reclamante",
+    "telefono_contacto": "Teléfono",
+    "tipo_conexion": "Tipo Conexión",
+    "tipo_reclamo": "Tipo Reclamo",
+    "canal_reclamo": "Canal Reclamo",
+    "fecha_hora_solucion": "Fecha Solución",
+    "tiempo_resolucion_horas": "Tiempo Resolución (horas)",
+    "descripcion_incidencia": "Descripcion Incidencia",
+    "descripcion_solucion": "Descripción Solución",
+    "estado_incidencia": "Estado",
+}
+
+
 def incidencias(permisionario):
         st.header("Estadísticas de Incidencias")
 
-        # Obtener datos de incidencias
-        db = next(get_db())
-        incidencias = db.query(TiemPro).filter(TiemPro.permisionario == permisionario).all()
+        # Obtener datos de incidencias desde la instantánea compartida del permisionario
+        snapshot = obtener_snapshot(permisionario)
 
-        if not incidencias:
+        if snapshot.empty:
             st.warning("No hay incidencias registradas para mostrar.")
             return
         
         # Métricas generales
-        total_incidencias = len(incidencias)
-        tiempo_promedio = sum(inc.tiempo_resolucion_horas for inc in incidencias) / total_incidencias if total_incidencias > 0 else 0
-        pendientes = sum(1 for inc in incidencias if inc.estado_incidencia == "Pendiente")
-        finalizadas = sum(1 for inc in incidencias if inc.estado_incidencia == "Finalizado")
+        kpis = consultar(permisionario, ("kpis", "Todos", "Todos"), obtener_kpis, permisionario)
 
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total de Incidencias", total_incidencias)
+            st.metric("Total de Incidencias", kpis["total"])
         with col2:
-            st.metric("Incidencias Finalizadas", finalizadas)
+            st.metric("Incidencias Finalizadas", kpis["finalizadas"])
         with col3:
-            st.metric("Incidencias Pendientes", pendientes)
+            st.metric("Incidencias Pendientes", kpis["pendientes"])
         with col4:
-            st.metric("Tiempo Promedio de Resolución (horas)", f"{tiempo_promedio:.2f}")
+            st.metric("Tiempo Promedio de Resolución (horas)", f"{kpis['tiempo_promedio']:.2f}")
 
         search_term = st.text_input("Buscar por Cliente o Número de Incidencia")
 
         # Crear DataFrame completo con todos los datos
-        df_completo = pd.DataFrame([
-            {
-                "Item": inc.item,
-                "Provincia": inc.provincia,
-                "Mes": inc.mes,
-                "Fecha Registro": inc.fecha_hora_registro,
-                "Nombre Reclamante": inc.nombre_reclamante,
-                "Teléfono": inc.telefono_contacto,
-                "Tipo Conexión": inc.tipo_conexion,
-                "Tipo Reclamo": inc.tipo_reclamo,
-                "Canal Reclamo": inc.canal_reclamo,
-                "Fecha Solución": inc.fecha_hora_solucion,
-                "Tiempo Resolución (horas)": inc.tiempo_resolucion_horas,
-                "Descripcion Incidencia": inc.descripcion_incidencia,
-                "Descripción Solución": inc.descripcion_solucion,
-                "Estado": inc.estado_incidencia,
-            } for inc in incidencias
-        ])
+        df_completo = snapshot[list(COLUMNAS_INCIDENCIAS)].rename(columns=COLUMNAS_INCIDENCIAS)
 
         # Aplicar filtro de búsqueda solo si se proporciona un término
         if search_term:
@@ -311,35 +315,18 @@ def incidencias(permisionario):
                         submit_finalizar = st.form_submit_button("Finalizar Incidencia")
 
                     if submit_solucion or submit_finalizar:
-                        incidencia = db.query(TiemPro).filter(TiemPro.item == int(item_seleccionado)).first()
-                        if incidencia:
-                            incidencia.descripcion_solucion = descripcion_solucion
-                        
-                        if submit_finalizar:
-                            incidencia.estado_incidencia = "Finalizado"
-                            
-                            zona_horaria = pytz.timezone('America/Guayaquil')
-                            fecha_hora_solucion = datetime.now(zona_horaria).replace(tzinfo=None)
-                            # Obtener la fecha y hora actual para la solución
-                            incidencia.fecha_hora_solucion = fecha_hora_solucion  # Guardar la fecha y hora de solución
-                            
-                            if incidencia.fecha_hora_registro.tzinfo is None:
-                                fecha_hora_registro = zona_horaria.localize(incidencia.fecha_hora_registro)
-                            
-                            tiempo_resolucion = (datetime.now(zona_horaria) - fecha_hora_registro).total_seconds() / 3600
-                            incidencia.tiempo_resolucion_horas = round(tiempo_resolucion, 2)
-
-
-                            # Guardar en la base de datos
+                        with session_scope() as db:
                             try:
-                                db.commit()  # Asegúrate de que se guarden los cambios
-                                st.success("Incidencia finalizada y solución guardada con éxito.")
+                                incidencia = guardar_solucion(db, permisionario, item_seleccionado, descripcion_solucion, submit_finalizar)
+                                if incidencia is None:
+                                    st.error("No se pudo encontrar la incidencia seleccionada")
+                                elif submit_finalizar:
+                                    st.success("Incidencia finalizada y solución guardada con éxito.")
+                                else:
+                                    st.success("Solución guardada con éxito.")
                             except Exception as e:
                                 db.rollback()
-                                st.error(f"Error al finalizar la incidencia: {str(e)}")    
-                            
-                        else:
-                            st.error("No se pudo encontrar la incidencia seleccionada")
+                                st.error(f"Error al finalizar la incidencia: {str(e)}")
 
             # Aplicar filtros
             df_filtrado = df_completo.copy()
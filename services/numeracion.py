@@ -0,0 +1,131 @@
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import Contador
+
+
+# Series de numeración por permisionario
+SERIE_INCIDENCIAS = "incidencias"
+SERIE_CLIENTES = "clientes"
+# Versión de todos los datos de incidencias del permisionario (caché de consultas)
+SERIE_DATOS_INCIDENCIAS = "datos_incidencias"
+
+
+# Reserva `cantidad` números consecutivos de la serie y devuelve el rango asignado.
+# El incremento es un único UPSERT ... RETURNING sobre la fila del contador, que queda
+# bloqueada hasta que la transacción del llamador termina; dos agentes nunca reciben el
+# mismo número y el costo no depende de cuántos registros tenga el permisionario.
+def reservar_numeros(db, permisionario, serie, cantidad=1):
+    if cantidad < 1:
+        raise ValueError("La cantidad a reservar debe ser al menos 1")
+
+    dialecto = db.bind.dialect.name
+    if dialecto in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialecto == "postgresql" else sqlite.insert
+        sentencia = insert(Contador).values(
+            permisionario=permisionario, serie=serie, ultimo_valor=cantidad
+        )
+        sentencia = sentencia.on_conflict_do_update(
+            index_elements=[Contador.permisionario, Contador.serie],
+            set_={"ultimo_valor": Contador.ultimo_valor + cantidad},
+        ).returning(Contador.ultimo_valor)
+        ultimo = db.execute(sentencia).scalar_one()
+    else:
+        # Otros motores: bloqueo explícito de la fila del contador
+        contador = db.execute(
+            select(Contador).where(Contador.permisionario == permisionario, Contador.serie == serie).with_for_update()
+        ).scalar_one_or_none()
+        if contador is None:
+            contador = Contador(permisionario=permisionario, serie=serie, ultimo_valor=0)
+            db.add(contador)
+        contador.ultimo_valor += cantidad
+        db.flush()
+        ultimo = contador.ultimo_valor
+
+    return range(ultimo - cantidad + 1, ultimo + 1)
+
+
+# Siguiente número de la serie (reserva de un solo número)
+def siguiente_numero(db, permisionario, serie):
+    return reservar_numeros(db, permisionario, serie)[0]
+
+
+# Serie con la versión de datos de las incidencias de un mes (reportes materializados)
+def serie_mes(anio, mes):
+    return f"reporte_{anio}_{mes:02d}"
+
+
+# Versión de datos de varios meses con una sola consulta: {(año, mes): versión}. Es compartida por
+# todos los procesos (páginas, importadores de línea de comandos, otras réplicas).
+def versiones_meses(db, permisionario, periodos):
+    series = {serie_mes(anio, mes): (anio, mes) for anio, mes in periodos}
+    versiones = dict.fromkeys(series.values(), 0)
+    filas = db.execute(
+        select(Contador.serie, Contador.ultimo_valor).where(
+            Contador.permisionario == permisionario, Contador.serie.in_(list(series))
+        )
+    ).all()
+    for serie, valor in filas:
+        versiones[series[serie]] = valor
+    return versiones
+
+
+# Versión de datos de las incidencias del permisionario, compartida por todos los procesos
+def version_datos(db, permisionario):
+    valor = db.execute(
+        select(Contador.ultimo_valor).where(
+            Contador.permisionario == permisionario, Contador.serie == SERIE_DATOS_INCIDENCIAS
+        )
+    ).scalar_one_or_none()
+    return valor or 0
+
+
+# Marca como modificados los datos de incidencias del permisionario (por ejemplo, tras reconstruir el agregado)
+def marcar_datos_modificados(db, permisionario):
+    reservar_numeros(db, permisionario, SERIE_DATOS_INCIDENCIAS)
+
+
+# Marca como modificado el mes de `fecha` dentro de la transacción del llamador.
+# Debe llamarse antes del commit que registra o edita la incidencia.
+def marcar_mes_modificado(db, permisionario, fecha):
+    marcar_datos_modificados(db, permisionario)
+    if fecha is not None:
+        reservar_numeros(db, permisionario, serie_mes(fecha.year, fecha.month))
+
+
+# Código de cliente con formato 0000X
+def formatear_codigo(numero):
+    return f"{numero:04d}"
+
+
+# Reserva en bloque los códigos de cliente (por ejemplo, para una importación)
+def reservar_codigos_cliente(db, permisionario, cantidad=1):
+    return [formatear_codigo(numero) for numero in reservar_numeros(db, permisionario, SERIE_CLIENTES, cantidad)]
+
+
+# Inicializa los contadores de una serie con el mayor valor numérico existente de `columna`.
+# Pensado para ejecutarse una sola vez desde una migración; nunca reduce un contador existente.
+def backfill_contador(conexion, serie, columna, permisionario_columna):
+    maximos = {}
+    resultado = conexion.execution_options(stream_results=True).execute(
+        select(permisionario_columna, columna).where(columna.is_not(None))
+    )
+    for permisionario, valor in resultado:
+        valor = str(valor).strip()
+        if valor.isdigit():
+            maximos[permisionario] = max(maximos.get(permisionario, 0), int(valor))
+
+    for permisionario, maximo in maximos.items():
+        actualizado = conexion.execute(
+            update(Contador)
+            .where(Contador.permisionario == permisionario, Contador.serie == serie, Contador.ultimo_valor < maximo)
+            .values(ultimo_valor=maximo)
+        )
+        if actualizado.rowcount == 0:
+            existe = conexion.execute(
+                select(Contador.ultimo_valor).where(Contador.permisionario == permisionario, Contador.serie == serie)
+            ).first()
+            if existe is None:
+                conexion.execute(Contador.__table__.insert().values(
+                    permisionario=permisionario, serie=serie, ultimo_valor=maximo
+                ))
+    return maximos
@@ -0,0 +1,154 @@
+import cProfile
+import io
+import logging
+import pstats
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from database import configuracion
+
+logger = logging.getLogger(__name__)
+
+# Configuración del perfilado ([perfilado] en secrets.toml, valores opcionales)
+_config = configuracion("perfilado")
+CONFIG_PERFILADO = {
+    "activo": _config.get("activo", False),
+    "muestras": _config.get("muestras", 1000),
+    "tasa_cprofile": _config.get("tasa_cprofile", 0.0),
+    "umbral_cprofile_ms": _config.get("umbral_cprofile_ms", 500),
+    "perfiles_guardados": _config.get("perfiles_guardados", 10),
+}
+
+# cProfile no admite dos capturas a la vez en el proceso: solo se muestrea si no hay otra activa
+_captura_lock = threading.Lock()
+
+
+# Tiempos por sección ("pagina.etapa": carga_datos, construccion_frame, construccion_grafico, render).
+# Dentro de una ejecución de la página las veces que se repite una sección se suman y se guarda
+# una muestra por ejecución; fuera de ella (scripts, fragmentos) cada bloque es una muestra.
+class Perfilador:
+    def __init__(self, muestras, perfiles_guardados):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.tamano_muestras = muestras
+        self.muestras = {}
+        self.totales = {}
+        self.perfiles = deque(maxlen=perfiles_guardados)
+
+    def iniciar_medicion(self):
+        self._local.secciones = {}
+
+    def terminar_medicion(self):
+        secciones = getattr(self._local, "secciones", None)
+        self._local.secciones = None
+        for nombre, segundos in (secciones or {}).items():
+            self._agregar(nombre, segundos)
+
+    def registrar(self, nombre, segundos):
+        secciones = getattr(self._local, "secciones", None)
+        if secciones is None:
+            self._agregar(nombre, segundos)
+        else:
+            secciones[nombre] = secciones.get(nombre, 0.0) + segundos
+
+    def _agregar(self, nombre, segundos):
+        with self._lock:
+            if nombre not in self.muestras:
+                self.muestras[nombre] = deque(maxlen=self.tamano_muestras)
+                self.totales[nombre] = [0, 0.0]
+            self.muestras[nombre].append(segundos)
+            self.totales[nombre][0] += 1
+            self.totales[nombre][1] += segundos
+
+    # Guarda las funciones más costosas de un bloque lento capturado con cProfile
+    def guardar_perfil(self, nombre, segundos, perfil):
+        salida = io.StringIO()
+        pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(25)
+        with self._lock:
+            self.perfiles.append({
+                "seccion": nombre,
+                "duracion_ms": round(segundos * 1000, 1),
+                "fecha": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "estadisticas": salida.getvalue(),
+            })
+        logger.info("Perfil de la sección %s (%.0f ms) capturado", nombre, segundos * 1000)
+
+    # Percentiles por sección (en ms) sobre las últimas `muestras` ejecuciones
+    def resumen(self):
+        # numpy solo se carga cuando se consulta el panel, no al arrancar la aplicación
+        import numpy as np
+        with self._lock:
+            muestras = {nombre: np.array(valores) * 1000 for nombre, valores in self.muestras.items()}
+            totales = {nombre: list(total) for nombre, total in self.totales.items()}
+        secciones = []
+        for nombre, valores in sorted(muestras.items()):
+            p50, p95, p99 = np.percentile(valores, [50, 95, 99]).tolist()
+            secciones.append({
+                "seccion": nombre,
+                "veces": totales[nombre][0],
+                "total_s": round(totales[nombre][1], 3),
+                "p50_ms": round(p50, 2),
+                "p95_ms": round(p95, 2),
+                "p99_ms": round(p99, 2),
+                "max_ms": round(float(valores.max()), 2),
+            })
+        return secciones
+
+    def reiniciar(self):
+        with self._lock:
+            self.muestras.clear()
+            self.totales.clear()
+            self.perfiles.clear()
+
+
+perfilador = Perfilador(CONFIG_PERFILADO["muestras"], CONFIG_PERFILADO["perfiles_guardados"])
+iniciar_medicion = perfilador.iniciar_medicion
+terminar_medicion = perfilador.terminar_medicion
+
+
+# Inicia una captura de cProfile para una fracción `tasa_cprofile` de los bloques
+def _iniciar_captura():
+    if random.random() >= CONFIG_PERFILADO["tasa_cprofile"] or not _captura_lock.acquire(blocking=False):
+        return None
+    perfil = cProfile.Profile()
+    try:
+        perfil.enable()
+    except ValueError:
+        # Otra herramienta de perfilado (por ejemplo, un depurador) ya está activa
+        _captura_lock.release()
+        return None
+    return perfil
+
+
+# Mide un bloque de una página; sin efecto si el perfilado está desactivado
+@contextmanager
+def seccion(nombre):
+    if not CONFIG_PERFILADO["activo"]:
+        yield
+        return
+    perfil = _iniciar_captura()
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        if perfil is not None:
+            perfil.disable()
+            _captura_lock.release()
+            if segundos * 1000 >= CONFIG_PERFILADO["umbral_cprofile_ms"]:
+                perfilador.guardar_perfil(nombre, segundos, perfil)
+        perfilador.registrar(nombre, segundos)
+
+
+# Versión en decorador de `seccion` para funciones completas
+def perfilar(nombre):
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with seccion(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
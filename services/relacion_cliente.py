@@ -1,52 +1,94 @@
 import streamlit as st
-import pywhatkit as pwk
-import time
-from models import Client
-from database import get_db
-
-
-# Función para obtener y formatear la lista de contactos
-def get_and_format_contacts():
-    db = next(get_db())
-    try:
-        contacts = db.query(Client.telefono).all()
-        formatted_contacts = []
-        for contact in contacts:
-            # Asegúrate de que el número no esté vacío y tenga 10 dígitos
-            number = contact.telefono.strip()
-            if number and len(number) == 10 and number.startswith('0'):
-                # Eliminar el cero inicial y agregar el prefijo +593
-                formatted_number = '+593' + number[1:]
-                formatted_contacts.append(formatted_number)
-        return formatted_contacts
-    finally:
-        db.close()
-
-# Función para enviar mensajes a través de WhatsApp
-def send_message(contact, message):
-    try:
-        pwk.sendwhatmsg_instantly(contact, message, wait_time=10, tab_close=True, close_time=3)
-        time.sleep(2)  # Pausa entre envíos
-        return f"Mensaje enviado a {contact}"
-    except Exception as e:
-        return f"Error al enviar mensaje a {contact}: {e}"
-
-
-
-# Interfaz en Streamlit
-def enviar_encuesta():
-    st.title("Envío de encuesta por WhatsApp")
+import pandas as pd
+from database import session_scope, ejecucion_fragmento
+from services.clientes import contar_audiencia, pagina_audiencia, valores_segmento
+from services.cola_encuestas import crear_campana, cancelar_campana, resumen_campanas
+from services.dpa import get_provincias, get_cantones
+
+TAMANO_PAGINA_AUDIENCIA = 50
+
+
+# Selección de la audiencia por segmento. Solo viajan al navegador el conteo y una página de
+# clientes; las exclusiones manuales se guardan como un conjunto de ids en la sesión.
+def seleccionar_audiencia(permisionario):
+    if st.session_state.get("audiencia_permisionario") != permisionario:
+        with session_scope() as db:
+            st.session_state["audiencia_valores"] = valores_segmento(db, permisionario)
+        st.session_state["audiencia_permisionario"] = permisionario
+        st.session_state["audiencia_excluidos"] = set()
+        st.session_state["audiencia_generacion"] = 0
+    valores = st.session_state["audiencia_valores"]
+    excluidos = st.session_state["audiencia_excluidos"]
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        estados = st.multiselect("Estado", ["ACTIVO", "INACTIVO"], default=["ACTIVO"])
+        planes = st.multiselect("Plan contratado", valores["planes"])
+    with col2:
+        provincias = st.multiselect("Provincia", get_provincias())
+        servicios = st.multiselect("Servicio contratado", valores["servicios"])
+    with col3:
+        ciudades = st.multiselect("Ciudad", [canton for provincia in provincias for canton in get_cantones(provincia)])
+    segmento = {
+        "estados": estados, "provincias": provincias, "ciudades": ciudades,
+        "planes": planes, "servicios": servicios,
+    }
+
+    # Pila de cursores de la tabla; se reinicia al cambiar el segmento
+    clave_segmento = repr(sorted(segmento.items()))
+    paginacion = st.session_state.get("paginacion_audiencia")
+    if not paginacion or paginacion["segmento"] != clave_segmento:
+        paginacion = {"segmento": clave_segmento, "cursores": [None]}
+        st.session_state["paginacion_audiencia"] = paginacion
+
+    with session_scope() as db:
+        filas, siguiente = pagina_audiencia(db, permisionario, segmento, TAMANO_PAGINA_AUDIENCIA, paginacion["cursores"][-1])
+
+    # Exclusiones manuales de la página visible. La generación forma parte de la clave del editor:
+    # al quitar las exclusiones cambia y el editor descarta las ediciones que tenía guardadas.
+    pagina = pd.DataFrame(filas, columns=["id", "cliente", "ciudad", "plan_contratado", "telefono_e164"])
+    pagina.insert(0, "incluir", ~pagina["id"].isin(excluidos))
+    editada = st.data_editor(
+        pagina,
+        key=f"audiencia_editor_{st.session_state['audiencia_generacion']}_{len(paginacion['cursores'])}_{clave_segmento}",
+        hide_index=True,
+        disabled=["id", "cliente", "ciudad", "plan_contratado", "telefono_e164"],
+        column_config={"incluir": st.column_config.CheckboxColumn("Incluir")},
+    )
+    excluidos.difference_update(editada.loc[editada["incluir"], "id"].tolist())
+    excluidos.update(editada.loc[~editada["incluir"], "id"].tolist())
 
-    # Obtener y mostrar los contactos formateados
-    contacts = get_and_format_contacts()
-    st.write("Contactos formateados:")
+    numero_pagina = len(paginacion["cursores"])
+    col1, col2, col3, col4 = st.columns([1, 1, 2, 2])
+    with col1:
+        if st.button("⬅️ Anterior", disabled=numero_pagina == 1, key="audiencia_anterior"):
+            paginacion["cursores"].pop()
+            st.rerun()
+    with col2:
+        if st.button("Siguiente ➡️", disabled=siguiente is None, key="audiencia_siguiente"):
+            paginacion["cursores"].append(siguiente)
+            st.rerun()
+    with col3:
+        st.caption(f"Página {numero_pagina}")
+    with col4:
+        if excluidos and st.button(f"Quitar exclusiones ({len(excluidos)})"):
+            excluidos.clear()
+            st.session_state["audiencia_generacion"] += 1
+            st.rerun()
 
-    selected_contacts = []
-    
-    # Crear checkboxes para cada contacto con un key único
-    for i, contact in enumerate(contacts):
-        if st.checkbox(f"Enviar a {contact}", key=f"checkbox_{i}"):  # Usar un key único
-            selected_contacts.append(contact)
+    # Conteo en el servidor (clientes y teléfonos distintos que recibirán el mensaje)
+    with session_scope() as db:
+        conteo = contar_audiencia(db, permisionario, segmento, excluidos)
+    st.metric("Mensajes a enviar", conteo["telefonos"], help=f"{conteo['clientes']} clientes en el segmento, sin los excluidos")
+    return segmento, excluidos, conteo
+
+
+# Interfaz en Streamlit: la página solo encola la campaña; el envío lo hace el trabajador
+# de encuestas (python -m scripts.trabajador_encuestas) respetando el límite de mensajes por minuto.
+def enviar_encuesta(permisionario):
+    st.title("Envío de encuesta por WhatsApp")
+
+    segmento, excluidos, conteo = seleccionar_audiencia(permisionario)
 
     # Campo para el enlace de Google Forms
     google_form_link = "https://docs.google.com/forms/d/1Bj0ALE6lgDo0jK9GGgfvcuvNz9Egw9CB6k62Tgx6NnQ/prefill"
@@ -54,16 +96,35 @@ def enviar_encuesta():
     if google_form_link:
         message = f"¡Hola! Te invitamos a llenar nuestra encuesta en el siguiente enlace: {google_form_link}"
 
-        # Botón para enviar los mensajes con un icono de WhatsApp
-        if st.button("Enviar mensajes 📲"):
-            results = []
-            for contact in selected_contacts:
-                result = send_message(contact, message)
-                results.append(result)
-            
-            # Mostrar resultados
-            st.write("Resultados del envío:")
-            for res in results:
-                st.write(res)
+        # Botón para encolar los mensajes con un icono de WhatsApp
+        if st.button("Enviar mensajes 📲", disabled=conteo["telefonos"] == 0):
+            with session_scope() as db:
+                campana_id, encolados = crear_campana(db, permisionario, message, segmento, excluidos)
+            st.success(f"Campaña {campana_id} en cola: {encolados} mensajes. El envío continúa aunque se cierre la página.")
     else:
         st.warning("Por favor, proporciona el enlace de Google Forms.")
+
+    progreso_campanas(permisionario)
+
+
+# Progreso de las campañas; se actualiza solo cada pocos segundos sin recargar la página
+@st.fragment(run_every=5)
+@ejecucion_fragmento("enviar_encuesta")
+def progreso_campanas(permisionario):
+    with session_scope() as db:
+        campanas = resumen_campanas(db, permisionario)
+
+    if not campanas:
+        return
+    st.subheader("Resultados del envío")
+    for campana in campanas:
+        terminados = campana.enviado + campana.error
+        st.write(f"**Campaña {campana.id}** ({campana.creada_en:%d/%m/%Y %H:%M}, {campana.estado})")
+        st.progress(
+            terminados / campana.total if campana.total else 1.0,
+            text=f"{campana.enviado} enviados, {campana.error} con error, {campana.pendiente + campana.enviando} en cola"
+        )
+        if campana.estado == "activa" and campana.pendiente and st.button("Cancelar", key=f"cancelar_campana_{campana.id}"):
+            with session_scope() as db:
+                cancelar_campana(db, campana.id)
+            st.rerun(scope="fragment")
@@ -1,19 +1,25 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from io import BytesIO
-from database import get_db
-from models import TiemPro
 from datetime import datetime
+from database import session_scope
+from services.cache_incidencias import consultar
+from services.consultas_incidencias import obtener_anios_disponibles
+from services.exportacion import exportar_reportes
+from services.cache_reportes import obtener_libro
+from services.reportes import REPORTES, titulos
+from services.reportes_mensuales import obtener_filas, filas_exportacion, meses_transcurridos
+from services.perfilado import seccion
+
 
 def reporteria(permisionario):
     st.header("Reportería - Reclamos y Averías")
     
-    # Obtener datos de incidencias de TiemPro
-    db = next(get_db())
-    incidencias = db.query(TiemPro).filter(TiemPro.permisionario == permisionario).all()
+    # Obtener los años disponibles sin cargar las incidencias
+    with seccion("reporteria.carga_datos"):
+        años = consultar(permisionario, "anios_reporteria", obtener_anios_disponibles, permisionario)
     
-    if not incidencias:
+    if not años:
         st.warning("No hay incidencias registradas para mostrar.")
         return
     
@@ -26,113 +32,78 @@ def reporteria(permisionario):
     # Crear un diccionario de mapeo de mes en español a su número
     meses_numeros = {mes: idx + 1 for idx, mes in enumerate(meses_espanol)}
     
-    # Obtener los años disponibles en las incidencias
-    años = {inc.fecha_hora_registro.year for inc in incidencias if inc.fecha_hora_registro}
-    
     # Selectores de mes y año
     mes_seleccionado = st.selectbox("Seleccione el mes", meses_espanol)
-    año_seleccionado = st.selectbox("Seleccione el año", sorted(años, reverse=True))
-    
-    # Filtrar incidencias por mes y año
-    incidencias_filtradas = [
-        inc for inc in incidencias 
-        if inc.fecha_hora_registro and 
-           inc.fecha_hora_registro.month == meses_numeros[mes_seleccionado] and 
-           inc.fecha_hora_registro.year == año_seleccionado
-    ]
-    
-    if not incidencias_filtradas:
-        st.warning("No hay incidencias para el mes y año seleccionados.")
-        return
-    
-    # Definir tipos de reclamos y averías
-    reclamos_generales = [
-        "ACTIVACIÓN DEL SERVICIO EN TÉRMINOS DISTINTOS A LO FIJADO EN EL CONTRATO DE PRESTACIÓN DEL SERVICIO",
-        "REACTIVACIÓN DEL SERVICIO EN PLAZOS DISTINTOS A LOS FIJADOS EN EL CONTRATO DE PRESTACIÓN DEL SERVICIO",
-        "INCUMPLIMIENTO DE LAS CLÁUSULAS CONTRACTUALES PACTADAS",
-        "SUSPENSIÓN DEL SERVICIO SIN FUNDAMENTO LEGAL O CONTRACTUAL",
-        "NO TRAMITACIÓN DE SOLICITUD DE TERMINACIÓN DEL SERVICIO"
-    ]
-
-    averias = [
-        "INDISPONIBILIDAD DEL SERVICIO",
-        "INTERRUPCIÓN DEL SERVICIO",
-        "DESCONEXIÓN O SUSPENSIÓN ERRÓNEA DEL SERVICIO",
-        "DEGRADACIÓN DEL SERVICIO",
-        "LIMITACIONES Y RESTRICCIONES DE USO DE APLICACIONES O DEL SERVICIO EN GENERAL SIN CONSENTIMIENTO DEL CLIENTE"
-    ]
+    año_seleccionado = st.selectbox("Seleccione el año", años)
     
     # Selector de tipo de reporte
     tipo_reporte = st.selectbox("Seleccione el tipo de reporte", ["Reclamos Generales", "Reparación de Averías"])
     
-    # Filtrar incidencias según el tipo de reporte
-    if tipo_reporte == "Reclamos Generales":
-        df_filtrado = pd.DataFrame([{
-            "ITEM": inc.item,
-            "PROVINCIA": inc.provincia,
-            "MES": inc.mes,
-            "FECHA Y HORA DEL REGISTRO DEL RECLAMO (dd/mm/aaaa hh:mm)": inc.fecha_hora_registro.strftime("%d/%m/%Y %H:%M") if inc.fecha_hora_registro else None,
-            "NOMBRE DE LA PERSONA QUE REALIZA EL RECLAMO": inc.nombre_reclamante,
-            "NÚMERO TELEFÓNICO DE CONTACTO DEL USUARIO": inc.telefono_contacto,
-            "TIPO DE CONEXIÓN (CONMUTADA O NO CONMUTADA)": inc.tipo_conexion,
-            "CANAL DE RECLAMO (PERSONALIZADO, TELEFÓNICO, CORREO ELECTRÓNICO, OFICIO, PÁGINA WEB)": inc.canal_reclamo,
-            "TIPO DE RECLAMO": inc.tipo_reclamo,
-            "FECHA Y HORA DE SOLUCIÓN DEL RECLAMO (dd/mm/aaaa hh:mm)": inc.fecha_hora_solucion.strftime("%d/%m/%Y %H:%M") if inc.fecha_hora_solucion else None,
-            "TIEMPO DE RESOLUCIÓN DEL RECLAMO (calculo en HORAS) ( Campo No obligatorio)": (
-                round((inc.fecha_hora_solucion - inc.fecha_hora_registro).total_seconds() / 3600, 2) if inc.fecha_hora_solucion and inc.fecha_hora_registro else None
-            ),
-            "DESCRIPCIÓN DE LA SOLUCIÓN": inc.descripcion_solucion
-        } for inc in incidencias_filtradas if inc.tipo_reclamo in reclamos_generales])
-        nombre_hoja = "ProcenRecGen"
-        
-    elif tipo_reporte == "Reparación de Averías":
-        df_filtrado = pd.DataFrame([{
-            "ITEM": inc.item,
-            "PROVINCIA": inc.provincia,
-            "NOMBRE DE LA PERSONA QUE REALIZA EL REQUERIMIENTO": inc.nombre_reclamante,
-            "NÚMERO TELEFÓNICO DE CONTACTO DEL USUARIO": inc.telefono_contacto,
-            "TIPO DE CONEXIÓN (CONMUTADA O NO CONMUTADA)": inc.tipo_conexion,
-            "CANAL DE REQUERIMIENTO (PERSONALIZADO, TELEFÓNICO, OFICIO, CORREO ELECTRÓNICO, PÁGINA WEB)": inc.canal_reclamo,
-            "TIPO DE AVERÍA": inc.tipo_reclamo,
-            "FECHA Y HORA DE REPORTE DE LA AVERÍA (dd/mm/aaaa hh:mm)": inc.fecha_hora_registro.strftime("%d/%m/%Y %H:%M") if inc.fecha_hora_registro else None,
-            "FECHA Y HORA DE REPARACIÓN DE LA AVERÍA (dd/mm/aaaa hh:mm)": inc.fecha_hora_solucion.strftime("%d/%m/%Y %H:%M") if inc.fecha_hora_solucion else None,
-            "TIEMPO DE REPARACIÓN DE LA AVERÍA (calculo en HORAS) ( Campo No obligatorio)": (
-                round((inc.fecha_hora_solucion - inc.fecha_hora_registro).total_seconds() / 3600, 2) if inc.fecha_hora_solucion and inc.fecha_hora_registro else None
-            ),
-            "DESCRIPCIÓN DE LA SOLUCIÓN": inc.descripcion_solucion
-        } for inc in incidencias_filtradas if inc.tipo_reclamo in averias])
-        nombre_hoja = "TiemPromRep"
+    # Filas del reporte ya formateadas: los meses cerrados se leen de la tabla materializada.
+    # No pasan por la caché en memoria; si un mes cerrado se regeneró, se confirma aquí.
+    with seccion("reporteria.carga_datos"), session_scope() as db:
+        filas_reporte = obtener_filas(db, permisionario, año_seleccionado, meses_numeros[mes_seleccionado], tipo_reporte)
+        db.commit()
     
-    # Mostrar DataFrame
-    st.dataframe(df_filtrado)
+    if not filas_reporte:
+        st.warning("No hay incidencias para el mes y año seleccionados.")
+        return
     
-    # Función para generar Excel con la hoja adecuada
-    def generar_excel(df, nombre_hoja):
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name=nombre_hoja, index=False)
-        output.seek(0)
-        return output
+    # Construir el reporte con las columnas del regulador
+    with seccion("reporteria.construccion_frame"):
+        df_filtrado = pd.DataFrame(filas_reporte, columns=titulos(tipo_reporte))
     
-    # Botón de descarga de Excel
-    if not df_filtrado.empty:
-        excel_file = generar_excel(df_filtrado, nombre_hoja)
-        st.download_button(
-            label=f"📥 Descargar Reporte de {tipo_reporte} en Excel",
-            data=excel_file,
-            file_name=f'Reporte_{tipo_reporte.replace(" ", "_")}_{permisionario}_{mes_seleccionado}_{año_seleccionado}.xlsx',
-            mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+    # Mostrar DataFrame
+    with seccion("reporteria.render"):
+        st.dataframe(df_filtrado)
+    
+    # Contenido del libro de Excel
+    contenido = st.radio(
+        "Contenido del archivo Excel",
+        ["Reporte seleccionado", "Ambos reportes del mes", "Año completo (una hoja por mes)"],
+        horizontal=True
+    )
+    if contenido == "Reporte seleccionado":
+        periodos, reportes = [(año_seleccionado, meses_numeros[mes_seleccionado])], [tipo_reporte]
+        sufijo = f'{tipo_reporte.replace(" ", "_")}_{permisionario}_{mes_seleccionado}_{año_seleccionado}'
+    elif contenido == "Ambos reportes del mes":
+        periodos, reportes = [(año_seleccionado, meses_numeros[mes_seleccionado])], list(REPORTES)
+        sufijo = f'Reclamos_y_Averias_{permisionario}_{mes_seleccionado}_{año_seleccionado}'
+    else:
+        # Del año en curso solo los meses que ya empezaron
+        periodos, reportes = [(año_seleccionado, mes) for mes in meses_transcurridos(año_seleccionado)], [tipo_reporte]
+        sufijo = f'{tipo_reporte.replace(" ", "_")}_{permisionario}_{año_seleccionado}'
+    
+    # Generar el libro solo cuando se solicita: los meses materializados al día se leen de la tabla
+    # y los demás se leen y escriben por lotes
+    def generar_excel():
+        with seccion("reporteria.generacion_excel"), session_scope() as db:
+            return exportar_reportes(db, permisionario, periodos, reportes, origen=filas_exportacion).read()
+    
+    # Botón de descarga de Excel; un libro ya generado para estos datos se reutiliza
+    if not df_filtrado.empty and periodos:
+        excel_file = obtener_libro(permisionario, periodos, reportes)
+        if excel_file is None and st.button("📄 Generar archivo Excel"):
+            excel_file = obtener_libro(permisionario, periodos, reportes, generar_excel)
+        if excel_file is not None:
+            st.download_button(
+                label=f"📥 Descargar Reporte de {tipo_reporte} en Excel",
+                data=excel_file,
+                file_name=f'Reporte_{sufijo}.xlsx',
+                mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            )
     
     # Gráficos y análisis
     st.subheader(f"Análisis de {tipo_reporte}")
     
-    fig_provincia = px.bar(
-        df_filtrado.groupby("PROVINCIA").size().reset_index(name='Cantidad'),
-        x="PROVINCIA",
-        y="Cantidad",
-        title=f"{tipo_reporte} por Provincia"
-    )
-    st.plotly_chart(fig_provincia)
-
-    db.close()
+    with seccion("reporteria.construccion_frame"):
+        por_provincia = df_filtrado.groupby("PROVINCIA").size().reset_index(name='Cantidad')
+    with seccion("reporteria.construccion_grafico"):
+        fig_provincia = px.bar(
+            por_provincia,
+            x="PROVINCIA",
+            y="Cantidad",
+            title=f"{tipo_reporte} por Provincia"
+        )
+    with seccion("reporteria.render"):
+        st.plotly_chart(fig_provincia)
@@ -0,0 +1,134 @@
+import pandas as pd
+from sqlalchemy import String
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+from models import TiemPro
+from services.incidencias import OPCIONES_INCIDENCIAS
+
+# Formato de fecha exigido en los reportes del regulador
+FORMATO_FECHA = "%d/%m/%Y %H:%M"
+
+# Motores en los que las fechas se formatean en la propia consulta
+MOTORES_SQL = ("postgresql", "sqlite")
+
+
+# Fecha con FORMATO_FECHA calculada por la base de datos
+class fecha_regulador(FunctionElement):
+    type = String()
+    name = "fecha_regulador"
+    inherit_cache = True
+
+
+@compiles(fecha_regulador, "postgresql")
+def _fecha_postgresql(elemento, compilador, **kw):
+    return f"to_char({compilador.process(elemento.clauses, **kw)}, 'DD/MM/YYYY HH24:MI')"
+
+
+@compiles(fecha_regulador, "sqlite")
+def _fecha_sqlite(elemento, compilador, **kw):
+    return f"strftime('%d/%m/%Y %H:%M', {compilador.process(elemento.clauses, **kw)})"
+
+
+# Funciones por lote: reciben las columnas del lote (tuplas de valores) y devuelven la columna formateada
+def _fechas(valores):
+    return [valor.strftime(FORMATO_FECHA) if valor else None for valor in valores]
+
+
+def _horas_resolucion(registro, solucion):
+    diferencia = pd.to_datetime(pd.Series(solucion)) - pd.to_datetime(pd.Series(registro))
+    horas = (diferencia.dt.total_seconds() / 3600).round(2)
+    return [None if valor != valor else valor for valor in horas.tolist()]
+
+
+# Formatos de columna. "sql" construye la expresión del SELECT a partir del campo (si el motor la
+# admite); "lote" es la función por lote sobre `campos` (por defecto, el campo de la columna).
+# Sin ninguno de los dos, el valor del campo pasa tal cual.
+FORMATOS = {
+    "texto": {},
+    "fecha": {"sql": fecha_regulador, "lote": _fechas},
+    "horas_resolucion": {"lote": _horas_resolucion, "campos": ["fecha_hora_registro", "fecha_hora_solucion"]},
+}
+
+# Columnas de cada reporte: (título del regulador, campo de TiemPro, formato)
+COLUMNAS_RECLAMOS_GENERALES = [
+    ("ITEM", "item", "texto"),
+    ("PROVINCIA", "provincia", "texto"),
+    ("MES", "mes", "texto"),
+    ("FECHA Y HORA DEL REGISTRO DEL RECLAMO (dd/mm/aaaa hh:mm)", "fecha_hora_registro", "fecha"),
+    ("NOMBRE DE LA PERSONA QUE REALIZA EL RECLAMO", "nombre_reclamante", "texto"),
+    ("NÚMERO TELEFÓNICO DE CONTACTO DEL USUARIO", "telefono_contacto", "texto"),
+    ("TIPO DE CONEXIÓN (CONMUTADA O NO CONMUTADA)", "tipo_conexion", "texto"),
+    ("CANAL DE RECLAMO (PERSONALIZADO, TELEFÓNICO, CORREO ELECTRÓNICO, OFICIO, PÁGINA WEB)", "canal_reclamo", "texto"),
+    ("TIPO DE RECLAMO", "tipo_reclamo", "texto"),
+    ("FECHA Y HORA DE SOLUCIÓN DEL RECLAMO (dd/mm/aaaa hh:mm)", "fecha_hora_solucion", "fecha"),
+    ("TIEMPO DE RESOLUCIÓN DEL RECLAMO (calculo en HORAS) ( Campo No obligatorio)", "tiempo_resolucion_horas", "horas_resolucion"),
+    ("DESCRIPCIÓN DE LA SOLUCIÓN", "descripcion_solucion", "texto"),
+]
+
+COLUMNAS_AVERIAS = [
+    ("ITEM", "item", "texto"),
+    ("PROVINCIA", "provincia", "texto"),
+    ("NOMBRE DE LA PERSONA QUE REALIZA EL REQUERIMIENTO", "nombre_reclamante", "texto"),
+    ("NÚMERO TELEFÓNICO DE CONTACTO DEL USUARIO", "telefono_contacto", "texto"),
+    ("TIPO DE CONEXIÓN (CONMUTADA O NO CONMUTADA)", "tipo_conexion", "texto"),
+    ("CANAL DE REQUERIMIENTO (PERSONALIZADO, TELEFÓNICO, OFICIO, CORREO ELECTRÓNICO, PÁGINA WEB)", "canal_reclamo", "texto"),
+    ("TIPO DE AVERÍA", "tipo_reclamo", "texto"),
+    ("FECHA Y HORA DE REPORTE DE LA AVERÍA (dd/mm/aaaa hh:mm)", "fecha_hora_registro", "fecha"),
+    ("FECHA Y HORA DE REPARACIÓN DE LA AVERÍA (dd/mm/aaaa hh:mm)", "fecha_hora_solucion", "fecha"),
+    ("TIEMPO DE REPARACIÓN DE LA AVERÍA (calculo en HORAS) ( Campo No obligatorio)", "tiempo_resolucion_horas", "horas_resolucion"),
+    ("DESCRIPCIÓN DE LA SOLUCIÓN", "descripcion_solucion", "texto"),
+]
+
+
+# Plantilla de un reporte: hoja del libro, categoría de OPCIONES_INCIDENCIAS y columnas
+def plantilla(hoja, categoria, columnas):
+    for _, _, formato in columnas:
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato de columna desconocido: {formato}")
+    return {"hoja": hoja, "tipos_reclamo": OPCIONES_INCIDENCIAS[categoria], "columnas": columnas}
+
+
+# Reportes del regulador por tipo de reporte; un formato nuevo es solo otra plantilla
+REPORTES = {
+    "Reclamos Generales": plantilla("ProcenRecGen", "Reclamos Generales", COLUMNAS_RECLAMOS_GENERALES),
+    "Reparación de Averías": plantilla("TiemPromRep", "Reparación de Averías", COLUMNAS_AVERIAS),
+}
+
+
+def titulos(reporte):
+    return [titulo for titulo, _, _ in REPORTES[reporte]["columnas"]]
+
+
+# Plan de lectura de un reporte para un motor: las expresiones del SELECT y, por columna, el índice
+# de la expresión que ya trae el valor o (función, índices de sus campos) si se calcula por lote
+def plan_reporte(reporte, dialecto):
+    expresiones = {}
+
+    def posicion(clave, expresion):
+        expresiones.setdefault(clave, expresion)
+        return list(expresiones).index(clave)
+
+    columnas = []
+    for _, campo, formato in REPORTES[reporte]["columnas"]:
+        definicion = FORMATOS[formato]
+        if "sql" in definicion and dialecto in MOTORES_SQL:
+            columnas.append(posicion((formato, campo), definicion["sql"](getattr(TiemPro, campo))))
+        elif "lote" in definicion:
+            indices = [posicion(nombre, getattr(TiemPro, nombre)) for nombre in definicion.get("campos", [campo])]
+            columnas.append((definicion["lote"], indices))
+        else:
+            columnas.append(posicion(campo, getattr(TiemPro, campo)))
+    return list(expresiones.values()), columnas
+
+
+# Filas del reporte (listas en el orden de las columnas) a partir de un lote de filas del SELECT
+# del plan; cada columna calculada se procesa de una vez para todo el lote
+def formatear_lote(columnas, lote):
+    if not lote:
+        return []
+    datos = list(zip(*lote))
+    valores = [
+        datos[columna] if isinstance(columna, int) else columna[0](*[datos[indice] for indice in columna[1]])
+        for columna in columnas
+    ]
+    return [list(fila) for fila in zip(*valores)]
@@ -0,0 +1,116 @@
+from datetime import datetime
+import pytz
+from sqlalchemy import select, extract
+from sqlalchemy.dialects import postgresql, sqlite
+from models import Contador, ReporteMensual, TiemPro
+from services.numeracion import serie_mes
+from services.exportacion import filas_reporte
+from services.reportes import REPORTES
+
+ZONA_HORARIA = pytz.timezone("America/Guayaquil")
+
+
+# Un mes está cerrado cuando ya terminó en la zona horaria de operación
+def mes_cerrado(anio, mes, hoy=None):
+    hoy = hoy or datetime.now(ZONA_HORARIA)
+    return (anio, mes) < (hoy.year, hoy.month)
+
+
+# Meses del año que ya empezaron en la zona horaria de operación (todos si el año ya terminó)
+def meses_transcurridos(anio, hoy=None):
+    hoy = hoy or datetime.now(ZONA_HORARIA)
+    ultimo = 12 if anio < hoy.year else hoy.month if anio == hoy.year else 0
+    return list(range(1, ultimo + 1))
+
+
+def version_mes(db, permisionario, anio, mes):
+    return db.execute(
+        select(Contador.ultimo_valor).where(
+            Contador.permisionario == permisionario, Contador.serie == serie_mes(anio, mes)
+        )
+    ).scalar() or 0
+
+
+def _guardar(db, valores):
+    dialecto = db.bind.dialect.name
+    if dialecto in ("postgresql", "sqlite"):
+        insert = postgresql.insert if dialecto == "postgresql" else sqlite.insert
+        sentencia = insert(ReporteMensual).values(**valores)
+        db.execute(sentencia.on_conflict_do_update(
+            index_elements=[ReporteMensual.permisionario, ReporteMensual.anio, ReporteMensual.mes, ReporteMensual.reporte],
+            set_={campo: sentencia.excluded[campo] for campo in ("filas", "version", "generado_en")},
+        ))
+    else:
+        db.merge(ReporteMensual(**valores))
+
+
+# Regenera las filas materializadas de un reporte mensual en la transacción del llamador, que
+# decide cuándo confirmar (la página o scripts/materializar_reportes.py).
+# La versión se lee antes de consultar las incidencias: si una edición entra mientras se
+# genera, el contador queda por delante de la versión guardada y el mes se regenera otra vez.
+def refrescar_reporte(db, permisionario, anio, mes, reporte):
+    version = version_mes(db, permisionario, anio, mes)
+    filas = list(filas_reporte(db, permisionario, anio, mes, reporte))
+    _guardar(db, {
+        "permisionario": permisionario,
+        "anio": anio,
+        "mes": mes,
+        "reporte": reporte,
+        "filas": filas,
+        "version": version,
+        "generado_en": datetime.now(),
+    })
+    db.flush()
+    return filas
+
+
+# Filas materializadas de un mes cerrado si siguen al día; None si el mes está en curso,
+# no se materializó o cambió desde entonces
+def filas_guardadas(db, permisionario, anio, mes, reporte):
+    if not mes_cerrado(anio, mes):
+        return None
+    guardado = db.get(ReporteMensual, (permisionario, anio, mes, reporte))
+    if guardado is not None and guardado.version == version_mes(db, permisionario, anio, mes):
+        return guardado.filas
+    return None
+
+
+# Filas formateadas de un reporte mensual. Los meses cerrados se leen de la tabla
+# materializada (y se regeneran solo si cambiaron); el mes en curso se calcula en vivo.
+def obtener_filas(db, permisionario, anio, mes, reporte):
+    filas = filas_guardadas(db, permisionario, anio, mes, reporte)
+    if filas is not None:
+        return filas
+    if not mes_cerrado(anio, mes):
+        return list(filas_reporte(db, permisionario, anio, mes, reporte))
+    return refrescar_reporte(db, permisionario, anio, mes, reporte)
+
+
+# Origen de las hojas del libro de Excel: las filas materializadas al día o, para el mes en curso
+# y los meses que cambiaron, la lectura por lotes (la memoria no crece con el tamaño del mes)
+def filas_exportacion(db, permisionario, anio, mes, reporte):
+    filas = filas_guardadas(db, permisionario, anio, mes, reporte)
+    if filas is not None:
+        return filas
+    return filas_reporte(db, permisionario, anio, mes, reporte)
+
+
+# Materializa todos los meses cerrados con incidencias; solo regenera los que cambiaron.
+# Devuelve la cantidad de reportes mensuales revisados.
+def materializar_meses_cerrados(db, permisionario=None):
+    anio = extract("year", TiemPro.fecha_hora_registro)
+    mes = extract("month", TiemPro.fecha_hora_registro)
+    consulta = select(TiemPro.permisionario, anio, mes).where(
+        TiemPro.fecha_hora_registro.is_not(None)
+    ).distinct()
+    if permisionario is not None:
+        consulta = consulta.where(TiemPro.permisionario == permisionario)
+
+    revisados = 0
+    for permisionario_mes, anio_mes, numero_mes in db.execute(consulta).all():
+        if not mes_cerrado(int(anio_mes), int(numero_mes)):
+            continue
+        for reporte in REPORTES:
+            obtener_filas(db, permisionario_mes, int(anio_mes), int(numero_mes), reporte)
+            revisados += 1
+    return revisados
@@ -0,0 +1,54 @@
+import re
+from sqlalchemy import select, update, bindparam
+from models import Client
+
+# Números de Ecuador: 0XXXXXXXXX (formato local) o 593XXXXXXXXX / +593XXXXXXXXX
+_SEPARADORES = r"[\s\-().]"
+_LOCAL = r"0(\d{9})"
+_INTERNACIONAL = r"\+?593(\d{9})"
+
+
+# Teléfono en formato E.164 (+593XXXXXXXXX) o None si no es un número válido
+def normalizar_telefono(numero):
+    if not numero:
+        return None
+    numero = re.sub(_SEPARADORES, "", str(numero))
+    coincidencia = re.fullmatch(_LOCAL, numero) or re.fullmatch(_INTERNACIONAL, numero)
+    return "+593" + coincidencia.group(1) if coincidencia else None
+
+
+# Versión vectorizada de normalizar_telefono para una Series de pandas (importaciones)
+def normalizar_telefonos(serie):
+    numeros = serie.fillna("").astype(str).str.replace(_SEPARADORES, "", regex=True)
+    validos = numeros.str.fullmatch(_LOCAL) | numeros.str.fullmatch(_INTERNACIONAL)
+    # Ambos formatos terminan en los 9 dígitos del número nacional
+    return ("+593" + numeros.str[-9:]).where(validos, None)
+
+
+# Completa telefono_e164 de los clientes que aún no lo tienen, por lotes de id (keyset).
+# Se puede volver a ejecutar: solo toca filas con teléfono y sin número normalizado.
+def backfill_telefonos(conexion, tamano_lote=5000):
+    actualizar = (
+        update(Client.__table__)
+        .where(Client.__table__.c.id == bindparam("_id"))
+        .values(telefono_e164=bindparam("_e164"))
+    )
+    ultimo_id, actualizados = 0, 0
+    while True:
+        filas = conexion.execute(
+            select(Client.id, Client.telefono)
+            .where(Client.id > ultimo_id, Client.telefono.is_not(None), Client.telefono_e164.is_(None))
+            .order_by(Client.id)
+            .limit(tamano_lote)
+        ).all()
+        if not filas:
+            return actualizados
+        ultimo_id = filas[-1].id
+        valores = [
+            {"_id": fila.id, "_e164": e164}
+            for fila in filas
+            if (e164 := normalizar_telefono(fila.telefono)) is not None
+        ]
+        if valores:
+            conexion.execute(actualizar, valores)
+            actualizados += len(valores)
@@ -0,0 +1,21 @@
+import os
+import tempfile
+import pytest
+
+# Las pruebas usan una base SQLite temporal: DATABASE_URL se fija antes de importar database para no
+# tocar nunca la base configurada en el entorno o en secrets.toml. PRUEBAS_DATABASE_URL apunta a una
+# base PostgreSQL desechable (se borran todas sus tablas) para las pruebas que necesitan bloqueos de fila.
+os.environ["DATABASE_URL"] = os.environ.get("PRUEBAS_DATABASE_URL") or f"sqlite:///{tempfile.mkdtemp()}/pruebas.db"
+
+import database  # noqa: E402
+import models  # noqa: E402
+
+
+# Sesión sobre una base vacía con todas las tablas
+@pytest.fixture
+def db():
+    motor = database.obtener_motor()
+    models.Base.metadata.drop_all(motor)
+    models.Base.metadata.create_all(motor)
+    with database.session_scope() as sesion:
+        yield sesion
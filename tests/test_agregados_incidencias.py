@@ -0,0 +1,162 @@
+import threading
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+from sqlalchemy import select
+from database import obtener_motor, session_scope
+from models import AgregadoIncidencias, TiemPro
+from services.agregados_incidencias import (
+    acumular_dataframe, actualizar_incidencia, estado_agregado, reconstruir_agregados, sumar_incidencia,
+)
+from services import incidencias
+
+TIPOS = ["INTERRUPCIÓN DEL SERVICIO", "DEGRADACIÓN DEL SERVICIO", None]
+ESTADOS = ["Pendiente", "Finalizado"]
+
+
+def incidencia(numero, permisionario="per 1"):
+    registro = datetime(2024, 1 + numero % 3, 1 + numero % 27, 8, 30) if numero % 11 else None
+    horas = None if numero % 4 == 0 else round(numero * 0.75 % 19, 2)
+    return TiemPro(
+        item=str(numero), permisionario=permisionario, provincia="PICHINCHA" if numero % 5 else None,
+        mes="Enero", fecha_hora_registro=registro, tipo_reclamo=TIPOS[numero % 3],
+        estado_incidencia=ESTADOS[numero % 2], tiempo_resolucion_horas=horas,
+        fecha_hora_solucion=registro + timedelta(hours=horas) if registro and horas is not None else None,
+    )
+
+
+# Contenido del agregado con los números normalizados a float
+def agregado(db):
+    db.expire_all()
+    filas = db.execute(select(AgregadoIncidencias)).scalars().all()
+    return sorted(
+        (
+            fila.permisionario, fila.anio, fila.mes, fila.tipo_reclamo, fila.estado_incidencia, fila.provincia,
+            fila.cantidad, fila.cantidad_horas, round(float(fila.suma_horas), 4),
+            None if fila.min_horas is None else float(fila.min_horas),
+            None if fila.max_horas is None else float(fila.max_horas),
+        )
+        for fila in filas
+    )
+
+
+def reconstruido(db):
+    with obtener_motor().begin() as conexion:
+        reconstruir_agregados(conexion)
+    return agregado(db)
+
+
+def test_registro_incremental_igual_a_reconstruccion(db):
+    for numero in range(1, 60):
+        registro = incidencia(numero, "per 1" if numero % 7 else "per 2")
+        db.add(registro)
+        sumar_incidencia(db, registro)
+    db.commit()
+    incremental = agregado(db)
+    assert incremental
+    assert incremental == reconstruido(db)
+
+
+def test_ediciones_mueven_la_incidencia_de_grupo(db):
+    registros = [incidencia(numero) for numero in range(1, 40)]
+    for registro in registros:
+        db.add(registro)
+        sumar_incidencia(db, registro)
+    db.commit()
+
+    # Cambios de estado, de horas (incluido quitar el mínimo y el máximo de un grupo), de tipo y de mes
+    horas = [float(r.tiempo_resolucion_horas) for r in registros if r.tiempo_resolucion_horas is not None]
+    for registro in registros:
+        anterior = estado_agregado(registro)
+        actual = float(registro.tiempo_resolucion_horas) if registro.tiempo_resolucion_horas is not None else None
+        if actual in (min(horas), max(horas)):
+            registro.tiempo_resolucion_horas = 5
+        elif int(registro.item) % 3 == 0:
+            registro.estado_incidencia = "Finalizado"
+            registro.tiempo_resolucion_horas = 2.5
+        elif int(registro.item) % 5 == 0:
+            registro.tipo_reclamo = "OTRO"
+        elif int(registro.item) % 8 == 0 and registro.fecha_hora_registro:
+            registro.fecha_hora_registro += timedelta(days=40)
+        actualizar_incidencia(db, anterior, registro)
+    db.commit()
+
+    assert agregado(db) == reconstruido(db)
+
+
+def test_grupo_vacio_se_elimina(db):
+    registro = incidencia(1)
+    db.add(registro)
+    sumar_incidencia(db, registro)
+    db.commit()
+    anterior = estado_agregado(registro)
+    registro.provincia = "GUAYAS"
+    actualizar_incidencia(db, anterior, registro)
+    db.commit()
+    assert [fila[5] for fila in agregado(db)] == ["GUAYAS"]
+
+
+def test_importacion_igual_a_reconstruccion(db):
+    registros = [incidencia(numero) for numero in range(1, 80)]
+    columnas = ["permisionario", "fecha_hora_registro", "tipo_reclamo", "estado_incidencia", "provincia", "tiempo_resolucion_horas"]
+    datos = pd.DataFrame([{columna: getattr(registro, columna) for columna in columnas} for registro in registros])
+    db.add_all(registros)
+    acumular_dataframe(db, datos)
+    db.commit()
+    assert agregado(db) == reconstruido(db)
+
+
+def test_guardar_solucion_y_finalizar(db):
+    registro = incidencia(1)
+    db.add(registro)
+    sumar_incidencia(db, registro)
+    db.commit()
+
+    incidencias.guardar_solucion(db, "per 1", "1", "Se cambió el equipo")
+    assert agregado(db) == reconstruido(db)
+    incidencias.guardar_solucion(db, "per 1", "1", "Se cambió el equipo", finalizar=True)
+    assert agregado(db) == reconstruido(db)
+    assert incidencias.guardar_solucion(db, "per 1", "2", "No existe") is None
+
+
+@pytest.mark.skipif(
+    obtener_motor().dialect.name != "postgresql",
+    reason="Requiere bloqueos de fila: definir PRUEBAS_DATABASE_URL con una base PostgreSQL",
+)
+def test_finalizaciones_simultaneas_no_desvian_el_agregado(db, monkeypatch):
+    registro = incidencia(2)
+    registro.estado_incidencia, registro.fecha_hora_registro = "Pendiente", datetime(2024, 1, 2, 8, 30)
+    db.add(registro)
+    sumar_incidencia(db, registro)
+    db.commit()
+
+    # La primera sesión se detiene con la fila bloqueada, justo antes de actualizar el agregado
+    bloqueada, continuar = threading.Event(), threading.Event()
+    original = incidencias.actualizar_incidencia
+
+    def actualizar(db, anterior, registro):
+        if not bloqueada.is_set():
+            bloqueada.set()
+            continuar.wait(10)
+        original(db, anterior, registro)
+
+    monkeypatch.setattr(incidencias, "actualizar_incidencia", actualizar)
+
+    def finalizar(descripcion):
+        with session_scope() as sesion:
+            incidencias.guardar_solucion(sesion, "per 1", "2", descripcion, finalizar=True)
+
+    primera = threading.Thread(target=finalizar, args=("Primera sesión",))
+    primera.start()
+    assert bloqueada.wait(10)
+    segunda = threading.Thread(target=finalizar, args=("Segunda sesión",))
+    segunda.start()
+    # La segunda sesión espera el bloqueo de la fila en lugar de leer el estado anterior
+    segunda.join(1)
+    assert segunda.is_alive()
+    continuar.set()
+    primera.join(10)
+    segunda.join(10)
+
+    assert agregado(db) == reconstruido(db)
+    assert sum(fila[6] for fila in agregado(db)) == 1
@@ -0,0 +1,20 @@
+from services.cache_incidencias import cache_incidencias, consultar
+from services.numeracion import marcar_datos_modificados
+
+
+def test_escritura_de_otro_proceso_invalida_la_cache(db):
+    cache_incidencias.limpiar()
+    cargas = []
+
+    def contar(db):
+        cargas.append(1)
+        return len(cargas)
+
+    assert consultar("P1", "prueba", contar) == 1
+    assert consultar("P1", "prueba", contar) == 1
+
+    # Otro proceso (un importador, otra réplica) solo deja rastro en la base
+    marcar_datos_modificados(db, "P1")
+    db.commit()
+    assert consultar("P1", "prueba", contar) == 2
+    assert consultar("P1", "prueba", contar) == 2
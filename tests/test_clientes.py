@@ -0,0 +1,28 @@
+import pytest
+from models import Client
+from services.clientes import pagina_clientes
+
+
+# Recorre todas las páginas siguiendo los cursores
+def recorrer(db, **kwargs):
+    ids, despues = [], None
+    while True:
+        df, despues = pagina_clientes(db, "P1", tamano=3, despues=despues, **kwargs)
+        ids.extend(df["ID"].tolist())
+        if despues is None:
+            return ids
+
+
+@pytest.mark.parametrize("descendente", [False, True])
+def test_paginas_con_valores_nulos(db, descendente):
+    nombres = ["Ana", None, "Luis", "Ana", None, "Berta", None, "Carla", "Luis", None]
+    db.add_all([Client(id=i, permisionario="P1", cliente=nombre) for i, nombre in enumerate(nombres, 1)])
+    db.add(Client(id=99, permisionario="P2", cliente="Ana"))
+    db.commit()
+
+    # Los NULL van después de los valores, como en un índice B-tree
+    esperado = sorted(
+        range(1, 11), key=lambda i: (nombres[i - 1] is None, nombres[i - 1] or "", i), reverse=descendente
+    )
+    assert recorrer(db, orden="cliente", descendente=descendente) == esperado
+    assert recorrer(db, orden="id", descendente=descendente) == sorted(range(1, 11), reverse=descendente)
@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, update
+from models import CampanaEncuesta, EnvioEncuesta
+from services.cola_encuestas import (
+    CONFIG_ENCUESTAS, ENVIADO, ENVIANDO, ERROR, PENDIENTE, EmisorFalso, EmisorWhatsApp, LimitadorTasa, hilos_emisor,
+    liberar_envios_vencidos, lote_maximo, procesar_lote, registrar_resultado, tomar_envios,
+)
+
+TELEFONOS = ["+593991000001", "+593991000002", "+593991000003"]
+
+
+# Campaña activa con un envío pendiente por teléfono, confirmada para que la vean otras sesiones
+def crear_cola(db, telefonos=TELEFONOS, estado="activa"):
+    campana = CampanaEncuesta(permisionario="per 1", mensaje="¿Cómo calificaría el servicio?", estado=estado, creada_en=datetime.now())
+    db.add(campana)
+    db.flush()
+    db.add_all([EnvioEncuesta(campana_id=campana.id, telefono=telefono, estado=PENDIENTE, intentos=0) for telefono in telefonos])
+    db.commit()
+    return campana.id
+
+
+def envios(db):
+    db.expire_all()
+    return db.execute(select(EnvioEncuesta).order_by(EnvioEncuesta.id)).scalars().all()
+
+
+def test_lote_se_envia_y_se_marca_enviado(db):
+    crear_cola(db)
+    emisor = EmisorFalso()
+    assert procesar_lote(emisor, LimitadorTasa(60000), "t1", lote=10) == 3
+    assert [telefono for telefono, _ in emisor.enviados] == TELEFONOS
+    assert [(envio.estado, envio.intentos) for envio in envios(db)] == [(ENVIADO, 1)] * 3
+    assert procesar_lote(emisor, LimitadorTasa(60000), "t1", lote=10) == 0
+
+
+def test_dos_trabajadores_no_toman_el_mismo_envio(db):
+    crear_cola(db)
+    primero = tomar_envios(db, "t1", 2)
+    segundo = tomar_envios(db, "t2", 10)
+    assert len(primero) == 2 and len(segundo) == 1
+    assert {envio.id for envio in primero}.isdisjoint(envio.id for envio in segundo)
+    assert {envio.tomado_por for envio in envios(db)} == {"t1", "t2"}
+    assert all(envio.estado == ENVIANDO for envio in envios(db))
+
+
+def test_campana_cancelada_no_se_envia(db):
+    crear_cola(db, estado="cancelada")
+    assert tomar_envios(db, "t1", 10) == []
+
+
+def test_fallo_se_reintenta_con_espera_y_termina_en_error(db, monkeypatch):
+    crear_cola(db, TELEFONOS[:1])
+    emisor = EmisorFalso(tasa_error=1.0)
+    limitador = LimitadorTasa(60000)
+
+    assert procesar_lote(emisor, limitador, "t1") == 1
+    envio = envios(db)[0]
+    assert (envio.estado, envio.intentos) == (PENDIENTE, 1)
+    assert envio.proximo_intento > datetime.now() and envio.ultimo_error
+    # Antes de que venza la espera no se vuelve a tomar
+    assert procesar_lote(emisor, limitador, "t1") == 0
+
+    monkeypatch.setitem(CONFIG_ENCUESTAS, "espera_reintento_segundos", 0)
+    db.execute(update(EnvioEncuesta).values(proximo_intento=datetime.now() - timedelta(seconds=1)))
+    db.commit()
+    for _ in range(CONFIG_ENCUESTAS["max_intentos"] - 1):
+        assert procesar_lote(emisor, limitador, "t1") == 1
+    envio = envios(db)[0]
+    assert (envio.estado, envio.intentos) == (ERROR, CONFIG_ENCUESTAS["max_intentos"])
+    assert procesar_lote(emisor, limitador, "t1") == 0
+
+
+def test_envios_vencidos_vuelven_a_la_cola(db):
+    crear_cola(db)
+    tomar_envios(db, "t1", 10)
+    vencido = datetime.now() - timedelta(seconds=CONFIG_ENCUESTAS["bloqueo_segundos"] + 1)
+    ids = [envio.id for envio in envios(db)]
+    # El primero venció, el segundo venció y agotó sus intentos, el tercero sigue dentro del bloqueo
+    db.execute(update(EnvioEncuesta).where(EnvioEncuesta.id == ids[0]).values(tomado_en=vencido))
+    db.execute(update(EnvioEncuesta).where(EnvioEncuesta.id == ids[1]).values(tomado_en=vencido, intentos=CONFIG_ENCUESTAS["max_intentos"]))
+    db.commit()
+
+    assert liberar_envios_vencidos(db) == 1
+    assert [envio.estado for envio in envios(db)] == [PENDIENTE, ERROR, ENVIANDO]
+    assert [envio.id for envio in tomar_envios(db, "t2", 10)] == [ids[0]]
+
+
+def test_lote_cabe_en_la_ventana_de_bloqueo(monkeypatch):
+    monkeypatch.setitem(CONFIG_ENCUESTAS, "bloqueo_segundos", 300)
+    # 4 mensajes por minuto: un envío cada 15 s, la mitad de la ventana son 150 s
+    assert lote_maximo(LimitadorTasa(4)) == 10
+    assert lote_maximo(LimitadorTasa(4), hilos=3) == 3
+    assert lote_maximo(LimitadorTasa(1), hilos=8) == 1
+    # Con pywhatkit cada envío ocupa además 13 s el navegador: 150 / (15 + 13)
+    assert lote_maximo(LimitadorTasa(4), duracion_envio=EmisorWhatsApp().duracion) == 5
+
+
+def test_pywhatkit_usa_un_solo_hilo():
+    assert hilos_emisor(EmisorWhatsApp(), 4) == 1
+    assert hilos_emisor(EmisorFalso(), 4) == 4
+
+
+def test_resultado_de_un_envio_retomado_no_pisa_al_nuevo_trabajador(db):
+    crear_cola(db, TELEFONOS[:1])
+    (envio,) = tomar_envios(db, "t1", 10)
+    # Vence el bloqueo de t1 y t2 retoma el envío
+    vencido = datetime.now() - timedelta(seconds=CONFIG_ENCUESTAS["bloqueo_segundos"] + 1)
+    db.execute(update(EnvioEncuesta).values(tomado_en=vencido))
+    db.commit()
+    liberar_envios_vencidos(db)
+    (retomado,) = tomar_envios(db, "t2", 10)
+
+    assert not registrar_resultado(db, envio.id, "t1", envio.intentos, "Fallo tardío")
+    assert [(e.estado, e.tomado_por) for e in envios(db)] == [(ENVIANDO, "t2")]
+    assert registrar_resultado(db, retomado.id, "t2", retomado.intentos)
+    assert [e.estado for e in envios(db)] == [ENVIADO]
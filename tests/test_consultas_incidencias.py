@@ -0,0 +1,35 @@
+from datetime import datetime
+from models import TiemPro
+from services.agregados_incidencias import sumar_incidencia
+from services.consultas_incidencias import obtener_conteo_por, obtener_kpis, obtener_resumen_por_tipo, obtener_valores_filtro
+
+TIPOS = ["INTERRUPCIÓN DEL SERVICIO", "DEGRADACIÓN DEL SERVICIO"]
+
+
+# El texto de `mes` no siempre coincide con la fecha de registro (importaciones, ediciones manuales):
+# las métricas y los gráficos de un mes deben contar las mismas incidencias
+def test_metricas_y_graficos_usan_el_mismo_mes(db):
+    for numero in range(1, 41):
+        registro = datetime(2023 + numero % 2, 1 + numero % 4, 10, 9, 0) if numero % 13 else None
+        incidencia = TiemPro(
+            item=str(numero), permisionario="per 1", mes=["Enero", "Marzo"][numero % 2],
+            fecha_hora_registro=registro, tipo_reclamo=TIPOS[numero % 2] if numero % 9 else None,
+            estado_incidencia=["Pendiente", "Finalizado"][numero % 3 == 0], tiempo_resolucion_horas=numero % 6,
+        )
+        db.add(incidencia)
+        sumar_incidencia(db, incidencia)
+    db.commit()
+
+    meses, tipos = obtener_valores_filtro(db, "per 1")
+    assert meses == ["Enero", "Febrero", "Marzo", "Abril"]
+    assert tipos == sorted(TIPOS)
+    for mes in ["Todos"] + meses:
+        for tipo in ["Todos"] + tipos:
+            total = obtener_kpis(db, "per 1", mes, tipo)["total"]
+            for campo in ("tipo_reclamo", "mes", "estado_incidencia"):
+                assert obtener_conteo_por(db, campo, "per 1", mes, tipo)["cantidad"].sum() == total
+            resumen = obtener_resumen_por_tipo(db, "per 1", mes, tipo)
+            assert len(resumen) == len(obtener_conteo_por(db, "tipo_reclamo", "per 1", mes, tipo))
+
+    conteo_mes = obtener_conteo_por(db, "mes", "per 1")
+    assert conteo_mes["valor"].tolist() == [None, "Enero", "Febrero", "Marzo", "Abril"]
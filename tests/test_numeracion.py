@@ -0,0 +1,52 @@
+import threading
+from datetime import datetime
+import pytest
+from database import session_scope
+from services.numeracion import reservar_numeros, siguiente_numero, marcar_mes_modificado, versiones_meses
+
+
+def test_reservas_consecutivas_por_serie_y_permisionario(db):
+    assert list(reservar_numeros(db, "per 1", "incidencias", 3)) == [1, 2, 3]
+    assert list(reservar_numeros(db, "per 1", "incidencias", 2)) == [4, 5]
+    assert siguiente_numero(db, "per 1", "incidencias") == 6
+    assert siguiente_numero(db, "per 1", "clientes") == 1
+    assert siguiente_numero(db, "per 2", "incidencias") == 1
+
+
+def test_cantidad_invalida(db):
+    with pytest.raises(ValueError):
+        reservar_numeros(db, "per 1", "incidencias", 0)
+
+
+# Varios hilos, cada uno con su sesión y su commit por reserva: ningún número se repite ni se salta
+def test_reservas_concurrentes_sin_repetidos(db):
+    numeros, errores = [], []
+    lock = threading.Lock()
+
+    def reservar():
+        try:
+            for _ in range(25):
+                with session_scope() as sesion:
+                    reservados = reservar_numeros(sesion, "per 1", "incidencias", 2)
+                    sesion.commit()
+                with lock:
+                    numeros.extend(reservados)
+        except Exception as e:
+            errores.append(e)
+
+    hilos = [threading.Thread(target=reservar) for _ in range(4)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert not errores
+    assert sorted(numeros) == list(range(1, 201))
+
+
+def test_version_de_mes(db):
+    marcar_mes_modificado(db, "per 1", datetime(2024, 3, 5, 10, 0))
+    marcar_mes_modificado(db, "per 1", datetime(2024, 3, 20, 8, 30))
+    marcar_mes_modificado(db, "per 1", None)
+    assert versiones_meses(db, "per 1", [(2024, 3), (2024, 4)]) == {(2024, 3): 2, (2024, 4): 0}
+    assert versiones_meses(db, "per 2", [(2024, 3)]) == {(2024, 3): 0}
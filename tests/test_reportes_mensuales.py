@@ -0,0 +1,9 @@
+from datetime import datetime
+from services.reportes_mensuales import meses_transcurridos
+
+
+def test_meses_transcurridos():
+    hoy = datetime(2026, 10, 18)
+    assert meses_transcurridos(2025, hoy) == list(range(1, 13))
+    assert meses_transcurridos(2026, hoy) == list(range(1, 11))
+    assert meses_transcurridos(2027, hoy) == []